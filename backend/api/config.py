@@ -17,8 +17,14 @@ except ImportError:
 # Importar después de cargar .env
 from core.config_db import get_database_url
 
-# Database URL (reutiliza core/config_db.py)
-DATABASE_URL = get_database_url()
+# Perfil de base de datos:
+# - 'postgres' (por defecto): DATABASE_URL obligatoria (reutiliza core/config_db.py)
+# - 'memory': SQLite en memoria, sin servidor (tests unitarios y benchmarks rápidos)
+DATABASE_PROFILE = os.getenv("DATABASE_PROFILE", "postgres").lower()
+IN_MEMORY_DATABASE_URL = "sqlite+pysqlite:///:memory:"
+
+# Database URL
+DATABASE_URL = IN_MEMORY_DATABASE_URL if DATABASE_PROFILE == "memory" else get_database_url()
 
 # Waitlist Configuration
 WAITLIST_LIMIT = int(os.getenv("WAITLIST_LIMIT", "50"))  # Feature 2: Escasez
@@ -49,9 +55,13 @@ if ENVIRONMENT == "production":
     if production_domain and production_domain not in ALLOWED_ORIGINS:
         ALLOWED_ORIGINS.append(production_domain)
 
+# Segundos que el navegador cachea el preflight OPTIONS (Chrome lo limita a 7200)
+CORS_MAX_AGE = int(os.getenv("CORS_MAX_AGE", "7200"))
+
 # OneSignal Configuration (Feature 10 - preparado)
 ONESIGNAL_APP_ID = os.getenv("ONESIGNAL_APP_ID", None)
 ONESIGNAL_REST_API_KEY = os.getenv("ONESIGNAL_REST_API_KEY", None)
+ONESIGNAL_API_URL = os.getenv("ONESIGNAL_API_URL", "https://onesignal.com/api/v1/notifications")
 
 # DeepSeek Configuration (Feature 5 - preparado)
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY", None)
@@ -60,4 +70,104 @@ DEEPSEEK_API_URL = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.com/v1/ch
 # Google OAuth Configuration (Feature 1 - ✅ Implementado)
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", None)
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET", None)  # Opcional para V1.5
+GOOGLE_CERTS_URL = os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+
+# Observabilidad de SQL por petición
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "true").lower() == "true"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))  # Umbral para log de query lenta
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))  # Repeticiones de la misma sentencia
+
+# Tracing por fases (0.0 = desactivado, 1.0 = todas las peticiones)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.0"))
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH") or None  # Fichero JSON Lines (opcional)
+
+# Respuestas rápidas (opt-in): orjson + feed sin re-validación + compresión gzip/brotli
+FAST_JSON_ENABLED = os.getenv("FAST_JSON_ENABLED", "false").lower() == "true"
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+
+# Idempotency-Key en POST /gasto: cuánto se guarda la respuesta y cuánto espera un duplicado concurrente
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "15.0"))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))  # Reserva huérfana (worker caído)
+
+# Rate limiting (token bucket): por usuario en gastos con DeepSeek y global en llamadas a DeepSeek
+# Al superarlo, Aury responde con plantillas locales. Backend 'memory' (por worker) o 'redis' (compartido)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+GASTO_LLM_PER_MINUTE = float(os.getenv("GASTO_LLM_PER_MINUTE", "6"))
+GASTO_LLM_BURST = float(os.getenv("GASTO_LLM_BURST", "10"))
+DEEPSEEK_RATE_PER_SECOND = float(os.getenv("DEEPSEEK_RATE_PER_SECOND", "5"))
+DEEPSEEK_BURST = float(os.getenv("DEEPSEEK_BURST", "20"))
+
+# Resiliencia de DeepSeek: timeout adaptativo (p99 x 1.5 acotado), circuit breaker y hedging opcional
+DEEPSEEK_TIMEOUT_SECONDS = float(os.getenv("DEEPSEEK_TIMEOUT_SECONDS", "5.0"))  # Máximo
+DEEPSEEK_TIMEOUT_MIN_SECONDS = float(os.getenv("DEEPSEEK_TIMEOUT_MIN_SECONDS", "1.5"))
+DEEPSEEK_BREAKER_FAILURES = int(os.getenv("DEEPSEEK_BREAKER_FAILURES", "5"))
+DEEPSEEK_BREAKER_RECOVERY_SECONDS = float(os.getenv("DEEPSEEK_BREAKER_RECOVERY_SECONDS", "30"))
+DEEPSEEK_HEDGING_ENABLED = os.getenv("DEEPSEEK_HEDGING_ENABLED", "false").lower() == "true"
+
+# Micro-batching de comentarios de Aury: agrupa las peticiones de una ventana corta
+# (por tono) en una sola llamada a DeepSeek que devuelve un array JSON
+AURY_BATCH_ENABLED = os.getenv("AURY_BATCH_ENABLED", "false").lower() == "true"
+AURY_BATCH_WINDOW_MS = float(os.getenv("AURY_BATCH_WINDOW_MS", "50"))
+AURY_BATCH_MAX_SIZE = int(os.getenv("AURY_BATCH_MAX_SIZE", "8"))
+
+# Parser por niveles: regex local con confianza; por debajo del umbral se consulta
+# a DeepSeek con un esquema JSON estricto. Resultados de DeepSeek cacheados por texto normalizado
+PARSE_LLM_ENABLED = os.getenv("PARSE_LLM_ENABLED", "true").lower() == "true"
+PARSE_CONFIDENCE_THRESHOLD = float(os.getenv("PARSE_CONFIDENCE_THRESHOLD", "0.6"))
+PARSE_LLM_TIMEOUT_SECONDS = float(os.getenv("PARSE_LLM_TIMEOUT_SECONDS", "2.0"))
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "5000"))
+
+# Clasificador local de categorías (scripts/train_category_model.py); sin modelo solo palabras clave
+CATEGORY_MODEL_PATH = os.getenv("CATEGORY_MODEL_PATH") or None  # Fichero .npz
+CATEGORY_MODEL_MIN_PROB = float(os.getenv("CATEGORY_MODEL_MIN_PROB", "0.6"))
+
+# Memoria comercio -> categoría por usuario (antes que cualquier nivel del parser)
+# Caché por worker; tras una recategorización en otro worker puede servir la categoría
+# anterior como mucho MERCHANT_CACHE_TTL_SECONDS
+MERCHANT_MEMORY_ENABLED = os.getenv("MERCHANT_MEMORY_ENABLED", "true").lower() == "true"
+MERCHANT_CACHE_USERS = int(os.getenv("MERCHANT_CACHE_USERS", "5000"))
+MERCHANT_CACHE_TTL_SECONDS = float(os.getenv("MERCHANT_CACHE_TTL_SECONDS", "300"))
+MERCHANT_HISTORY_LIMIT = int(os.getenv("MERCHANT_HISTORY_LIMIT", "500"))  # Transacciones leídas por usuario
+
+# Gastos parecidos del usuario en el contexto de Aury (similarity_service)
+# Índice por usuario en caché del worker; SIMILAR_HISTORY_LIMIT acota la carga y la búsqueda
+SIMILAR_ENABLED = os.getenv("SIMILAR_ENABLED", "true").lower() == "true"
+SIMILAR_HISTORY_LIMIT = int(os.getenv("SIMILAR_HISTORY_LIMIT", "1000"))  # Gastos indexados por usuario
+SIMILAR_TOP_K = int(os.getenv("SIMILAR_TOP_K", "5"))
+SIMILAR_MIN_SCORE = float(os.getenv("SIMILAR_MIN_SCORE", "0.5"))  # Coseno mínimo
+SIMILAR_WINDOW_DAYS = int(os.getenv("SIMILAR_WINDOW_DAYS", "30"))
+SIMILAR_BUDGET_MS = float(os.getenv("SIMILAR_BUDGET_MS", "15"))  # Por encima: sin línea Historial, aviso y outcome over_budget
+SIMILAR_CACHE_USERS = int(os.getenv("SIMILAR_CACHE_USERS", "2000"))
+SIMILAR_CACHE_TTL_SECONDS = float(os.getenv("SIMILAR_CACHE_TTL_SECONDS", "300"))
+
+# Tono analítico generado en local con cifras del historial (analytical_service), sin LLM
+# ANALYTICAL_LLM_POLISH: DeepSeek reescribe el comentario local conservando las cifras
+ANALYTICAL_LOCAL_ENABLED = os.getenv("ANALYTICAL_LOCAL_ENABLED", "true").lower() == "true"
+ANALYTICAL_LLM_POLISH = os.getenv("ANALYTICAL_LLM_POLISH", "false").lower() == "true"
+ANALYTICAL_POLISH_TIMEOUT_SECONDS = float(os.getenv("ANALYTICAL_POLISH_TIMEOUT_SECONDS", "2.0"))
+
+# Gasto inusual: z-score del importe frente a la media del usuario en la categoría
+# (tabla spending_stats, Welford + EWMA actualizados en cada gasto)
+ANOMALY_ENABLED = os.getenv("ANOMALY_ENABLED", "true").lower() == "true"
+ANOMALY_MIN_COUNT = int(os.getenv("ANOMALY_MIN_COUNT", "5"))  # Gastos previos antes de puntuar
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "2.5"))
+SPENDING_EWMA_ALPHA = float(os.getenv("SPENDING_EWMA_ALPHA", "0.2"))
+
+# Clasificación de rachas (leaderboard_service): histograma de current_streak y top-N en
+# memoria del worker; se recalcula cada LEADERBOARD_REFRESH_SECONDS y entre medias se ajusta
+# con cada cambio de racha del propio worker (el rollover nocturno entra con el recálculo)
+LEADERBOARD_TOP_N = int(os.getenv("LEADERBOARD_TOP_N", "10"))
+LEADERBOARD_REFRESH_SECONDS = float(os.getenv("LEADERBOARD_REFRESH_SECONDS", "300"))
+LEADERBOARD_MAX_BUCKET = int(os.getenv("LEADERBOARD_MAX_BUCKET", "365"))  # Rachas mayores: último bucket
+# Hora a la que el rollover nocturno (scripts/rollover_streaks.py) ya ha terminado:
+# una clasificación calculada antes se recalcula en la primera consulta posterior
+LEADERBOARD_ROLLOVER_TIME = os.getenv("LEADERBOARD_ROLLOVER_TIME", "00:15")
+
+# Warm-up al arrancar (pool de DB, DeepSeek, certificados Google, cachés)
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "5.0"))
+WARMUP_DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", "3"))
 
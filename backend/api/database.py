@@ -4,22 +4,42 @@ Configuración de SQLAlchemy para FastAPI
 SessionLocal y engine para conexión a PostgreSQL
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from api.config import DATABASE_URL
+from sqlalchemy.pool import QueuePool, StaticPool
+from api.config import DATABASE_URL, QUERY_STATS_ENABLED
+from api.query_stats import install_query_hooks
+from concurrent.futures import ThreadPoolExecutor
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Tamaño del pool por worker
+POOL_SIZE = 5
+
+def _engine_options(url: str) -> dict:
+    """Opciones del engine según el backend (PostgreSQL o SQLite en memoria)"""
+    if url.startswith("sqlite") and ":memory:" in url:
+        # Una única conexión compartida: la base en memoria vive mientras viva la conexión
+        return {
+            "poolclass": StaticPool,
+            "connect_args": {"check_same_thread": False},
+            "echo": False
+        }
+    return {
+        "pool_pre_ping": True,  # Verifica conexiones antes de usar
+        "pool_size": POOL_SIZE,
+        "max_overflow": 10,
+        "echo": False  # Cambiar a True para debug SQL
+    }
+
 # Engine de SQLAlchemy
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,  # Verifica conexiones antes de usar
-    pool_size=5,
-    max_overflow=10,
-    echo=False  # Cambiar a True para debug SQL
-)
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+
+# Conteo de queries por petición + log de queries lentas
+if QUERY_STATS_ENABLED:
+    install_query_hooks(engine)
 
 # SessionLocal para dependencias FastAPI
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -47,3 +67,33 @@ def init_db():
         logger.error(f"❌ Error creando tablas: {e}")
         raise
 
+def warm_up_pool(connections: int) -> int:
+    """
+    Pre-abre conexiones del pool en paralelo para que la primera petición no pague
+    el handshake con PostgreSQL. Retorna el número de conexiones abiertas.
+    """
+    if not isinstance(engine.pool, QueuePool):
+        return 0  # SQLite en memoria: una sola conexión compartida
+    
+    connections = max(0, min(connections, POOL_SIZE))
+    if connections == 0:
+        return 0
+    
+    def _open(_):
+        conn = engine.connect()
+        conn.execute(text("SELECT 1"))
+        return conn
+    
+    opened = []
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        futures = [executor.submit(_open, i) for i in range(connections)]
+        for future in futures:
+            try:
+                opened.append(future.result())
+            except Exception as e:
+                logger.warning(f"⚠️ Warm-up: no se pudo abrir conexión: {e}")
+    
+    # Al cerrarlas vuelven al pool y quedan abiertas para las siguientes peticiones
+    for conn in opened:
+        conn.close()
+    return len(opened)
@@ -6,20 +6,30 @@ Backend Mobile-First para PWA
 
 from fastapi import FastAPI, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from datetime import datetime
+import asyncio
+import time
 import logging
 
 from api.config import (
-    PROJECT_NAME, VERSION, ALLOWED_ORIGINS,
-    WAITLIST_LIMIT, GOOGLE_CLIENT_ID, ENVIRONMENT
+    PROJECT_NAME, VERSION, ALLOWED_ORIGINS, CORS_MAX_AGE,
+    WAITLIST_LIMIT, GOOGLE_CLIENT_ID, ENVIRONMENT, WARMUP_ENABLED,
+    QUERY_STATS_ENABLED, FAST_JSON_ENABLED
 )
 from api.database import get_db, engine
-from api.models import User, DeviceSubscription  # Importar todos los modelos para que SQLAlchemy los registre
-from api.schemas import HealthCheckResponse
+from api.models import User, DeviceSubscription, IdempotencyKey  # Importar todos los modelos para que SQLAlchemy los registre
+from api.metrics import (
+    HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, render_metrics, update_pool_gauges
+)
+from api.query_stats import track_queries
+from api.responses import FastJSONResponse
+from api.schemas import HealthCheckResponse, ReadinessResponse
 from api.v1.endpoints import router as v1_router
+from api.v1.services.aury_service import close_deepseek_client, deepseek_status
+from api.warmup import WARMUP_STATE, is_ready, mark_ready, run_warmup
 
 # Configurar logging según entorno
 log_level = logging.DEBUG if ENVIRONMENT == "development" else logging.INFO
@@ -35,7 +45,8 @@ app = FastAPI(
     version=VERSION,
     description="Backend API para Ahorify V1.5 - PWA Mobile-First",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=FastJSONResponse if FAST_JSON_ENABLED else JSONResponse
 )
 
 # ==================== CORS Configuration ====================
@@ -46,8 +57,44 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Idempotent-Replayed"],
+    max_age=CORS_MAX_AGE,  # Cachea el preflight OPTIONS en el navegador
 )
 
+# ==================== SQL por petición ====================
+# Atribuye cada query a la ruta y emite Server-Timing (nº queries, tiempo DB, más lenta)
+if QUERY_STATS_ENABLED:
+    @app.middleware("http")
+    async def query_stats_middleware(request: Request, call_next):
+        with track_queries(f"{request.method} {request.url.path}") as stats:
+            response = await call_next(request)
+            route = request.scope.get("route")
+            if route is not None:
+                stats.label = f"{request.method} {route.path}"
+        response.headers["Server-Timing"] = stats.server_timing()
+        return response
+
+# ==================== Métricas ====================
+# Latencia por plantilla de ruta (no por path real, para no disparar la cardinalidad)
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    start = time.perf_counter()
+    status_code = 500
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.labels(
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=str(status_code)
+        ).observe(time.perf_counter() - start)
+        update_pool_gauges(engine.pool)
+
 # ==================== Inicialización ====================
 @app.on_event("startup")
 async def startup_event():
@@ -75,6 +122,17 @@ async def startup_event():
             logger.info(f"📚 Docs disponibles en: /docs")
     except Exception as e:
         logger.error(f"❌ Error iniciando FastAPI: {e}")
+    
+    # Warm-up en segundo plano: /ready devuelve 503 hasta que termine
+    if WARMUP_ENABLED:
+        app.state.warmup_task = asyncio.create_task(run_warmup())
+    else:
+        mark_ready()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Cierra conexiones compartidas al parar el worker"""
+    await close_deepseek_client()
 
 # ==================== Health Check ====================
 @app.get("/", response_model=HealthCheckResponse)
@@ -97,6 +155,35 @@ def health_check(db: Session = Depends(get_db)):
         timestamp=datetime.now()
     )
 
+@app.get("/ready", response_model=ReadinessResponse)
+def readiness_check():
+    """
+    Readiness del worker
+    Devuelve 503 mientras el warm-up (pool DB, DeepSeek, certificados Google) está en curso
+    Con el circuito de DeepSeek abierto sigue listo (responde con plantillas) pero status="degraded"
+    """
+    deepseek = deepseek_status()
+    status = "warming_up"
+    if is_ready():
+        status = "degraded" if deepseek["state"] == "open" else "ready"
+    response = ReadinessResponse(
+        status=status,
+        ready=is_ready(),
+        warmup_ms=WARMUP_STATE["duration_ms"],
+        steps=WARMUP_STATE["steps"],
+        dependencies={"deepseek": deepseek}
+    )
+    if not response.ready:
+        return JSONResponse(status_code=503, content=response.model_dump())
+    return response
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Métricas en formato texto de Prometheus (agregadas entre workers)"""
+    update_pool_gauges(engine.pool)
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
 # ==================== Incluir routers ====================
 app.include_router(v1_router)
 
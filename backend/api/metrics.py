@@ -0,0 +1,206 @@
+# api/metrics.py
+"""
+Métricas Prometheus
+Latencia por ruta, peticiones en vuelo, pool de DB, DeepSeek, OneSignal y cachés
+Con gunicorn (4 workers) se agregan vía PROMETHEUS_MULTIPROC_DIR (ver gunicorn.conf.py)
+"""
+
+import os
+import logging
+from typing import Tuple
+
+logger = logging.getLogger(__name__)
+
+# prometheus-client es opcional: sin él las métricas son no-ops
+try:
+    from prometheus_client import (
+        CollectorRegistry, Counter, Gauge, Histogram,
+        generate_latest, CONTENT_TYPE_LATEST, REGISTRY
+    )
+    from prometheus_client import multiprocess
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+    logger.warning("prometheus-client no instalado. Instala con: pip install prometheus-client")
+
+class _NoopMetric:
+    """Sustituto cuando prometheus-client no está instalado"""
+    def labels(self, *args, **kwargs):
+        return self
+    def inc(self, amount: float = 1):
+        pass
+    def dec(self, amount: float = 1):
+        pass
+    def set(self, value: float):
+        pass
+    def observe(self, value: float):
+        pass
+
+# Buckets pensados para una API móvil: 5 ms .. 10 s
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+if METRICS_AVAILABLE:
+    HTTP_REQUEST_DURATION = Histogram(
+        "ahorify_http_request_duration_seconds",
+        "Latencia de peticiones HTTP por ruta",
+        ["method", "route", "status"],
+        buckets=LATENCY_BUCKETS
+    )
+    HTTP_REQUESTS_IN_FLIGHT = Gauge(
+        "ahorify_http_requests_in_flight",
+        "Peticiones HTTP en curso",
+        multiprocess_mode="livesum"
+    )
+    DB_POOL_CHECKED_OUT = Gauge(
+        "ahorify_db_pool_checked_out",
+        "Conexiones del pool en uso",
+        multiprocess_mode="livesum"
+    )
+    DB_POOL_CHECKED_IN = Gauge(
+        "ahorify_db_pool_checked_in",
+        "Conexiones abiertas y libres en el pool",
+        multiprocess_mode="livesum"
+    )
+    DB_POOL_OVERFLOW = Gauge(
+        "ahorify_db_pool_overflow",
+        "Conexiones de overflow abiertas",
+        multiprocess_mode="livesum"
+    )
+    DEEPSEEK_REQUEST_DURATION = Histogram(
+        "ahorify_deepseek_request_duration_seconds",
+        "Latencia de llamadas a DeepSeek por tono y resultado",
+        ["tone", "outcome"],
+        buckets=LATENCY_BUCKETS
+    )
+    ONESIGNAL_SENDS = Counter(
+        "ahorify_onesignal_sends_total",
+        "Envíos de notificaciones a OneSignal por resultado",
+        ["outcome"]
+    )
+    CACHE_REQUESTS = Counter(
+        "ahorify_cache_requests_total",
+        "Consultas a cachés internas (hit/miss)",
+        ["cache", "result"]
+    )
+    DEEPSEEK_FIRST_TOKEN = Histogram(
+        "ahorify_deepseek_time_to_first_token_seconds",
+        "Tiempo hasta el primer fragmento en el streaming de DeepSeek",
+        ["tone"],
+        buckets=LATENCY_BUCKETS
+    )
+    DEEPSEEK_TOKENS = Counter(
+        "ahorify_deepseek_tokens_total",
+        "Tokens de DeepSeek por tono, versión del prompt y tipo (prompt, prompt_cached, completion)",
+        ["tone", "prompt_version", "kind"]
+    )
+    DEEPSEEK_USAGE_RESPONSES = Counter(
+        "ahorify_deepseek_usage_responses_total",
+        "Respuestas de DeepSeek con uso de tokens informado (denominador de las medias por petición)",
+        ["tone", "prompt_version"]
+    )
+    AURY_BATCH_SIZE = Histogram(
+        "ahorify_aury_batch_size",
+        "Comentarios por llamada agrupada a DeepSeek",
+        buckets=(1, 2, 4, 8, 16, 32)
+    )
+    AURY_BATCH_ITEMS = Counter(
+        "ahorify_aury_batch_items_total",
+        "Comentarios de llamadas agrupadas por resultado (ok, fallback)",
+        ["result"]
+    )
+    PARSE_REQUESTS = Counter(
+        "ahorify_parse_requests_total",
+        "Textos parseados por resultado (memory, local, cache, llm, llm_fallback)",
+        ["result"]
+    )
+    PARSE_DURATION = Histogram(
+        "ahorify_parse_duration_seconds",
+        "Latencia del parser por nivel (local, llm)",
+        ["tier"],
+        buckets=(0.0001, 0.0005, 0.001) + LATENCY_BUCKETS
+    )
+    ANALYTICAL_COMMENTS = Counter(
+        "ahorify_analytical_comments_total",
+        "Comentarios del tono analítico generados en local (local, polished, polish_fallback)",
+        ["result"]
+    )
+    SIMILAR_LOOKUP_DURATION = Histogram(
+        "ahorify_similar_lookup_seconds",
+        "Búsqueda de gastos parecidos por resultado (found, empty, over_budget, cold)",
+        ["outcome"],
+        buckets=(0.0001, 0.0005, 0.001) + LATENCY_BUCKETS
+    )
+    DEEPSEEK_CIRCUIT_STATE = Gauge(
+        "ahorify_deepseek_circuit_state",
+        "Estado del circuit breaker de DeepSeek (0 closed, 1 half_open, 2 open; peor worker)",
+        multiprocess_mode="livemax"
+    )
+    DEEPSEEK_CIRCUIT_TRANSITIONS = Counter(
+        "ahorify_deepseek_circuit_transitions_total",
+        "Transiciones del circuit breaker de DeepSeek por estado destino",
+        ["state"]
+    )
+    DEEPSEEK_TIMEOUT = Gauge(
+        "ahorify_deepseek_timeout_seconds",
+        "Timeout adaptativo actual de DeepSeek (máximo entre workers)",
+        multiprocess_mode="livemax"
+    )
+    DEEPSEEK_HEDGES = Counter(
+        "ahorify_deepseek_hedged_requests_total",
+        "Peticiones de cobertura lanzadas a DeepSeek"
+    )
+    RATE_LIMIT_DECISIONS = Counter(
+        "ahorify_rate_limit_decisions_total",
+        "Decisiones de rate limiting por bucket (allowed/limited)",
+        ["limit", "result"]
+    )
+else:
+    HTTP_REQUEST_DURATION = _NoopMetric()
+    HTTP_REQUESTS_IN_FLIGHT = _NoopMetric()
+    DB_POOL_CHECKED_OUT = _NoopMetric()
+    DB_POOL_CHECKED_IN = _NoopMetric()
+    DB_POOL_OVERFLOW = _NoopMetric()
+    DEEPSEEK_REQUEST_DURATION = _NoopMetric()
+    ONESIGNAL_SENDS = _NoopMetric()
+    CACHE_REQUESTS = _NoopMetric()
+    DEEPSEEK_FIRST_TOKEN = _NoopMetric()
+    DEEPSEEK_TOKENS = _NoopMetric()
+    DEEPSEEK_USAGE_RESPONSES = _NoopMetric()
+    AURY_BATCH_SIZE = _NoopMetric()
+    AURY_BATCH_ITEMS = _NoopMetric()
+    PARSE_REQUESTS = _NoopMetric()
+    PARSE_DURATION = _NoopMetric()
+    SIMILAR_LOOKUP_DURATION = _NoopMetric()
+    ANALYTICAL_COMMENTS = _NoopMetric()
+    DEEPSEEK_CIRCUIT_STATE = _NoopMetric()
+    DEEPSEEK_CIRCUIT_TRANSITIONS = _NoopMetric()
+    DEEPSEEK_TIMEOUT = _NoopMetric()
+    DEEPSEEK_HEDGES = _NoopMetric()
+    RATE_LIMIT_DECISIONS = _NoopMetric()
+
+def record_cache(cache: str, hit: bool):
+    """Registra un hit/miss de una caché interna"""
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+def update_pool_gauges(pool):
+    """Copia el estado del pool de SQLAlchemy a los gauges (solo QueuePool)"""
+    if not hasattr(pool, "checkedout"):
+        return
+    DB_POOL_CHECKED_OUT.set(pool.checkedout())
+    DB_POOL_CHECKED_IN.set(pool.checkedin())
+    DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Serializa las métricas en formato texto de Prometheus
+    En modo multiproceso agrega los ficheros de todos los workers
+    """
+    if not METRICS_AVAILABLE:
+        return b"# prometheus-client no instalado\n", "text/plain; charset=utf-8"
+
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -2,10 +2,10 @@
 """
 Modelos SQLAlchemy para Ahorify V1.5
 Diseñados para las 10 features core del pivot
+Uuid es portable: UUID nativo en PostgreSQL, CHAR(32) en SQLite (tests/benchmarks)
 """
 
-from sqlalchemy import Column, String, Integer, Numeric, Boolean, Text, Date, DateTime, ForeignKey, CheckConstraint
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Integer, Numeric, Float, Boolean, Text, Date, DateTime, LargeBinary, ForeignKey, CheckConstraint, Index, Uuid
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime, date
@@ -21,7 +21,7 @@ class User(Base):
     """
     __tablename__ = "users"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)  # PK interno (no se usa en API)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)  # PK interno (no se usa en API)
     google_id = Column(String(255), unique=True, nullable=True)  # Feature 1: Google ID (sub) - identificador principal
     email = Column(String(255), unique=True, nullable=True)  # Email de Google
     goal = Column(Text, nullable=True)  # Feature 3: "¿Para qué ahorras?"
@@ -38,6 +38,9 @@ class User(Base):
     # Aury Tone Preference: 'sarcastic', 'subtle', 'analytical'
     aury_tone = Column(String(20), default='sarcastic', nullable=False, server_default='sarcastic')
     
+    # Versión de datos del usuario: se incrementa en cada escritura (ETags de lecturas del dashboard)
+    data_version = Column(Integer, default=0, nullable=False, server_default='0')
+    
     # Deprecated V1.5: Mantener por compatibilidad pero no usar
     streak_freezes_available = Column(Integer, default=0, nullable=False, server_default='0')
     
@@ -61,8 +64,8 @@ class Transaction(Base):
     """
     __tablename__ = "transactions"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(Uuid(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     
     # Feature 4: Smart Input - texto libre del usuario
     raw_text = Column(Text, nullable=False)
@@ -75,12 +78,17 @@ class Transaction(Base):
     # Feature 7: Comentario sarcástico de Aury
     aury_response = Column(Text, nullable=True)
     
+    # Comercio normalizado ("Mercadona 32" -> "mercadona"): memoria de categorías por usuario
+    merchant_key = Column(String(120), nullable=True)
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Constraints
     __table_args__ = (
         CheckConstraint("amount IS NULL OR amount > 0", name="check_positive_amount"),
         CheckConstraint("type IS NULL OR type IN ('expense', 'income')", name="check_valid_type"),
+        # Recategorización masiva: UPDATE ... WHERE user_id = ? AND merchant_key = ?
+        Index("ix_transactions_user_merchant", "user_id", "merchant_key"),
     )
     
     # Relationships
@@ -98,7 +106,7 @@ class Streak(Base):
     """
     __tablename__ = "streaks"
     
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Uuid(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
     current_streak = Column(Integer, default=0, nullable=False)
     longest_streak = Column(Integer, default=0, nullable=False)
     last_activity_date = Column(Date, nullable=True)  # NULL si nunca ha tenido actividad
@@ -109,6 +117,10 @@ class Streak(Base):
     __table_args__ = (
         CheckConstraint("current_streak >= 0", name="check_positive_current_streak"),
         CheckConstraint("longest_streak >= 0", name="check_positive_longest_streak"),
+        # Rollover nocturno: UPDATE ... WHERE last_activity_date < ayer
+        Index("ix_streaks_last_activity", "last_activity_date"),
+        # Clasificación: top-N por current_streak (leaderboard_service)
+        Index("ix_streaks_current_streak", current_streak.desc()),
     )
     
     # Relationships
@@ -118,6 +130,46 @@ class Streak(Base):
         return f"<Streak(user_id={self.user_id}, current={self.current_streak}, longest={self.longest_streak})>"
 
 
+class ActivityYear(Base):
+    """
+    Libro de actividad: días activos y protegidos de un usuario en un año
+    - Bit i (LSB primero) = día i del año desde 0: 366 bits, 46 bytes por mapa
+    - Solo se añaden bits (nunca se borran); lo mantienen update_streak y el rollover nocturno
+    Base de /racha/calendar y de las consultas por rango (activity_service)
+    """
+    __tablename__ = "activity_years"
+    
+    user_id = Column(Uuid(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    active_days = Column(LargeBinary(46), nullable=False)
+    freeze_days = Column(LargeBinary(46), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<ActivityYear(user_id={self.user_id}, year={self.year})>"
+
+
+class SpendingStat(Base):
+    """
+    Estadísticas de gasto por usuario y categoría, actualizadas en O(1) con cada gasto
+    - count/mean/m2: media y varianza online (Welford); varianza = m2 / (count - 1)
+    - ewma: media exponencial del importe (lo reciente pesa más)
+    Base del z-score de gasto inusual (spending_stats_service)
+    """
+    __tablename__ = "spending_stats"
+    
+    user_id = Column(Uuid(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    category = Column(String(255), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+    mean = Column(Float, default=0.0, nullable=False)
+    m2 = Column(Float, default=0.0, nullable=False)
+    ewma = Column(Float, default=0.0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<SpendingStat(user_id={self.user_id}, category={self.category}, count={self.count}, mean={self.mean})>"
+
+
 class DeviceSubscription(Base):
     """
     Modelo para suscripciones de dispositivos - Feature 10
@@ -125,8 +177,8 @@ class DeviceSubscription(Base):
     """
     __tablename__ = "device_subscriptions"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(Uuid(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     onesignal_player_id = Column(String(255), unique=True, nullable=False)  # OneSignal Player ID
     device_type = Column(String(50), nullable=True)  # 'web', 'ios', 'android'
     user_agent = Column(Text, nullable=True)  # Para debugging
@@ -140,3 +192,28 @@ class DeviceSubscription(Base):
     def __repr__(self):
         return f"<DeviceSubscription(user_id={self.user_id}, player_id={self.onesignal_player_id})>"
 
+
+class IdempotencyKey(Base):
+    """
+    Claves Idempotency-Key de POST /gasto
+    Un reintento con la misma clave devuelve la respuesta guardada sin volver a
+    parsear, llamar a DeepSeek ni insertar otra transacción
+    Fechas en UTC sin zona horaria (comparables igual en PostgreSQL y SQLite)
+    """
+    __tablename__ = "idempotency_keys"
+    
+    google_id = Column(String(255), primary_key=True)  # La clave es única por usuario
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)  # SHA-256 del cuerpo: misma clave con otro cuerpo -> 422
+    state = Column(String(20), nullable=False, default='in_progress')  # 'in_progress' | 'completed'
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)  # JSON de la respuesta original
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    
+    __table_args__ = (
+        CheckConstraint("state IN ('in_progress', 'completed')", name="check_valid_idempotency_state"),
+    )
+    
+    def __repr__(self):
+        return f"<IdempotencyKey(google_id={self.google_id}, key={self.key}, state={self.state})>"
@@ -0,0 +1,161 @@
+# api/query_stats.py
+"""
+Estadísticas de SQL por petición
+Hooks de SQLAlchemy que atribuyen cada sentencia a la ruta/tarea actual:
+número de queries, tiempo total en DB, query más lenta, detección de N+1
+y log de queries lentas (con parámetros redactados)
+"""
+
+import re
+import time
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from sqlalchemy import event
+
+from api.config import SLOW_QUERY_MS, N_PLUS_ONE_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# Presupuesto de queries por ruta (assert_query_budget, comprobado en tests/test_query_budgets.py)
+ROUTE_QUERY_BUDGETS: Dict[str, int] = {
+    "POST /api/v1/auth/google": 4,
+    "POST /api/v1/gasto": 12,
+    "POST /api/v1/gasto/stream": 12,
+    "GET /api/v1/gastos/recent": 3,
+    "POST /api/v1/gastos/recategorize": 7,   # + lectura y reescritura de spending_stats de las categorías movidas
+    "GET /api/v1/racha": 4,
+    "GET /api/v1/racha/rank": 5,
+    "POST /api/v1/streak/freeze": 5,
+    "POST /api/v1/user/goal": 4,
+    "POST /api/v1/user/aury-tone": 4,
+    "GET /api/v1/user/aury-tone": 2,
+}
+
+# Primer gasto de un usuario nuevo (una vez por usuario): crea la racha (INSERT y recarga
+# tras el commit) y su año en el libro de actividad
+NEW_USER_QUERY_BUDGETS: Dict[str, int] = {
+    "POST /api/v1/gasto": 14,
+    "POST /api/v1/gasto/stream": 14,
+}
+
+_SERVER_TIMING_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+class QueryStats:
+    """Acumulador de queries de una petición (o de un script)"""
+
+    __slots__ = ("label", "count", "total_ms", "slowest_ms", "slowest_statement", "statements")
+
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.statements[statement] += 1
+        if elapsed_ms > self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_statement = statement
+
+    def repeated_statements(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> Dict[str, int]:
+        """Sentencias idénticas ejecutadas `threshold` veces o más (posible N+1)"""
+        return {stmt: n for stmt, n in self.statements.items() if n >= threshold}
+
+    def server_timing(self) -> str:
+        """Valor para la cabecera Server-Timing"""
+        return (
+            f'db;dur={self.total_ms:.2f};desc="{self.count} queries", '
+            f'db-slowest;dur={self.slowest_ms:.2f}'
+        )
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+def get_current_stats() -> Optional[QueryStats]:
+    """Stats de la petición en curso (None fuera de track_queries)"""
+    return _current_stats.get()
+
+def _redact_parameters(parameters) -> str:
+    """Oculta los valores de los parámetros: solo deja nombres/posiciones"""
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}=?" for key in parameters) + "}"
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"<{len(parameters)} sets de parámetros>"
+        return "(" + ", ".join("?" for _ in parameters) + ")"
+    return "?"
+
+def _one_line(statement: str) -> str:
+    return " ".join(statement.split())
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_time")
+    if not start_times:
+        return
+    elapsed_ms = (time.perf_counter() - start_times.pop()) * 1000
+
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed_ms)
+
+    if elapsed_ms >= SLOW_QUERY_MS:
+        label = stats.label if stats is not None else "sin ruta"
+        logger.warning(
+            f"🐢 Query lenta ({elapsed_ms:.1f} ms) en {label}: "
+            f"{_one_line(statement)} -- params {_redact_parameters(parameters)}"
+        )
+
+def install_query_hooks(engine):
+    """Registra los hooks en el engine (idempotente)"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+@contextmanager
+def track_queries(label: str):
+    """
+    Atribuye todas las queries ejecutadas dentro del bloque a `label`
+    Al salir avisa de posibles N+1 (sentencias repetidas)
+    """
+    stats = QueryStats(label)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+        for statement, times in stats.repeated_statements().items():
+            logger.warning(
+                f"🔁 Posible N+1 en {stats.label}: sentencia ejecutada {times} veces: "
+                f"{_one_line(statement)[:200]}"
+            )
+
+def assert_query_budget(response, max_queries: Optional[int] = None, route: Optional[str] = None) -> int:
+    """
+    Helper de tests: falla si la respuesta superó su presupuesto de queries
+    Lee el número de queries de la cabecera Server-Timing. Si no se pasa
+    `max_queries`, usa el presupuesto de `route` en ROUTE_QUERY_BUDGETS.
+    Retorna el número de queries ejecutadas.
+    """
+    match = _SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+    if not match:
+        raise AssertionError("La respuesta no tiene cabecera Server-Timing con el número de queries")
+
+    count = int(match.group(1))
+    if max_queries is None:
+        if route not in ROUTE_QUERY_BUDGETS:
+            raise AssertionError(f"Sin presupuesto de queries definido para la ruta: {route}")
+        max_queries = ROUTE_QUERY_BUDGETS[route]
+
+    if count > max_queries:
+        raise AssertionError(f"{route or 'Petición'} ejecutó {count} queries (presupuesto: {max_queries})")
+    return count
@@ -0,0 +1,168 @@
+# api/rate_limit.py
+"""
+Rate limiting con token bucket
+- Por usuario: gastos con comentario de DeepSeek por minuto
+- Global: llamadas salientes a DeepSeek por segundo
+Al superar un límite no se falla la petición: Aury responde con las plantillas locales
+
+Backends:
+- memory: por worker (con 4 workers el límite global efectivo es 4x)
+- redis: compartido entre workers (Redis, Valkey o scripts/fake_redis_server.py en local),
+  con el cliente asyncio: un Redis lento no bloquea el event loop
+"""
+
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from api.config import (
+    RATE_LIMIT_ENABLED, RATE_LIMIT_BACKEND, RATE_LIMIT_REDIS_URL,
+    GASTO_LLM_PER_MINUTE, GASTO_LLM_BURST, DEEPSEEK_RATE_PER_SECOND, DEEPSEEK_BURST
+)
+from api.metrics import RATE_LIMIT_DECISIONS
+
+logger = logging.getLogger(__name__)
+
+# redis es opcional (solo para RATE_LIMIT_BACKEND=redis)
+try:
+    import redis
+    import redis.asyncio
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+class RateLimit(NamedTuple):
+    """Parámetros de un bucket: `rate` tokens por segundo, hasta `capacity` acumulados"""
+    name: str
+    rate: float
+    capacity: float
+
+GASTO_LLM_LIMIT = RateLimit("gasto_llm_user", GASTO_LLM_PER_MINUTE / 60.0, GASTO_LLM_BURST)
+DEEPSEEK_GLOBAL_LIMIT = RateLimit("deepseek_global", DEEPSEEK_RATE_PER_SECOND, DEEPSEEK_BURST)
+
+class MemoryTokenBucket:
+    """Buckets en memoria del worker (LRU acotado para no crecer con cada usuario)"""
+
+    def __init__(self, max_keys: int = 10000):
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+
+    async def acquire(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """Consume `cost` tokens si hay (cost negativo: los devuelve, hasta `capacity`).
+        Retorna (permitido, segundos hasta poder reintentar). Sin esperas: solo un lock corto"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens = min(capacity, tokens - cost)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+# Bucket atómico en Redis; usa el reloj del servidor para que todos los workers coincidan
+_REDIS_TOKEN_BUCKET = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = math.min(capacity, tokens - cost)
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+class RedisTokenBucket:
+    """
+    Buckets compartidos en Redis (script Lua atómico, cliente redis.asyncio)
+    Si Redis no responde (o tarda más de 0.1 s) se usa el backend en memoria del worker
+    y se reintenta Redis pasados REDIS_RETRY_SECONDS (sin pagar el timeout en cada petición)
+    """
+
+    REDIS_RETRY_SECONDS = 5.0
+
+    def __init__(self, url: str, prefix: str = "ahorify:rl:"):
+        self._client = redis.asyncio.Redis.from_url(url, socket_timeout=0.1, socket_connect_timeout=0.1)
+        self._script = self._client.register_script(_REDIS_TOKEN_BUCKET)
+        self._prefix = prefix
+        self._fallback = MemoryTokenBucket()
+        self._last_error_log = 0.0
+        self._script_loaded = False
+        self._redis_retry_at = 0.0
+
+    async def acquire(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> Tuple[bool, float]:
+        if time.monotonic() < self._redis_retry_at:
+            return await self._fallback.acquire(key, rate, capacity, cost)
+        try:
+            if not self._script_loaded:
+                # Precargar evita el NOSCRIPT + EVAL de la primera llamada
+                await self._client.script_load(_REDIS_TOKEN_BUCKET)
+                self._script_loaded = True
+            allowed, retry_after = await self._script(keys=[self._prefix + key], args=[rate, capacity, cost])
+            return bool(allowed), float(retry_after)
+        except (redis.RedisError, OSError) as e:
+            self._script_loaded = False
+            self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_SECONDS
+            # Un log por minuto como mucho
+            if time.monotonic() - self._last_error_log > 60:
+                self._last_error_log = time.monotonic()
+                logger.warning(f"⚠️ Rate limit: Redis no disponible, usando memoria del worker: {e}")
+            return await self._fallback.acquire(key, rate, capacity, cost)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_rate_limiter():
+    """Backend configurado (RATE_LIMIT_BACKEND), creado una vez por worker"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if RATE_LIMIT_BACKEND == "redis" and REDIS_AVAILABLE:
+                    _backend = RedisTokenBucket(RATE_LIMIT_REDIS_URL)
+                else:
+                    if RATE_LIMIT_BACKEND == "redis":
+                        logger.warning("⚠️ RATE_LIMIT_BACKEND=redis pero el paquete redis no está instalado, usando memoria")
+                    _backend = MemoryTokenBucket()
+    return _backend
+
+def set_rate_limiter(backend):
+    """Sustituye el backend (p.ej. uno compartido propio o uno nuevo en benchmarks)"""
+    global _backend
+    _backend = backend
+
+async def allow(limit: RateLimit, key: Optional[str] = None) -> bool:
+    """True si la petición entra en el bucket `limit` (por `key`, o global si es None)"""
+    if not RATE_LIMIT_ENABLED or limit.rate <= 0:
+        return True
+    bucket_key = f"{limit.name}:{key}" if key else limit.name
+    allowed, retry_after = await get_rate_limiter().acquire(bucket_key, limit.rate, limit.capacity)
+    RATE_LIMIT_DECISIONS.labels(limit=limit.name, result="allowed" if allowed else "limited").inc()
+    if not allowed:
+        logger.info(f"🚦 Rate limit '{limit.name}' superado (reintentar en {math.ceil(retry_after)} s)")
+    return allowed
+
+async def refund(limit: RateLimit, key: Optional[str] = None):
+    """Devuelve el token consumido por allow() cuando la petición no llegó a usarlo"""
+    if not RATE_LIMIT_ENABLED or limit.rate <= 0:
+        return
+    bucket_key = f"{limit.name}:{key}" if key else limit.name
+    await get_rate_limiter().acquire(bucket_key, limit.rate, limit.capacity, cost=-1.0)
@@ -0,0 +1,176 @@
+# api/resilience.py
+"""
+Resiliencia para dependencias externas (DeepSeek)
+- CircuitBreaker: closed -> open tras N fallos seguidos; open -> half_open pasado
+  el tiempo de recuperación; half_open deja pasar una sonda que cierra o reabre
+- AdaptiveTimeout: timeout a partir de los percentiles de latencia observados
+- hedged: lanza una segunda petición si la primera supera el retardo de cobertura (p95)
+"""
+
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+# Valor numérico del estado para el gauge de Prometheus
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+class CircuitBreaker:
+    """Circuit breaker por worker (el event loop es monohilo: no necesita locks)"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_seconds: float = 30.0,
+        on_state_change: Optional[Callable[[str, str], None]] = None
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self._on_state_change = on_state_change
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        """Estado actual (pasa de open a half_open al cumplirse el tiempo de recuperación)"""
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_seconds:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def _transition(self, new_state: str):
+        if new_state == self._state:
+            return
+        old_state, self._state = self._state, new_state
+        if new_state == OPEN:
+            self._opened_at = time.monotonic()
+        if new_state != HALF_OPEN:
+            self._probe_in_flight = False
+        logger.warning(f"🔌 Circuito '{self.name}': {old_state} -> {new_state}")
+        if self._on_state_change:
+            self._on_state_change(old_state, new_state)
+
+    def allow_request(self) -> bool:
+        """True si la llamada puede salir (en half_open solo una sonda a la vez)"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self._failures = 0
+        self._transition(CLOSED)
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            self._transition(OPEN)
+
+    def record_cancelled(self):
+        """La llamada se canceló sin resultado: libera la sonda de half_open"""
+        self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        """Estado para /ready"""
+        return {"state": self.state, "consecutive_failures": self._failures}
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+class AdaptiveTimeout:
+    """
+    Timeout = p99 de las latencias recientes x `multiplier`, acotado a [min, max]
+    Hasta tener `min_samples` usa el máximo. Los timeouts se registran como
+    muestras con el valor del límite para que el timeout suba si el servicio se ralentiza
+    """
+
+    def __init__(
+        self,
+        min_seconds: float,
+        max_seconds: float,
+        multiplier: float = 1.5,
+        window: int = 200,
+        min_samples: int = 20
+    ):
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._sorted: Optional[List[float]] = None
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+        self._sorted = None
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Percentil `p` de la ventana, o None sin muestras suficientes"""
+        if len(self._samples) < self.min_samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        return _percentile(self._sorted, p)
+
+    def timeout(self) -> float:
+        p99 = self.percentile(99)
+        if p99 is None:
+            return self.max_seconds
+        return min(self.max_seconds, max(self.min_seconds, p99 * self.multiplier))
+
+    def hedge_delay(self) -> Optional[float]:
+        """Retardo antes de la petición de cobertura (p95), None sin muestras suficientes"""
+        return self.percentile(95)
+
+async def hedged(
+    make_call: Callable[[], Awaitable[T]],
+    hedge_after: Optional[float],
+    can_hedge: Optional[Callable[[], Awaitable[bool]]] = None,
+    on_hedge: Optional[Callable[[], None]] = None
+) -> T:
+    """
+    Ejecuta `make_call`; si no termina en `hedge_after` segundos y `await can_hedge()`,
+    lanza una segunda llamada y devuelve la primera que tenga éxito
+    Si ambas fallan se propaga el error de la última
+    """
+    first = asyncio.ensure_future(make_call())
+    tasks = {first}
+    try:
+        if hedge_after is not None:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done and (can_hedge is None or await can_hedge()):
+                if on_hedge:
+                    on_hedge()
+                tasks.add(asyncio.ensure_future(make_call()))
+
+        error: Optional[BaseException] = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # También si nos cancelan desde fuera (timeout total)
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,94 @@
+# api/responses.py
+"""
+Respuestas JSON rápidas (opt-in con FAST_JSON_ENABLED)
+- FastJSONResponse: serializa con orjson (fallback a json estándar)
+- compressed_json_response: para payloads construidos internamente (sin re-validar
+  con response_model) con gzip/brotli por encima de un tamaño mínimo
+- sse_event: evento Server-Sent Events con datos JSON
+"""
+
+import gzip
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from api.config import COMPRESSION_MIN_BYTES
+
+logger = logging.getLogger(__name__)
+
+# orjson y brotli son opcionales
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+def dumps(content: Any) -> bytes:
+    """Serializa a JSON (UUID y datetime soportados de forma nativa por orjson)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse renderizada con orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def _accepted_encodings(request: Request) -> Dict[str, float]:
+    """Codificaciones de Accept-Encoding con su q-value"""
+    encodings = {}
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        encodings[name.strip().lower()] = q
+    return encodings
+
+def compressed_json_response(
+    request: Request,
+    content: Any,
+    status_code: int = 200,
+    min_size: int = COMPRESSION_MIN_BYTES,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """
+    Respuesta JSON para payloads de confianza (construidos por el propio handler)
+    Comprime con brotli o gzip si el cliente lo acepta y el cuerpo supera `min_size`
+    """
+    body = dumps(content)
+    response_headers = {"Vary": "Accept-Encoding", **(headers or {})}
+
+    if len(body) >= min_size:
+        accepted = _accepted_encodings(request)
+        if BROTLI_AVAILABLE and accepted.get("br", 0) > 0:
+            body = brotli.compress(body, quality=4)
+            response_headers["Content-Encoding"] = "br"
+        elif accepted.get("gzip", 0) > 0:
+            body = gzip.compress(body, compresslevel=6)
+            response_headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=response_headers)
+
+# Cabeceras de un stream SSE: sin caché y sin buffering en proxies (nginx/Render)
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def sse_event(event: str, data: Any) -> bytes:
+    """Evento Server-Sent Events con `data` serializado a JSON en una línea"""
+    return b"event: " + event.encode("utf-8") + b"\ndata: " + dumps(data) + b"\n\n"
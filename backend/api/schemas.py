@@ -21,6 +21,8 @@ class GastoResponse(BaseModel):
     transaction_id: UUID
     parsed_data: Optional[dict] = Field(None, description="Datos parseados: amount, category, type")
     aury_response: Optional[str] = Field(None, description="Feature 7: Comentario sarcástico de Aury")
+    anomaly_score: Optional[float] = Field(None, description="z-score del importe frente a la media del usuario en la categoría (None sin historial suficiente)")
+    is_anomaly: bool = Field(default=False, description="True si |anomaly_score| supera ANOMALY_Z_THRESHOLD")
     message: str
 
 # ==================== FEATURE 6, 8: RACHA ====================
@@ -33,6 +35,31 @@ class RachaResponse(BaseModel):
     is_plus_user: bool = Field(default=False, description="V1.5: Siempre False. TODO V2.0: Feature 9 (Freemium)")
     last_activity_date: Optional[date]
 
+class RachaCalendarResponse(BaseModel):
+    """Mapa de calor del año desde el libro de actividad (bit i = día i del año, LSB primero)"""
+    google_id: str = Field(..., description="Google ID del usuario")
+    year: int
+    active_days: str = Field(..., description="46 bytes en base64: días con algún gasto")
+    freeze_days: str = Field(..., description="46 bytes en base64: días cubiertos por el protector semanal")
+    active_count: int = Field(..., ge=0)
+    freeze_count: int = Field(..., ge=0)
+    longest_streak: int = Field(..., ge=0, description="Mayor racha del año (días activos o protegidos)")
+
+class LeaderboardEntry(BaseModel):
+    """Puesto del top (sin datos de otros usuarios)"""
+    rank: int = Field(..., ge=1, description="Posición; empates comparten posición")
+    current_streak: int = Field(..., ge=0)
+    is_you: bool = False
+
+class RachaRankResponse(BaseModel):
+    """Posición de la racha actual frente al resto de usuarios"""
+    google_id: str = Field(..., description="Google ID del usuario")
+    current_streak: int = Field(..., ge=0)
+    rank: int = Field(..., ge=1, description="1 + usuarios con más racha")
+    total_users: int = Field(..., ge=0)
+    percentile: float = Field(..., ge=0, le=100, description="% de usuarios con menos racha")
+    top: List[LeaderboardEntry] = []
+
 # ==================== FEATURE 7: FEED CON ROAST ====================
 class GastoFeedItem(BaseModel):
     """Feature 7: Item del feed con roast de Aury"""
@@ -48,6 +75,20 @@ class GastoFeedResponse(BaseModel):
     gastos: List[GastoFeedItem]
     total: int
 
+class RecategorizeRequest(BaseModel):
+    """Corregir la categoría de un gasto (y de todos los del mismo comercio)"""
+    google_id: str = Field(..., description="Google ID del usuario")
+    transaction_id: UUID
+    category: str = Field(..., description="Categoría nueva (una de CATEGORY_KEYWORDS)")
+
+class RecategorizeResponse(BaseModel):
+    """Response de recategorizar"""
+    success: bool
+    merchant_key: Optional[str] = Field(None, description="Comercio normalizado (None si el texto no tiene)")
+    category: str
+    updated: int = Field(..., ge=0, description="Transacciones actualizadas")
+    message: str
+
 # ==================== FEATURE 1: GOOGLE AUTH ====================
 class GoogleAuthRequest(BaseModel):
     """Feature 1: Request de autenticación Google"""
@@ -144,3 +185,10 @@ class HealthCheckResponse(BaseModel):
     version: str
     timestamp: datetime
 
+class ReadinessResponse(BaseModel):
+    """Readiness del worker: listo solo cuando el warm-up ha terminado"""
+    status: str
+    ready: bool
+    warmup_ms: Optional[float] = None
+    steps: dict = Field(default_factory=dict, description="Resultado de cada paso del warm-up")
+    dependencies: dict = Field(default_factory=dict, description="Estado de dependencias externas (circuito de DeepSeek)")
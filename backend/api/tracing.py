@@ -0,0 +1,116 @@
+# api/tracing.py
+"""
+Tracing ligero por fases
+Spans con el modelo de datos de OpenTelemetry (trace_id/span_id hex, tiempos en
+unix nano, atributos, status) exportados en memoria y, opcionalmente, a un fichero
+JSON Lines para analizarlos con scripts/trace_report.py
+"""
+
+import os
+import json
+import time
+import random
+import logging
+import threading
+import functools
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from api.config import TRACE_SAMPLE_RATE, TRACE_EXPORT_PATH
+
+logger = logging.getLogger(__name__)
+
+# Últimas trazas completadas (exportador en memoria, útil en desarrollo)
+RECENT_TRACES: deque = deque(maxlen=200)
+_export_lock = threading.Lock()
+
+class _Trace:
+    """Traza en curso: acumula sus spans hasta que termina el span raíz"""
+
+    __slots__ = ("trace_id", "spans")
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List[Dict] = []
+
+_current_trace: ContextVar[Optional[_Trace]] = ContextVar("current_trace", default=None)
+_current_span_id: ContextVar[Optional[str]] = ContextVar("current_span_id", default=None)
+
+def _export(trace: _Trace):
+    """Guarda la traza en memoria y la añade al fichero de exportación (una línea por span)"""
+    RECENT_TRACES.append(trace.spans)
+    if not TRACE_EXPORT_PATH:
+        return
+    lines = "".join(json.dumps(s, ensure_ascii=False, default=str) + "\n" for s in trace.spans)
+    try:
+        with _export_lock, open(TRACE_EXPORT_PATH, "a", encoding="utf-8") as f:
+            f.write(lines)
+    except OSError as e:
+        logger.warning(f"⚠️ No se pudo exportar traza a {TRACE_EXPORT_PATH}: {e}")
+
+@contextmanager
+def _record_span(trace: _Trace, name: str, attributes: Dict):
+    span_id = os.urandom(8).hex()
+    parent_id = _current_span_id.get()
+    token = _current_span_id.set(span_id)
+    start_ns = time.time_ns()
+    status = "OK"
+    try:
+        yield
+    except Exception:
+        status = "ERROR"
+        raise
+    finally:
+        _current_span_id.reset(token)
+        trace.spans.append({
+            "trace_id": trace.trace_id,
+            "span_id": span_id,
+            "parent_span_id": parent_id,
+            "name": name,
+            "start_time_unix_nano": start_ns,
+            "end_time_unix_nano": time.time_ns(),
+            "attributes": attributes,
+            "status": status
+        })
+
+@contextmanager
+def start_trace(name: str, sample_rate: float = None, **attributes):
+    """
+    Abre una traza nueva (span raíz) si la petición sale muestreada
+    Los spans hijos (span()) solo se registran dentro de una traza muestreada
+    """
+    rate = TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate <= 0 or random.random() >= rate:
+        yield
+        return
+
+    trace = _Trace()
+    token = _current_trace.set(trace)
+    try:
+        with _record_span(trace, name, attributes):
+            yield
+    finally:
+        _current_trace.reset(token)
+        _export(trace)
+
+@contextmanager
+def span(name: str, **attributes):
+    """Span hijo de la traza actual (no-op si no hay traza muestreada)"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    with _record_span(trace, name, attributes):
+        yield
+
+def traced(name: str):
+    """Decorador: ejecuta una función síncrona dentro de un span hijo"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
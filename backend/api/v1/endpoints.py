@@ -3,17 +3,20 @@
 Endpoints V1 - Todas las rutas agrupadas para las 10 features core
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 from datetime import date, timedelta
 
-from api.database import get_db
+from api.database import get_db, SessionLocal
 from api.models import User, Transaction, Streak, DeviceSubscription
 from api.schemas import (
     GastoCreateRequest, GastoResponse, GastoFeedResponse, GastoFeedItem,
-    RachaResponse, WaitlistStatusResponse, UserGoalRequest, UserGoalResponse,
+    RecategorizeRequest, RecategorizeResponse,
+    RachaResponse, RachaCalendarResponse, RachaRankResponse, LeaderboardEntry, WaitlistStatusResponse, UserGoalRequest, UserGoalResponse,
     StreakFreezeRequest, StreakFreezeResponse,
     DeviceSubscriptionRequest, DeviceSubscriptionResponse,
     BetaStatusResponse,
@@ -21,11 +24,26 @@ from api.schemas import (
     # SubscriptionResponse,  # TODO V2.0: Descomentar cuando se implemente Feature 9
     GoogleAuthRequest, GoogleAuthResponse
 )
-from api.config import WAITLIST_LIMIT, MAX_BETA_USERS
-from api.v1.services.aury_service import parse_raw_text, generate_aury_response, parse_with_deepseek, generate_aury_with_deepseek
+from api.config import WAITLIST_LIMIT, MAX_BETA_USERS, FAST_JSON_ENABLED, ANALYTICAL_LOCAL_ENABLED
+from api.responses import compressed_json_response, sse_event, SSE_HEADERS
+from api.v1.services.aury_service import (
+    parse_raw_text, generate_aury_response, parse_with_deepseek, generate_aury_with_deepseek,
+    stream_aury_with_deepseek, AuryStreamError, polish_analytical_comment, stream_analytical_comment
+)
 from api.v1.services.streak_service import StreakService
+from api.v1.services.activity_service import ActivityService, ACTIVE, FREEZE, to_bits, longest_run
+from api.v1.services.leaderboard_service import LeaderboardService
 from api.v1.services.auth_service import AuthService
 from api.v1.services.notification_service import NotificationService
+from api.v1.services.idempotency_service import IdempotencyService, IdempotencyError
+from api.v1.services.merchant_service import MerchantMemoryService, RecategorizeError, merchant_key
+from api.v1.services.similarity_service import SimilarExpenseService
+from api.v1.services.analytical_service import generate_analytical_comment
+from api.v1.services.spending_stats_service import SpendingStatsService, AnomalyScore
+from api.tracing import start_trace, span
+from api.v1.helpers import bump_user_version, user_etag, etag_matches, not_modified, CONDITIONAL_CACHE_CONTROL
+import asyncio
+import base64
 import logging
 
 logger = logging.getLogger(__name__)
@@ -72,40 +90,152 @@ async def google_auth(
 @router.post("/gasto", response_model=GastoResponse, status_code=status.HTTP_201_CREATED)
 async def crear_gasto(
     request: GastoCreateRequest,
-    db: Session = Depends(get_db)
+    http_response: Response,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     Feature 4, 5, 7: Smart Text Input + Aury Parser + Feed con Roast
     Recibe texto libre, parsea con Aury, guarda transacción y genera comentario sarcástico
+    Con Idempotency-Key un reintento devuelve la respuesta original (Idempotent-Replayed: true)
     """
+    if not idempotency_key:
+        return await _registrar_gasto(request, db, background_tasks)
+    
     try:
-        # Obtener usuario por Google ID
-        user = AuthService.get_user_by_google_id(db, request.google_id)
-        if not user:
-            raise HTTPException(status_code=404, detail="Usuario no encontrado")
-        
-        # Feature 5: Parsear texto libre (básico por ahora, DeepSeek después)
-        parsed_data = await parse_with_deepseek(request.raw_text)
-        
-        # Obtener contexto del usuario para Aury (racha, objetivo y tono)
-        streak = StreakService.get_or_create_streak(db, user.id)
-        current_streak = streak.current_streak if streak else 0
-        user_goal = user.goal if user.goal else None
-        aury_tone = user.aury_tone if user.aury_tone else 'sarcastic'
+        response, replayed = await IdempotencyService.run(
+            db,
+            google_id=request.google_id,
+            key=idempotency_key,
+            request_hash=IdempotencyService.fingerprint(request.model_dump()),
+            handler=lambda: _registrar_gasto(request, db, background_tasks),
+            response_model=GastoResponse
+        )
+    except IdempotencyError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    if replayed:
+        http_response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+async def _registrar_gasto(request: GastoCreateRequest, db: Session, background_tasks: BackgroundTasks) -> GastoResponse:
+    """Parsea, genera el comentario de Aury, inserta la transacción y actualiza la racha"""
+    try:
+        with start_trace("crear_gasto"):
+            # Obtener usuario por Google ID
+            with span("gasto.user_lookup"):
+                user = AuthService.get_user_by_google_id(db, request.google_id)
+            if not user:
+                raise HTTPException(status_code=404, detail="Usuario no encontrado")
+            
+            # Feature 5: Parsear texto libre (memoria de comercios, local; DeepSeek solo si la confianza es baja)
+            with span("gasto.parse"):
+                parsed_data = await _parsear_gasto(db, user, request.raw_text)
+            
+            # Gasto inusual: z-score frente a la media del usuario en la categoría (una fila)
+            with span("gasto.anomaly"):
+                anomaly = SpendingStatsService.score_expense(db, user.id, parsed_data)
+            
+            # Obtener contexto del usuario para Aury (racha, objetivo y tono)
+            with span("gasto.streak_read"):
+                streak = StreakService.get_or_create_streak(db, user.id)
+            current_streak = streak.current_streak if streak else 0
+            user_goal = user.goal if user.goal else None
+            aury_tone = user.aury_tone if user.aury_tone else 'sarcastic'
+            
+            # Tono analítico: comentario local con cifras del historial (sin LLM)
+            with span("gasto.analytical"):
+                local_comment = _comentario_analitico(db, user, request.raw_text, parsed_data, current_streak, aury_tone, anomaly)
+            
+            # Gastos parecidos recientes del usuario (línea Historial del prompt)
+            history = None
+            if local_comment is None:
+                with span("gasto.similar"):
+                    history = SimilarExpenseService.summary(db, user.id, request.raw_text, parsed_data.get('category'))
+                # Índice frío: se carga después de responder (sin efecto si ya está en caché)
+                if history is None:
+                    background_tasks.add_task(SimilarExpenseService.warm, user.id)
+            
+            # Feature 7: Generar comentario de Aury con contexto y tono seleccionado
+            with span("gasto.aury", tone=aury_tone):
+                if local_comment is not None:
+                    aury_response = await polish_analytical_comment(local_comment, user.google_id)
+                else:
+                    aury_response = await generate_aury_with_deepseek(
+                        raw_text=request.raw_text,
+                        parsed_data=parsed_data,
+                        current_streak=current_streak,
+                        user_goal=user_goal,
+                        tone=aury_tone,
+                        rate_limit_key=user.google_id,
+                        history=history,
+                        anomaly=_contexto_inusual(anomaly)
+                    )
+            
+            transaction, streak_result = _guardar_gasto(db, user, request, parsed_data, aury_response)
         
-        # Feature 7: Generar comentario de Aury con contexto y tono seleccionado
-        aury_response = await generate_aury_with_deepseek(
-            raw_text=request.raw_text,
+        return GastoResponse(
+            success=True,
+            transaction_id=transaction.id,
             parsed_data=parsed_data,
-            current_streak=current_streak,
-            user_goal=user_goal,
-            tone=aury_tone
+            aury_response=aury_response,
+            **_campos_anomalia(anomaly),
+            message=f"Gasto registrado. {streak_result.get('message', '')}"
         )
         
-        # Crear transacción (usa user.id interno UUID)
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error registrando gasto: {e}")
+        raise HTTPException(status_code=500, detail=f"Error registrando gasto: {str(e)}")
+
+async def _parsear_gasto(db: Session, user: User, raw_text: str) -> dict:
+    """Parser por niveles con la categoría recordada del comercio del usuario como nivel 0"""
+    known_category = MerchantMemoryService.lookup(db, user.id, merchant_key(raw_text))
+    return await parse_with_deepseek(raw_text, known_category)
+
+def _comentario_analitico(
+    db: Session,
+    user: User,
+    raw_text: str,
+    parsed_data: dict,
+    current_streak: int,
+    aury_tone: str,
+    anomaly: Optional[AnomalyScore] = None
+) -> Optional[str]:
+    """Comentario del tono analítico calculado en local; None para los demás tonos o si está desactivado"""
+    if aury_tone != 'analytical' or not ANALYTICAL_LOCAL_ENABLED:
+        return None
+    index = SimilarExpenseService.get_index(db, user.id)
+    return generate_analytical_comment(index, raw_text, parsed_data, current_streak, user.goal, anomaly=anomaly)
+
+def _contexto_inusual(anomaly: Optional[AnomalyScore]) -> Optional[str]:
+    """Línea Inusual del prompt: solo si el importe supera el umbral (el resto no aporta)"""
+    return anomaly.render() if anomaly and anomaly.is_anomaly else None
+
+def _campos_anomalia(anomaly: Optional[AnomalyScore]) -> dict:
+    """anomaly_score / is_anomaly de GastoResponse"""
+    if anomaly is None:
+        return {"anomaly_score": None, "is_anomaly": False}
+    return {"anomaly_score": round(anomaly.z, 2), "is_anomaly": anomaly.is_anomaly}
+
+def _guardar_gasto(
+    db: Session,
+    user: User,
+    request: GastoCreateRequest,
+    parsed_data: dict,
+    aury_response: Optional[str]
+):
+    """Inserta la transacción, actualiza la racha y confirma. Retorna (transacción, resultado de racha)"""
+    # Crear transacción (usa user.id interno UUID)
+    key = merchant_key(request.raw_text)
+    with span("gasto.insert"):
         transaction = Transaction(
             user_id=user.id,  # UUID interno
             raw_text=request.raw_text,
+            merchant_key=key,
             amount=parsed_data.get('amount'),
             category=parsed_data.get('category'),
             type=parsed_data.get('type', 'expense'),
@@ -113,37 +243,226 @@ async def crear_gasto(
         )
         
         db.add(transaction)
-        
-        # Feature 8: Actualizar racha (usa user.id interno UUID)
-        streak_result = StreakService.update_streak(db, user.id)
-        
+        db.flush()
+    
+    # Estadísticas de la categoría (Welford + EWMA): un UPDATE atómico
+    with span("gasto.stats"):
+        SpendingStatsService.record(db, user.id, parsed_data)
+    
+    # Antes de la racha: update_streak confirma y caducaría user (un SELECT más para la versión)
+    bump_user_version(user)
+    user_id = user.id
+    
+    # Feature 8: Actualizar racha (usa user.id interno UUID)
+    with span("gasto.streak_update"):
+        streak_result = StreakService.update_streak(db, user_id)
+    
+    with span("gasto.commit"):
         db.commit()
         db.refresh(transaction)
-        
-        return GastoResponse(
-            success=True,
-            transaction_id=transaction.id,
-            parsed_data=parsed_data,
-            aury_response=aury_response,
-            message=f"Gasto registrado. {streak_result.get('message', '')}"
-        )
-        
+    MerchantMemoryService.learn(user_id, key, transaction.category)
+    SimilarExpenseService.add(user_id, transaction)
+    return transaction, streak_result
+
+def _guardar_aury_response(
+    transaction_id: UUID,
+    user_id: UUID,
+    aury_response: str,
+    idempotency: Optional[tuple] = None
+):
+    """
+    Persiste el comentario final del stream (sesión propia: la de la petición ya se cerró)
+    idempotency: (google_id, clave, GastoResponse) para completar la Idempotency-Key reservada
+    """
+    db = SessionLocal()
+    try:
+        db.query(Transaction)\
+            .filter(Transaction.id == transaction_id)\
+            .update({Transaction.aury_response: aury_response}, synchronize_session=False)
+        # El feed cambia: invalidar su ETag
+        db.query(User)\
+            .filter(User.id == user_id)\
+            .update({User.data_version: User.data_version + 1}, synchronize_session=False)
+        if idempotency:
+            google_id, key, response = idempotency
+            IdempotencyService.complete(db, google_id, key, response.model_dump_json())
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error guardando comentario de Aury en streaming: {e}")
+    finally:
+        db.close()
+
+@router.post("/gasto/stream")
+async def crear_gasto_stream(
+    request: GastoCreateRequest,
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Variante en streaming de /gasto (Server-Sent Events)
+    Guarda la transacción primero y reenvía los fragmentos de Aury según llegan:
+    - event: gasto -> {transaction_id, parsed_data, anomaly_score, is_anomaly, message}
+    - event: token -> {"text": fragmento}
+    - event: done  -> {"aury_response": texto final, "fallback": bool}
+    Si el stream falla a mitad, `done` lleva una plantilla con fallback=true y el
+    cliente reemplaza el texto parcial. El texto final se guarda en transactions.aury_response
+    Con Idempotency-Key un reintento recibe `gasto` + `done` de la respuesta guardada
+    """
+    if idempotency_key:
+        try:
+            stored = await IdempotencyService.reserve(
+                db, request.google_id, idempotency_key,
+                IdempotencyService.fingerprint(request.model_dump())
+            )
+        except IdempotencyError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+        if stored:
+            replay = GastoResponse.model_validate_json(stored)
+            events = [
+                sse_event("gasto", {
+                    "success": replay.success,
+                    "transaction_id": replay.transaction_id,
+                    "parsed_data": replay.parsed_data,
+                    "anomaly_score": replay.anomaly_score,
+                    "is_anomaly": replay.is_anomaly,
+                    "message": replay.message
+                }),
+                sse_event("done", {"aury_response": replay.aury_response, "fallback": False})
+            ]
+            headers = {**SSE_HEADERS, "Idempotent-Replayed": "true"}
+            return StreamingResponse(iter(events), media_type="text/event-stream", headers=headers)
+    
+    try:
+        with start_trace("crear_gasto_stream"):
+            with span("gasto.user_lookup"):
+                user = AuthService.get_user_by_google_id(db, request.google_id)
+            if not user:
+                raise HTTPException(status_code=404, detail="Usuario no encontrado")
+            
+            with span("gasto.parse"):
+                parsed_data = await _parsear_gasto(db, user, request.raw_text)
+            
+            # Gasto inusual: z-score frente a la media del usuario en la categoría (una fila)
+            with span("gasto.anomaly"):
+                anomaly = SpendingStatsService.score_expense(db, user.id, parsed_data)
+            
+            with span("gasto.streak_read"):
+                streak = StreakService.get_or_create_streak(db, user.id)
+            current_streak = streak.current_streak if streak else 0
+            user_goal = user.goal if user.goal else None
+            aury_tone = user.aury_tone if user.aury_tone else 'sarcastic'
+            
+            # Tono analítico: comentario local con cifras del historial (sin LLM)
+            with span("gasto.analytical"):
+                local_comment = _comentario_analitico(db, user, request.raw_text, parsed_data, current_streak, aury_tone, anomaly)
+            
+            # Gastos parecidos recientes del usuario (línea Historial del prompt)
+            history = None
+            if local_comment is None:
+                with span("gasto.similar"):
+                    history = SimilarExpenseService.summary(db, user.id, request.raw_text, parsed_data.get('category'))
+            
+            # Índice frío: se carga cuando termine el stream (sin efecto si ya está en caché)
+            warm_similar = BackgroundTask(SimilarExpenseService.warm, user.id) if local_comment is None and history is None else None
+            
+            # Guardar primero: el gasto queda registrado aunque el stream se corte
+            transaction, streak_result = _guardar_gasto(db, user, request, parsed_data, None)
+            transaction_id, user_id = transaction.id, user.id
     except HTTPException:
+        if idempotency_key:
+            IdempotencyService.release(db, request.google_id, idempotency_key)
         raise
     except Exception as e:
         db.rollback()
+        if idempotency_key:
+            IdempotencyService.release(db, request.google_id, idempotency_key)
         logger.error(f"Error registrando gasto: {e}")
         raise HTTPException(status_code=500, detail=f"Error registrando gasto: {str(e)}")
+    
+    message = f"Gasto registrado. {streak_result.get('message', '')}"
+    
+    def idempotency_result(aury_response: str) -> Optional[tuple]:
+        if not idempotency_key:
+            return None
+        return request.google_id, idempotency_key, GastoResponse(
+            success=True,
+            transaction_id=transaction_id,
+            parsed_data=parsed_data,
+            aury_response=aury_response,
+            **_campos_anomalia(anomaly),
+            message=message
+        )
+    
+    async def event_stream():
+        yield sse_event("gasto", {
+            "success": True,
+            "transaction_id": transaction_id,
+            "parsed_data": parsed_data,
+            **_campos_anomalia(anomaly),
+            "message": message
+        })
+        
+        parts = []
+        saved = False
+        try:
+            try:
+                if local_comment is not None:
+                    fragments = stream_analytical_comment(local_comment, request.google_id)
+                else:
+                    fragments = stream_aury_with_deepseek(
+                        raw_text=request.raw_text,
+                        parsed_data=parsed_data,
+                        current_streak=current_streak,
+                        user_goal=user_goal,
+                        tone=aury_tone,
+                        rate_limit_key=request.google_id,
+                        history=history,
+                        anomaly=_contexto_inusual(anomaly)
+                    )
+                async for fragment in fragments:
+                    parts.append(fragment)
+                    yield sse_event("token", {"text": fragment})
+                aury_response, fallback = "".join(parts).strip(), False
+            except AuryStreamError:
+                aury_response, fallback = generate_aury_response(
+                    request.raw_text,
+                    parsed_data.get('category'),
+                    parsed_data.get('amount')
+                ), True
+            
+            await asyncio.to_thread(
+                _guardar_aury_response, transaction_id, user_id, aury_response,
+                idempotency_result(aury_response)
+            )
+            saved = True
+            yield sse_event("done", {"aury_response": aury_response, "fallback": fallback})
+        finally:
+            if not saved:
+                # El cliente cerró la conexión: guardar una plantilla para que el feed no quede vacío
+                fallback_response = generate_aury_response(
+                    request.raw_text,
+                    parsed_data.get('category'),
+                    parsed_data.get('amount')
+                )
+                _guardar_aury_response(transaction_id, user_id, fallback_response, idempotency_result(fallback_response))
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS, background=warm_similar)
 
 # ==================== FEATURE 7: FEED CON ROAST ====================
 @router.get("/gastos/recent", response_model=GastoFeedResponse)
 def get_recent_gastos(
+    http_request: Request,
+    http_response: Response,
     google_id: str,
     limit: int = 20,
     db: Session = Depends(get_db)
 ):
     """
     Feature 7: Feed de gastos recientes con roast de Aury
+    Con FAST_JSON_ENABLED el payload se construye como dicts (sin re-validar con
+    response_model), se serializa con orjson y se comprime si supera el umbral
+    ETag por versión de datos del usuario: If-None-Match válido -> 304 sin leer transacciones
     """
     try:
         # Obtener usuario por Google ID
@@ -151,12 +470,32 @@ def get_recent_gastos(
         if not user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
+        etag = user_etag(user, "gastos_recent", limit)
+        if etag_matches(http_request, etag):
+            return not_modified(etag)
+        cache_headers = {"ETag": etag, "Cache-Control": CONDITIONAL_CACHE_CONTROL}
+        
         transactions = db.query(Transaction)\
             .filter(Transaction.user_id == user.id)\
             .order_by(Transaction.created_at.desc())\
             .limit(limit)\
             .all()
         
+        if FAST_JSON_ENABLED:
+            # Payload de confianza: mismos campos que GastoFeedItem, sin pasar por Pydantic
+            items = [
+                {
+                    "id": t.id,
+                    "amount": float(t.amount) if t.amount else None,
+                    "category": t.category,
+                    "raw_text": t.raw_text,
+                    "aury_response": t.aury_response,
+                    "created_at": t.created_at
+                }
+                for t in transactions
+            ]
+            return compressed_json_response(http_request, {"gastos": items, "total": len(items)}, headers=cache_headers)
+        
         gastos = [
             GastoFeedItem(
                 id=t.id,
@@ -169,6 +508,7 @@ def get_recent_gastos(
             for t in transactions
         ]
         
+        http_response.headers.update(cache_headers)
         return GastoFeedResponse(
             gastos=gastos,
             total=len(gastos)
@@ -180,9 +520,49 @@ def get_recent_gastos(
         logger.error(f"Error obteniendo gastos: {e}")
         raise HTTPException(status_code=500, detail=f"Error obteniendo gastos: {str(e)}")
 
+@router.post("/gastos/recategorize", response_model=RecategorizeResponse)
+def recategorizar_gasto(
+    request: RecategorizeRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Corrige la categoría de un gasto y la de todos los gastos del mismo comercio
+    del usuario; los gastos siguientes de ese comercio usan la categoría corregida
+    """
+    try:
+        user = AuthService.get_user_by_google_id(db, request.google_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        
+        user_id = user.id  # Tras el commit user caduca: sin SELECT extra
+        key, updated = MerchantMemoryService.recategorize(db, user_id, request.transaction_id, request.category)
+        bump_user_version(user)
+        db.commit()
+        MerchantMemoryService.invalidate(user_id)
+        SimilarExpenseService.invalidate(user_id)
+        
+        return RecategorizeResponse(
+            success=True,
+            merchant_key=key,
+            category=request.category,
+            updated=updated,
+            message=f"{updated} gasto(s) movidos a {request.category}"
+        )
+        
+    except RecategorizeError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error recategorizando gasto: {e}")
+        raise HTTPException(status_code=500, detail=f"Error recategorizando gasto: {str(e)}")
+
 # ==================== FEATURE 6, 8: RACHA ====================
 @router.get("/racha", response_model=RachaResponse)
 def get_racha(
+    http_request: Request,
+    http_response: Response,
     google_id: str,
     db: Session = Depends(get_db)
 ):
@@ -190,6 +570,7 @@ def get_racha(
     Feature 6: Dashboard Racha Centrado
     Feature 8: Incluye información de Freeze (Vidas Extra)
     V1.5: Sin lógica PLUS
+    El ETag incluye la fecha: el protector semanal disponible depende del día
     """
     try:
         # Obtener usuario por Google ID
@@ -197,13 +578,19 @@ def get_racha(
         if not user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
+        current_date = date.today()
+        etag = user_etag(user, "racha", current_date.isoformat())
+        if etag_matches(http_request, etag):
+            return not_modified(etag)
+        
         streak = StreakService.get_or_create_streak(db, user.id)  # user.id es UUID interno
         
         # V1.5: Verificar si tiene protector semanal disponible
-        current_date = date.today()
         has_weekly_freeze = StreakService.can_use_weekly_freeze(db, user, current_date)
         freeze_inventory = 1 if has_weekly_freeze else 0
         
+        http_response.headers["ETag"] = etag
+        http_response.headers["Cache-Control"] = CONDITIONAL_CACHE_CONTROL
         return RachaResponse(
             google_id=user.google_id,
             current_streak=streak.current_streak,
@@ -219,6 +606,87 @@ def get_racha(
         logger.error(f"Error obteniendo racha: {e}")
         raise HTTPException(status_code=500, detail=f"Error obteniendo racha: {str(e)}")
 
+@router.get("/racha/calendar", response_model=RachaCalendarResponse)
+def get_racha_calendar(
+    http_request: Request,
+    http_response: Response,
+    google_id: str,
+    year: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Mapa de calor de la racha: días activos y protegidos del año (por defecto, el actual)
+    Una fila de activity_years; recuentos y mayor racha con operaciones sobre los bits
+    """
+    try:
+        user = AuthService.get_user_by_google_id(db, google_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        
+        year = year or date.today().year
+        if not 2000 <= year <= date.today().year + 1:
+            raise HTTPException(status_code=400, detail="Año fuera de rango")
+        
+        etag = user_etag(user, "racha-calendar", year)
+        if etag_matches(http_request, etag):
+            return not_modified(etag)
+        
+        bitmaps = ActivityService.year(db, user.id, year)
+        active, frozen = to_bits(bitmaps[ACTIVE]), to_bits(bitmaps[FREEZE])
+        
+        http_response.headers["ETag"] = etag
+        http_response.headers["Cache-Control"] = CONDITIONAL_CACHE_CONTROL
+        return RachaCalendarResponse(
+            google_id=user.google_id,
+            year=year,
+            active_days=base64.b64encode(bitmaps[ACTIVE]).decode("ascii"),
+            freeze_days=base64.b64encode(bitmaps[FREEZE]).decode("ascii"),
+            active_count=active.bit_count(),
+            freeze_count=frozen.bit_count(),
+            longest_streak=longest_run(active | frozen)
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error obteniendo calendario de racha: {e}")
+        raise HTTPException(status_code=500, detail=f"Error obteniendo calendario de racha: {str(e)}")
+
+@router.get("/racha/rank", response_model=RachaRankResponse)
+def get_racha_rank(
+    google_id: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Clasificación: posición y percentil de la racha actual y top de rachas
+    Sale del histograma en memoria (leaderboard_service), sin contar filas de streaks
+    """
+    try:
+        user = AuthService.get_user_by_google_id(db, google_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        
+        streak = StreakService.get_or_create_streak(db, user.id)
+        rank, top = LeaderboardService.rank(db, user.id, streak.current_streak)
+        
+        return RachaRankResponse(
+            google_id=user.google_id,
+            current_streak=streak.current_streak,
+            rank=rank.rank,
+            total_users=rank.total_users,
+            percentile=rank.percentile,
+            top=[
+                LeaderboardEntry(rank=position, current_streak=value, is_you=is_you)
+                for position, value, is_you in top
+            ]
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error obteniendo clasificación de racha: {e}")
+        raise HTTPException(status_code=500, detail=f"Error obteniendo clasificación de racha: {str(e)}")
+
 # ==================== FEATURE 8: STREAK FREEZE ====================
 @router.post("/streak/freeze", response_model=StreakFreezeResponse)
 def use_freeze(
@@ -321,6 +789,7 @@ def set_user_goal(
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
         user.goal = request.goal
+        bump_user_version(user)
         db.commit()
         db.refresh(user)
         
@@ -354,6 +823,7 @@ def set_aury_tone(
         
         # Validar y actualizar tono
         user.aury_tone = request.tone
+        bump_user_version(user)
         db.commit()
         db.refresh(user)
         
@@ -378,6 +848,8 @@ def set_aury_tone(
 
 @router.get("/user/aury-tone")
 def get_aury_tone(
+    http_request: Request,
+    http_response: Response,
     google_id: str,
     db: Session = Depends(get_db)
 ):
@@ -389,6 +861,12 @@ def get_aury_tone(
         if not user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
+        etag = user_etag(user, "aury_tone")
+        if etag_matches(http_request, etag):
+            return not_modified(etag)
+        
+        http_response.headers["ETag"] = etag
+        http_response.headers["Cache-Control"] = CONDITIONAL_CACHE_CONTROL
         return {
             "tone": user.aury_tone or 'sarcastic',
             "tone_name": {
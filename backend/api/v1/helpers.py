@@ -3,10 +3,17 @@
 Helper functions para endpoints
 """
 
+import hashlib
+from fastapi import Request
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
 from api.models import User
+from api.metrics import record_cache
 from typing import Optional
 
+# Las lecturas del dashboard se revalidan siempre, pero solo las descarga quien no tiene la versión actual
+CONDITIONAL_CACHE_CONTROL = "private, no-cache"
+
 def get_user_by_google_id(db: Session, google_id: str) -> Optional[User]:
     """
     Helper para obtener usuario por Google ID
@@ -14,3 +21,28 @@ def get_user_by_google_id(db: Session, google_id: str) -> Optional[User]:
     """
     return db.query(User).filter(User.google_id == google_id).first()
 
+def bump_user_version(user: User):
+    """
+    Incrementa la versión de datos del usuario (invalida sus ETags)
+    Llamar en toda escritura que cambie lo que sirven /racha, /gastos/recent o /user/aury-tone
+    """
+    user.data_version = (user.data_version or 0) + 1
+
+def user_etag(user: User, resource: str, *extra) -> str:
+    """ETag fuerte derivado de (usuario, versión de datos, recurso, parámetros)"""
+    key = ":".join([str(user.id), str(user.data_version or 0), resource, *map(str, extra)])
+    return '"' + hashlib.sha1(key.encode("utf-8")).hexdigest()[:20] + '"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True si If-None-Match contiene el ETag actual (o '*')"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    matched = "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+    record_cache("http_etag", hit=matched)
+    return matched
+
+def not_modified(etag: str) -> Response:
+    """Respuesta 304 sin cuerpo"""
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CONDITIONAL_CACHE_CONTROL})
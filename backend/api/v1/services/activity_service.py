@@ -0,0 +1,167 @@
+# api/v1/services/activity_service.py
+"""
+Libro de actividad: mapas de bits por usuario y año (tabla activity_years)
+- active_days: días con algún gasto; freeze_days: días cubiertos por el protector semanal
+- Bit i (LSB primero) = día i del año desde 0; 46 bytes por mapa y año
+- Solo se añaden bits: lo mantienen update_streak (días activos y huecos protegidos)
+  y el rollover nocturno (días protegidos)
+- Las consultas por rango son operaciones de enteros sobre los bits (popcount y
+  desplazamientos), sin recorrer transactions
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List
+from uuid import UUID
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from api.models import ActivityYear
+
+logger = logging.getLogger(__name__)
+
+YEAR_BYTES = 46
+ACTIVE = "active_days"
+FREEZE = "freeze_days"
+EMPTY_YEAR = bytes(YEAR_BYTES)
+MARK_BATCH_SIZE = 1000
+
+def day_index(d: date) -> int:
+    """Posición del día en el mapa de su año (1 de enero = 0)"""
+    return d.timetuple().tm_yday - 1
+
+def to_bits(bitmap: bytes) -> int:
+    return int.from_bytes(bitmap or EMPTY_YEAR, "little")
+
+def from_bits(bits: int) -> bytes:
+    return bits.to_bytes(YEAR_BYTES, "little")
+
+def longest_run(bits: int) -> int:
+    """Mayor número de bits a 1 consecutivos: cada vuelta de n & (n >> 1) acorta todas las rachas en 1"""
+    length = 0
+    while bits:
+        bits &= bits >> 1
+        length += 1
+    return length
+
+def gap_days(last: date, activity_date: date) -> List[date]:
+    """Días sin actividad entre last y activity_date (excluidos ambos)"""
+    return [last + timedelta(days=i) for i in range(1, (activity_date - last).days)]
+
+def _days_by_year(days: Iterable[date]) -> Dict[int, int]:
+    """año -> máscara con los días dados"""
+    masks: Dict[int, int] = defaultdict(int)
+    for d in days:
+        masks[d.year] |= 1 << day_index(d)
+    return masks
+
+class ActivityService:
+    """Servicio del libro de actividad"""
+
+    @staticmethod
+    def _insert_year(db: Session, user_id: UUID, year: int, kind: str, mask: int) -> bool:
+        """Crea la fila del año con los días dados; False si ya existía (la creó otro gasto a la vez)"""
+        values = {"user_id": user_id, "year": year, ACTIVE: EMPTY_YEAR, FREEZE: EMPTY_YEAR, kind: from_bits(mask)}
+        dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(db.get_bind().dialect.name)
+        if dialect is not None:
+            # Una sentencia en lugar de SAVEPOINT + INSERT + RELEASE
+            statement = dialect.insert(ActivityYear).values(**values).on_conflict_do_nothing(
+                index_elements=[ActivityYear.user_id, ActivityYear.year]
+            )
+            return db.execute(statement).rowcount == 1
+        try:
+            with db.begin_nested():
+                db.add(ActivityYear(**values))
+            return True
+        except IntegrityError:
+            return False
+
+    @staticmethod
+    def mark(db: Session, user_id: UUID, days: Iterable[date], kind: str = ACTIVE):
+        """Marca días de un usuario (kind: ACTIVE o FREEZE). No hace commit"""
+        for year, mask in _days_by_year(days).items():
+            row = db.query(ActivityYear)\
+                .filter(ActivityYear.user_id == user_id, ActivityYear.year == year)\
+                .first()
+            if row is None:
+                if ActivityService._insert_year(db, user_id, year, kind, mask):
+                    continue
+                # Otro gasto del mismo usuario creó el año a la vez: basta con actualizarlo
+                row = db.query(ActivityYear)\
+                    .filter(ActivityYear.user_id == user_id, ActivityYear.year == year)\
+                    .one()
+            current = to_bits(getattr(row, kind))
+            if current | mask != current:
+                setattr(row, kind, from_bits(current | mask))
+
+    @staticmethod
+    def mark_many(db: Session, user_ids: List[UUID], day: date, kind: str = FREEZE):
+        """Marca el mismo día a muchos usuarios (rollover): lecturas y escrituras por lotes. No hace commit"""
+        bit = 1 << day_index(day)
+        for i in range(0, len(user_ids), MARK_BATCH_SIZE):
+            batch = user_ids[i:i + MARK_BATCH_SIZE]
+            column = getattr(ActivityYear, kind)
+            existing = dict(
+                db.query(ActivityYear.user_id, column)
+                .filter(ActivityYear.user_id.in_(batch), ActivityYear.year == day.year)
+                .all()
+            )
+            # Solo la columna marcada: no pisa los días activos que escriba update_streak a la vez
+            updates = [
+                {"user_id": user_id, "year": day.year, kind: from_bits(to_bits(bitmap) | bit)}
+                for user_id, bitmap in existing.items()
+                if not to_bits(bitmap) & bit
+            ]
+            inserts = [
+                {"user_id": user_id, "year": day.year, ACTIVE: EMPTY_YEAR, FREEZE: EMPTY_YEAR, kind: from_bits(bit)}
+                for user_id in batch
+                if user_id not in existing
+            ]
+            if updates:
+                db.bulk_update_mappings(ActivityYear, updates)
+            if inserts:
+                db.bulk_insert_mappings(ActivityYear, inserts)
+
+    @staticmethod
+    def year(db: Session, user_id: UUID, year: int) -> Dict[str, bytes]:
+        """Mapas del año ({ACTIVE: bytes, FREEZE: bytes}); vacíos si no hay fila"""
+        row = db.query(ActivityYear.active_days, ActivityYear.freeze_days)\
+            .filter(ActivityYear.user_id == user_id, ActivityYear.year == year)\
+            .first()
+        return {
+            ACTIVE: bytes(row.active_days) if row else EMPTY_YEAR,
+            FREEZE: bytes(row.freeze_days) if row else EMPTY_YEAR
+        }
+
+    @staticmethod
+    def range_bits(db: Session, user_id: UUID, start: date, end: date, kinds=(ACTIVE, FREEZE)) -> int:
+        """Entero con bit k = día start + k (OR de los mapas pedidos), de start a end incluidos"""
+        rows = db.query(ActivityYear)\
+            .filter(
+                ActivityYear.user_id == user_id,
+                ActivityYear.year >= start.year,
+                ActivityYear.year <= end.year
+            )\
+            .all()
+        bits = 0
+        for row in rows:
+            year_bits = 0
+            for kind in kinds:
+                year_bits |= to_bits(getattr(row, kind))
+            shift = date(row.year, 1, 1).toordinal() - start.toordinal()
+            bits |= year_bits << shift if shift >= 0 else year_bits >> -shift
+        length = (end - start).days + 1
+        return bits & ((1 << length) - 1)
+
+    @staticmethod
+    def longest_streak(db: Session, user_id: UUID, start: date, end: date) -> int:
+        """Mayor racha entre start y end (días activos o protegidos)"""
+        return longest_run(ActivityService.range_bits(db, user_id, start, end))
+
+    @staticmethod
+    def active_days(db: Session, user_id: UUID, start: date, end: date) -> int:
+        """Días con actividad entre start y end (popcount)"""
+        return ActivityService.range_bits(db, user_id, start, end, kinds=(ACTIVE,)).bit_count()
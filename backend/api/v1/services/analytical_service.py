@@ -0,0 +1,302 @@
+# api/v1/services/analytical_service.py
+"""
+Generador local del tono analítico de Aury (sin LLM)
+- Cifras reales del historial del usuario (índice de similarity_service, ya en caché):
+  peso en el gasto del mes, tendencia semanal, acumulado de la categoría,
+  repeticiones, días de gasto medio y días de ahorro hacia el objetivo
+- Si el importe es inusual (spending_stats_service), la desviación abre el comentario
+- Gramática de plantillas: apertura + hecho principal + hecho secundario + cierre,
+  con variantes elegidas por una semilla del texto y el día (mismo gasto, mismo comentario)
+- Pulido opcional con DeepSeek (ANALYTICAL_LLM_POLISH, ver aury_service.polish_analytical_comment)
+"""
+
+import re
+import zlib
+import random
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from api.v1.services.similarity_service import ExpenseIndex
+from api.v1.services.spending_stats_service import AnomalyScore
+
+SAVINGS_CATEGORY = '💰 Ahorros'
+CATEGORY_CLEAN_REGEX = re.compile(r'[^\w\s]')
+# Importe en formato español: "1500", "1.500", "1.500,50", "2,5"
+_AMOUNT = r'\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+(?:,\d+)?'
+# Solo con marca de moneda o "k": "en 2027" o "2 bicis" no son importes
+GOAL_AMOUNT_REGEX = re.compile(
+    rf'€\s*(?P<before>{_AMOUNT})(?!\d|[.,]\d)'
+    rf'|(?<!\d)(?<!\d[.,])(?P<after>{_AMOUNT})\s*(?P<unit>€|euros?\b|eur\b|k\b)',
+    re.IGNORECASE
+)
+TREND_MIN_CHANGE = 0.15   # Por debajo la tendencia semanal no es noticia
+REPEATS_MIN = 3
+
+@dataclass
+class SpendingFigures:
+    """Cifras del gasto actual frente al historial (el gasto actual ya sumado)"""
+    amount: float
+    category: str
+    is_income: bool
+    month_total: float
+    category_month_total: float
+    week_total: float
+    prev_week_total: float
+    spend_30d: float
+    savings_30d: float
+    category_count_30d: int
+    history_days: int           # Días cubiertos por el historial (máx. 30): base de las medias diarias
+    history_size: int
+    streak: int
+    goal: Optional[str]
+    goal_amount: Optional[float]
+    anomaly: Optional[AnomalyScore] = None
+
+def _goal_amount(goal: Optional[str]) -> Optional[float]:
+    """Importe del objetivo si el texto lo incluye ("Viaje a Japón 2000€", "Ahorrar 1.500€", "coche 5k")"""
+    match = GOAL_AMOUNT_REGEX.search(goal or "")
+    if not match:
+        return None
+    number = match.group('before') or match.group('after')
+    value = float(number.replace('.', '').replace(',', '.'))
+    if (match.group('unit') or '').lower() == 'k':
+        value *= 1000
+    return value if value > 0 else None
+
+def compute_figures(
+    index: ExpenseIndex,
+    amount: float,
+    category: Optional[str],
+    is_income: bool,
+    current_streak: int,
+    goal: Optional[str],
+    today: date,
+    anomaly: Optional[AnomalyScore] = None
+) -> SpendingFigures:
+    """Una pasada por la ventana del historial (índice de similarity_service)"""
+    category = category or '❓ Otros'
+    today_ord = today.toordinal()
+    month_start = today.replace(day=1).toordinal()
+    month_total = category_month = week = prev_week = spend_30 = savings_30 = 0.0
+    category_count = 0
+    # Filas en orden cronológico: solo se recorre la ventana (últimos 30 días o el mes)
+    start = bisect_left(index.days, min(today_ord - 30, month_start))
+    for value, day, cat in zip(index.amounts[start:], index.days[start:], index.categories[start:]):
+        if cat == SAVINGS_CATEGORY:
+            if day >= today_ord - 30:
+                savings_30 += value
+            continue
+        if day >= month_start:
+            month_total += value
+            if cat == category:
+                category_month += value
+        if day > today_ord - 7:
+            week += value
+        elif day > today_ord - 14:
+            prev_week += value
+        if day >= today_ord - 30:
+            spend_30 += value
+            category_count += cat == category
+
+    # El gasto actual todavía no está en el índice
+    if category == SAVINGS_CATEGORY and not is_income:
+        savings_30 += amount
+    elif not is_income:
+        month_total += amount
+        category_month += amount
+        week += amount
+        category_count += 1
+    first_day = index.days[0] if len(index) else today_ord
+    history_days = max(1, min(30, today_ord - first_day + 1))
+    return SpendingFigures(
+        amount=amount,
+        category=category,
+        is_income=is_income,
+        month_total=month_total,
+        category_month_total=category_month,
+        week_total=week,
+        prev_week_total=prev_week,
+        spend_30d=spend_30,
+        savings_30d=savings_30,
+        category_count_30d=category_count,
+        history_days=history_days,
+        history_size=len(index),
+        streak=current_streak,
+        goal=goal,
+        goal_amount=_goal_amount(goal),
+        anomaly=anomaly
+    )
+
+# --- Gramática --------------------------------------------------------------
+
+def _eur(value: float) -> str:
+    return f"{value:.2f}".rstrip('0').rstrip('.') + "€"
+
+def _pct(value: float) -> str:
+    return f"{value:.1%}" if value < 0.01 else f"{value:.0%}"
+
+def _days(value: float) -> str:
+    return f"{value:.1f}".rstrip('0').rstrip('.')
+
+OPENERS = ("Dato:", "Cifras:", "Análisis:", "Registro:")
+
+# Hechos por prioridad: el primero disponible abre, el segundo se elige entre los dos siguientes
+FACTS: Dict[str, Tuple[str, ...]] = {
+    'anomaly': (
+        "{monto} está {desv} desviaciones {encima_debajo} de tu media en {categoria} ({media_cat})",
+        "tu media en {categoria} es {media_cat}; este gasto se aleja {desv} desviaciones típicas",
+    ),
+    'goal_days': (
+        "{monto} equivalen a {dias_ahorro} días de tu ritmo de ahorro{objetivo_txt}",
+        "este gasto retrasa {dias_ahorro} días tu objetivo{objetivo_txt} al ritmo de ahorro actual",
+    ),
+    'goal_share': (
+        "{monto} son el {pct_objetivo} de tu objetivo ({objetivo_total})",
+        "este gasto consume el {pct_objetivo} de los {objetivo_total} del objetivo",
+    ),
+    'week_trend': (
+        "tu gasto semanal {sube_baja} un {pct_semana} ({semana} frente a {semana_prev})",
+        "{semana} en 7 días, un {pct_semana} {mas_menos} que la semana anterior",
+    ),
+    'month_share': (
+        "{monto} en {categoria} = {pct_mes} de tu gasto del mes ({mes})",
+        "este gasto es el {pct_mes} de los {mes} que llevas este mes",
+    ),
+    'category_share': (
+        "{categoria} acumula {cat_mes} este mes, el {pct_cat} del total",
+        "el {pct_cat} de tu gasto mensual ya es {categoria} ({cat_mes})",
+    ),
+    'repeats': (
+        "es tu gasto número {repeticiones} en {categoria} en 30 días",
+        "{repeticiones} gastos en {categoria} en los últimos 30 días",
+    ),
+    'daily_average': (
+        "{monto} equivalen a {dias_gasto} días de tu gasto medio ({diario}/día)",
+        "tu gasto medio es {diario}/día: esto son {dias_gasto} días",
+    ),
+}
+FACT_PRIORITY = ('anomaly', 'goal_days', 'goal_share', 'week_trend', 'month_share', 'category_share', 'repeats', 'daily_average')
+
+CLOSERS = (
+    "",
+    " Racha: {racha}.",
+    " Coste de oportunidad anotado.",
+    " Los números no opinan; describen.",
+)
+
+NO_HISTORY = (
+    "Dato: {monto} en {categoria}. Historial insuficiente para porcentajes; cada registro mejora la estadística.",
+    "Registro: {monto} en {categoria}. Sin datos previos no hay comparación posible, todavía.",
+)
+INCOME = (
+    "Ingreso: {monto}. Cubre {dias_gasto} días de tu gasto medio ({diario}/día).",
+    "Dato: {monto} de ingreso frente a {gasto_30} gastados en 30 días ({pct_ingreso}).",
+)
+INCOME_NO_HISTORY = ("Ingreso registrado: {monto}. Sin gasto previo con el que compararlo.",)
+NO_AMOUNT = (
+    "Registro: {categoria} sin importe. Sin cifra no hay análisis posible.",
+    "Dato incompleto: {categoria}, importe desconocido. Un número ayudaría bastante.",
+)
+SAVINGS = (
+    "Ahorro: {monto}, el {pct_ahorro} de lo ahorrado en 30 días ({ahorro_30}).",
+    "Dato: {monto} a ahorro; acumulas {ahorro_30} en 30 días.",
+)
+
+def _values(f: SpendingFigures) -> Dict[str, str]:
+    daily = f.spend_30d / f.history_days
+    savings_daily = f.savings_30d / f.history_days
+    change = f.week_total / f.prev_week_total - 1 if f.prev_week_total else 0.0
+    return {
+        'monto': _eur(f.amount),
+        'categoria': CATEGORY_CLEAN_REGEX.sub('', f.category).strip() or 'Otros',
+        'mes': _eur(f.month_total),
+        'pct_mes': _pct(f.amount / f.month_total) if f.month_total else '',
+        'cat_mes': _eur(f.category_month_total),
+        'pct_cat': _pct(f.category_month_total / f.month_total) if f.month_total else '',
+        'semana': _eur(f.week_total),
+        'semana_prev': _eur(f.prev_week_total),
+        'pct_semana': _pct(abs(change)),
+        'sube_baja': 'sube' if change >= 0 else 'baja',
+        'mas_menos': 'más' if change >= 0 else 'menos',
+        'repeticiones': str(f.category_count_30d),
+        'diario': _eur(daily),
+        'dias_gasto': _days(f.amount / daily) if daily else '',
+        'gasto_30': _eur(f.spend_30d),
+        'pct_ingreso': _pct(f.amount / f.spend_30d) if f.spend_30d else '',
+        'dias_ahorro': _days(f.amount / savings_daily) if savings_daily else '',
+        'ahorro_30': _eur(f.savings_30d),
+        'pct_ahorro': _pct(f.amount / f.savings_30d) if f.savings_30d else '',
+        'objetivo_txt': f" («{f.goal}»)" if f.goal else '',
+        'objetivo_total': _eur(f.goal_amount) if f.goal_amount else '',
+        'pct_objetivo': _pct(f.amount / f.goal_amount) if f.goal_amount else '',
+        'desv': f"{abs(f.anomaly.z):.1f}" if f.anomaly else '',
+        'encima_debajo': 'por encima' if f.anomaly and f.anomaly.z > 0 else 'por debajo',
+        'media_cat': _eur(f.anomaly.mean) if f.anomaly else '',
+        'racha': f"{f.streak} día" if f.streak == 1 else f"{f.streak} días",
+    }
+
+def available_facts(f: SpendingFigures) -> List[str]:
+    """Hechos con datos suficientes, en orden de prioridad"""
+    has_history = f.history_size > 0 and f.month_total > f.amount
+    checks = {
+        'anomaly': f.anomaly is not None and f.anomaly.is_anomaly,
+        'goal_days': f.savings_30d > 0,
+        'goal_share': f.goal_amount is not None and f.amount / f.goal_amount >= 0.005,
+        'week_trend': f.prev_week_total > 0 and abs(f.week_total / f.prev_week_total - 1) >= TREND_MIN_CHANGE,
+        'month_share': has_history,
+        'category_share': has_history and f.category_month_total > f.amount and not f.category.startswith('❓'),
+        'repeats': f.category_count_30d >= REPEATS_MIN and not f.category.startswith('❓'),
+        'daily_average': f.spend_30d > 0,
+    }
+    return [name for name in FACT_PRIORITY if checks[name]]
+
+def render_analytical(figures: SpendingFigures, seed: int) -> str:
+    """Comentario analítico determinista (misma semilla y cifras, mismo texto)"""
+    rng = random.Random(seed)
+    values = _values(figures)
+    if not figures.amount:
+        return rng.choice(NO_AMOUNT).format(**values)
+    if figures.is_income:
+        templates = INCOME if figures.spend_30d else INCOME_NO_HISTORY
+        return rng.choice(templates).format(**values)
+    if figures.category == SAVINGS_CATEGORY:
+        return rng.choice(SAVINGS).format(**values)
+
+    facts = available_facts(figures)
+    if not facts:
+        return rng.choice(NO_HISTORY).format(**values)
+    chosen = [facts[0]]
+    if len(facts) > 1:
+        chosen.append(rng.choice(facts[1:3]))
+    clauses = [rng.choice(FACTS[name]).format(**values) for name in chosen]
+    closer = rng.choice(CLOSERS if figures.streak > 0 else CLOSERS[:1] + CLOSERS[2:])
+    return f"{rng.choice(OPENERS)} {'; '.join(clauses)}.{closer.format(**values)}"
+
+def analytical_seed(raw_text: str, today: date) -> int:
+    """Semilla estable por texto y día: un reintento produce el mismo comentario"""
+    return zlib.crc32(f"{today.isoformat()}|{raw_text}".encode('utf-8'))
+
+def generate_analytical_comment(
+    index: ExpenseIndex,
+    raw_text: str,
+    parsed_data: Dict,
+    current_streak: int,
+    user_goal: Optional[str],
+    today: Optional[date] = None,
+    anomaly: Optional[AnomalyScore] = None
+) -> str:
+    """Comentario del tono analítico a partir del historial, sin llamadas a DeepSeek"""
+    today = today or date.today()
+    figures = compute_figures(
+        index,
+        float(parsed_data.get('amount') or 0.0),
+        parsed_data.get('category'),
+        parsed_data.get('type') == 'income',
+        current_streak,
+        user_goal,
+        today,
+        anomaly
+    )
+    return render_analytical(figures, analytical_seed(raw_text, today))
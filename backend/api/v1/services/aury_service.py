@@ -6,14 +6,99 @@ Integrado con DeepSeek API para respuestas dinámicas
 """
 
 import re
+import json
+import time
+import asyncio
 import random
-from typing import Dict, Optional, Tuple
+import unicodedata
+from collections import OrderedDict
+from functools import partial
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import logging
 import httpx
-from api.config import DEEPSEEK_API_KEY, DEEPSEEK_API_URL
+from api.config import (
+    DEEPSEEK_API_KEY, DEEPSEEK_API_URL, DEEPSEEK_TIMEOUT_SECONDS, DEEPSEEK_TIMEOUT_MIN_SECONDS,
+    DEEPSEEK_BREAKER_FAILURES, DEEPSEEK_BREAKER_RECOVERY_SECONDS, DEEPSEEK_HEDGING_ENABLED,
+    AURY_BATCH_ENABLED, AURY_BATCH_WINDOW_MS, AURY_BATCH_MAX_SIZE,
+    PARSE_LLM_ENABLED, PARSE_CONFIDENCE_THRESHOLD, PARSE_LLM_TIMEOUT_SECONDS, PARSE_CACHE_SIZE,
+    CATEGORY_MODEL_MIN_PROB, ANALYTICAL_LLM_POLISH, ANALYTICAL_POLISH_TIMEOUT_SECONDS
+)
+from api.metrics import (
+    DEEPSEEK_REQUEST_DURATION, DEEPSEEK_CIRCUIT_STATE, DEEPSEEK_CIRCUIT_TRANSITIONS,
+    DEEPSEEK_TIMEOUT, DEEPSEEK_HEDGES, DEEPSEEK_FIRST_TOKEN, DEEPSEEK_TOKENS,
+    DEEPSEEK_USAGE_RESPONSES, AURY_BATCH_SIZE, AURY_BATCH_ITEMS, PARSE_REQUESTS, PARSE_DURATION,
+    ANALYTICAL_COMMENTS, record_cache
+)
+from api.resilience import CircuitBreaker, AdaptiveTimeout, hedged, OPEN, STATE_VALUES
+from api.tracing import span
+from api.rate_limit import allow, refund, GASTO_LLM_LIMIT, DEEPSEEK_GLOBAL_LIMIT
+from api.v1.services.category_classifier import get_classifier
+from api.v1.services.prompt_registry import (
+    PromptTemplate, get_prompt, render_context, build_messages, batch_prompt, render_batch, parse_prompt,
+    POLISH_PROMPT
+)
 
 logger = logging.getLogger(__name__)
 
+def _on_circuit_change(old_state: str, new_state: str):
+    DEEPSEEK_CIRCUIT_STATE.set(STATE_VALUES[new_state])
+    DEEPSEEK_CIRCUIT_TRANSITIONS.labels(state=new_state).inc()
+
+# Circuit breaker y timeout adaptativo por worker: con DeepSeek caído se responde
+# al instante con plantillas en lugar de esperar el timeout en cada gasto
+DEEPSEEK_BREAKER = CircuitBreaker(
+    "deepseek",
+    failure_threshold=DEEPSEEK_BREAKER_FAILURES,
+    recovery_seconds=DEEPSEEK_BREAKER_RECOVERY_SECONDS,
+    on_state_change=_on_circuit_change
+)
+DEEPSEEK_LATENCY = AdaptiveTimeout(
+    min_seconds=DEEPSEEK_TIMEOUT_MIN_SECONDS,
+    max_seconds=DEEPSEEK_TIMEOUT_SECONDS
+)
+
+def deepseek_status() -> Dict:
+    """Estado del circuito y timeout actual (para /ready)"""
+    return {
+        **DEEPSEEK_BREAKER.snapshot(),
+        "timeout_s": round(DEEPSEEK_LATENCY.timeout(), 3),
+        "hedging": DEEPSEEK_HEDGING_ENABLED
+    }
+
+# Cliente HTTP compartido para DeepSeek (keep-alive entre peticiones del worker)
+_deepseek_client: Optional[httpx.AsyncClient] = None
+
+def get_deepseek_client() -> httpx.AsyncClient:
+    """
+    Devuelve el cliente HTTP compartido para DeepSeek
+    Se crea bajo demanda para reutilizar conexiones TLS entre llamadas
+    """
+    global _deepseek_client
+    if _deepseek_client is None or _deepseek_client.is_closed:
+        _deepseek_client = httpx.AsyncClient(
+            timeout=DEEPSEEK_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=60.0)
+        )
+    return _deepseek_client
+
+async def close_deepseek_client():
+    """Cierra el cliente HTTP compartido (shutdown de la app)"""
+    global _deepseek_client
+    if _deepseek_client is not None:
+        await _deepseek_client.aclose()
+        _deepseek_client = None
+
+async def warm_up_deepseek() -> bool:
+    """
+    Abre la conexión keep-alive con DeepSeek (DNS + TLS) antes de la primera petición
+    El código de estado no importa: solo interesa dejar la conexión en el pool
+    """
+    if not DEEPSEEK_API_KEY:
+        return False
+    client = get_deepseek_client()
+    await client.request("HEAD", DEEPSEEK_API_URL)
+    return True
+
 # Feature 5: Parsing básico antes de DeepSeek
 # Regex patterns para extraer información básica
 AMOUNT_PATTERNS = [
@@ -22,6 +107,10 @@ AMOUNT_PATTERNS = [
     r'(\d+[.,]?\d*)',  # Fallback: solo número
 ]
 
+# Compilados una sola vez al importar (evita compilar en la primera petición)
+AMOUNT_REGEXES = [re.compile(pattern) for pattern in AMOUNT_PATTERNS]
+CATEGORY_CLEAN_REGEX = re.compile(r'[^\w\s]')
+
 CATEGORY_KEYWORDS = {
     '🍔 Comida': ['comida', 'pizza', 'hamburguesa', 'restaurante', 'cena', 'almuerzo', 'desayuno', 'cenas'],
     '🚗 Transporte': ['taxi', 'uber', 'gasolina', 'parking', 'metro', 'bus', 'transporte'],
@@ -63,49 +152,124 @@ AURY_RESPONSES = {
     ]
 }
 
-def parse_raw_text(raw_text: str) -> Dict[str, Optional[str]]:
+INCOME_KEYWORDS = ['ingreso', 'salario', 'pago recibido', 'dinero entrante']
+# Categorías coherentes con un ingreso (con otra categoría el tipo es ambiguo)
+INCOME_CATEGORIES = ('💼 Ingresos', '💰 Ahorros', '❓ Otros')
+
+# Penalizaciones de confianza del parser local (se multiplican)
+PARSE_PENALTIES = {
+    'no_amount': 0.2,            # Sin importe: el gasto no sirve
+    'no_category': 0.5,          # Ninguna palabra clave: '❓ Otros' por defecto
+    'ambiguous_type': 0.6,       # Ingreso con categoría de gasto (o al revés)
+    'ambiguous_category': 0.7,   # Palabras clave de varias categorías
+    'model_category': 0.85,      # Categoría del clasificador local (sin palabra clave decisiva)
+    'bare_amount': 0.9           # Número sin moneda
+}
+
+# (palabra clave, categoría) en el orden de CATEGORY_KEYWORDS: un solo recorrido por texto
+CATEGORY_KEYWORD_PAIRS = [(kw, cat) for cat, keywords in CATEGORY_KEYWORDS.items() for kw in keywords]
+
+def _matched_categories(raw_text_lower: str) -> List[str]:
+    """
+    Categorías con alguna palabra clave en el texto, en el orden de CATEGORY_KEYWORDS
+    La primera es la categoría elegida; para detectar ambigüedad se ignoran las que solo
+    coinciden por una palabra contenida en otra más larga ('gas' dentro de 'gasolina')
     """
-    Feature 5: Parsing básico de texto libre
-    TODO: Integrar DeepSeek para parsing inteligente
+    matches = [(kw, cat) for kw, cat in CATEGORY_KEYWORD_PAIRS if kw in raw_text_lower]
+    if not matches:
+        return []
+    first = matches[0][1]
+    categories = [first]
+    for kw, cat in matches:
+        if cat in categories:
+            continue
+        if not any(kw != other and kw in other for other, _ in matches):
+            categories.append(cat)
+    return categories
+
+def parse_raw_text_with_confidence(
+    raw_text: str,
+    known_category: Optional[str] = None
+) -> Tuple[Dict[str, Optional[str]], float, List[str]]:
+    """
+    Feature 5: Parsing local (nivel 1) con puntuación de confianza
     
     Args:
         raw_text: Texto libre del usuario (ej: "Cenas 20 euros")
+        known_category: Categoría ya conocida (memoria de comercios); omite la detección
         
     Returns:
-        Dict con amount, category, type parseados
+        (dict con amount, category, type; confianza 0-1; motivos de la penalización)
     """
     raw_text_lower = raw_text.lower()
+    reasons: List[str] = []
     
     # Extraer monto
     amount = None
-    for pattern in AMOUNT_PATTERNS:
-        match = re.search(pattern, raw_text_lower)
+    for i, regex in enumerate(AMOUNT_REGEXES):
+        match = regex.search(raw_text_lower)
         if match:
             amount_str = match.group(1).replace(',', '.')
             try:
                 amount = float(amount_str)
+                if i == len(AMOUNT_REGEXES) - 1:
+                    reasons.append('bare_amount')
                 break
             except ValueError:
                 continue
+    if amount is None:
+        reasons.append('no_amount')
     
     # Detectar tipo (expense vs income)
     transaction_type = 'expense'  # Default
-    income_keywords = ['ingreso', 'salario', 'pago recibido', 'dinero entrante']
-    if any(keyword in raw_text_lower for keyword in income_keywords):
+    if any(keyword in raw_text_lower for keyword in INCOME_KEYWORDS):
         transaction_type = 'income'
     
-    # Detectar categoría
+    # Detectar categoría (la primera en el orden de CATEGORY_KEYWORDS)
     category = '❓ Otros'  # Default
-    for cat, keywords in CATEGORY_KEYWORDS.items():
-        if any(keyword in raw_text_lower for keyword in keywords):
-            category = cat
-            break
+    matched = [known_category] if known_category else _matched_categories(raw_text_lower)
+    if len(matched) == 1:
+        category = matched[0]
+    else:
+        # Sin palabra clave o con varias: decide el clasificador local si está cargado y seguro
+        classifier = get_classifier()
+        predicted, probability = classifier.predict(raw_text) if classifier else (None, 0.0)
+        confident = probability >= CATEGORY_MODEL_MIN_PROB and predicted in CATEGORY_KEYWORDS
+        if confident and (not matched or predicted in matched):
+            category = predicted
+            reasons.append('model_category')
+        elif matched:
+            category = matched[0]
+            reasons.append('ambiguous_category')
+        else:
+            reasons.append('no_category')
+    
+    if transaction_type == 'income' and category not in INCOME_CATEGORIES:
+        reasons.append('ambiguous_type')
+    elif transaction_type == 'expense' and category == '💼 Ingresos':
+        reasons.append('ambiguous_type')
+    
+    confidence = 1.0
+    for reason in reasons:
+        confidence *= PARSE_PENALTIES[reason]
     
     return {
         'amount': amount,
         'category': category,
         'type': transaction_type
-    }
+    }, confidence, reasons
+
+def parse_raw_text(raw_text: str) -> Dict[str, Optional[str]]:
+    """
+    Feature 5: Parsing básico de texto libre (solo nivel local)
+    
+    Args:
+        raw_text: Texto libre del usuario (ej: "Cenas 20 euros")
+        
+    Returns:
+        Dict con amount, category, type parseados
+    """
+    return parse_raw_text_with_confidence(raw_text)[0]
 
 def generate_aury_response(raw_text: str, category: Optional[str] = None, amount: Optional[float] = None) -> str:
     """
@@ -131,111 +295,396 @@ def generate_aury_response(raw_text: str, category: Optional[str] = None, amount
     responses = AURY_RESPONSES.get(category_key, AURY_RESPONSES['default'])
     return random.choice(responses)
 
-# Placeholder para integración DeepSeek (Feature 5 - futuro)
-async def parse_with_deepseek(raw_text: str) -> Dict[str, Optional[str]]:
-    """
-    Feature 5: Parsing inteligente con DeepSeek
-    TODO: Implementar llamada a DeepSeek API
+# Feature 5: parser por niveles (local -> DeepSeek con JSON estricto)
+PARSE_PROMPT = parse_prompt(list(CATEGORY_KEYWORDS))
+WHITESPACE_REGEX = re.compile(r'\s+')
+
+# Resultados de DeepSeek por texto normalizado (LRU por worker)
+_parse_cache: "OrderedDict[str, Dict[str, Optional[str]]]" = OrderedDict()
+
+def normalize_expense_text(raw_text: str) -> str:
+    """Clave de caché: minúsculas, sin tildes y con los espacios colapsados"""
+    decomposed = unicodedata.normalize('NFKD', raw_text.lower())
+    without_marks = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return WHITESPACE_REGEX.sub(' ', without_marks).strip()
+
+def _validate_llm_parse(content: str) -> Optional[Dict[str, Optional[str]]]:
+    """Valida la salida JSON de DeepSeek contra el esquema; None si no lo cumple"""
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
     
-    Por ahora retorna parsing básico
+    amount = data.get('amount')
+    if amount is not None:
+        if isinstance(amount, bool) or not isinstance(amount, (int, float)) or amount < 0:
+            return None
+        amount = float(amount)
+    category = data.get('category')
+    transaction_type = data.get('type')
+    if category not in CATEGORY_KEYWORDS or transaction_type not in ('expense', 'income'):
+        return None
+    return {'amount': amount, 'category': category, 'type': transaction_type}
+
+async def _parse_with_llm(raw_text: str) -> Optional[Dict[str, Optional[str]]]:
+    """Nivel 2: parsing con DeepSeek. None si no se puede llamar o la respuesta no es válida"""
+    if not DEEPSEEK_API_KEY or DEEPSEEK_BREAKER.state == OPEN or await _outbound_gate():
+        return None
+    
+    start = time.perf_counter()
+    try:
+        response = await get_deepseek_client().post(
+            DEEPSEEK_API_URL,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
+            },
+            json={
+                "model": "deepseek-chat",
+                "messages": build_messages(PARSE_PROMPT, raw_text),
+                "temperature": PARSE_PROMPT.temperature,
+                "max_tokens": 60,
+                "response_format": {"type": "json_object"},
+                "stream": False
+            },
+            timeout=PARSE_LLM_TIMEOUT_SECONDS
+        )
+        response.raise_for_status()
+        result = response.json()
+    except asyncio.CancelledError:
+        DEEPSEEK_BREAKER.record_cancelled()
+        raise
+    except Exception as e:
+        DEEPSEEK_BREAKER.record_failure()
+        logger.error(f"Error en el parser con DeepSeek: {e}")
+        return None
+    finally:
+        PARSE_DURATION.labels(tier="llm").observe(time.perf_counter() - start)
+    
+    DEEPSEEK_BREAKER.record_success()
+    record_token_usage(PARSE_PROMPT, result.get("usage"))
+    content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
+    parsed = _validate_llm_parse(content)
+    if parsed is None:
+        logger.warning(f"⚠️ Respuesta del parser de DeepSeek fuera de esquema: {content[:200]!r}")
+    return parsed
+
+async def parse_with_deepseek(raw_text: str, known_category: Optional[str] = None) -> Dict[str, Optional[str]]:
     """
-    # TODO: Llamar a DeepSeek API cuando esté configurado
-    # Por ahora usar parsing básico
-    return parse_raw_text(raw_text)
+    Feature 5: Parsing por niveles
+    0. Categoría recordada del comercio (known_category, ver merchant_service), si la hay
+    1. Parser local con confianza; si supera PARSE_CONFIDENCE_THRESHOLD se usa tal cual
+    2. Si no, caché por texto normalizado o DeepSeek con esquema JSON estricto
+    Si DeepSeek no está disponible o responde fuera de esquema, se usa el resultado local
+    """
+    start = time.perf_counter()
+    parsed, confidence, reasons = parse_raw_text_with_confidence(raw_text, known_category)
+    PARSE_DURATION.labels(tier="local").observe(time.perf_counter() - start)
+    if confidence >= PARSE_CONFIDENCE_THRESHOLD or not PARSE_LLM_ENABLED:
+        PARSE_REQUESTS.labels(result="memory" if known_category else "local").inc()
+        return parsed
+    
+    key = normalize_expense_text(raw_text)
+    cached = _parse_cache.get(key)
+    record_cache("parse_llm", hit=cached is not None)
+    if cached is not None:
+        _parse_cache.move_to_end(key)
+        PARSE_REQUESTS.labels(result="cache").inc()
+        return dict(cached, category=known_category or cached['category'])
+    
+    with span("parse.llm", confidence=round(confidence, 3), reasons=",".join(reasons)):
+        llm_parsed = await _parse_with_llm(raw_text)
+    if llm_parsed is None:
+        PARSE_REQUESTS.labels(result="llm_fallback").inc()
+        return parsed
+    
+    # Lo que DeepSeek no resuelve se completa con el parser local
+    if llm_parsed['amount'] is None:
+        llm_parsed['amount'] = parsed['amount']
+    if llm_parsed['category'] == '❓ Otros':
+        llm_parsed['category'] = parsed['category']
+    PARSE_REQUESTS.labels(result="llm").inc()
+    _parse_cache[key] = llm_parsed
+    if len(_parse_cache) > PARSE_CACHE_SIZE:
+        _parse_cache.popitem(last=False)
+    # La categoría recordada (corrección del usuario) manda sobre la del modelo
+    return dict(llm_parsed, category=known_category or llm_parsed['category'])
 
 def _build_prompt_by_tone(
     tone: str,
     monto_gasto: str,
     categoria_limpia: str,
     racha_actual: int,
-    objetivo_ahorro: str
+    objetivo_ahorro: str,
+    historial: Optional[str] = None,
+    inusual: Optional[str] = None
 ) -> Tuple[str, str, float]:
     """
-    Construye el prompt y configuración según el tono de Aury
+    Construye el prompt según el tono (ver prompt_registry)
+    historial: resumen de gastos parecidos del usuario (similarity_service), opcional
+    inusual: desviación del importe frente a su media (spending_stats_service), opcional
+    Retorna (system_message, user_prompt, temperature)
+    """
+    template = get_prompt(tone)
+    context = render_context(monto_gasto, categoria_limpia, racha_actual, objetivo_ahorro, historial, inusual)
+    return template.system, context, template.temperature
+
+async def _caller_gate(rate_limit_key: Optional[str]) -> Optional[str]:
+    """
+    Comprobaciones por petición (configuración, circuito abierto, límite del usuario)
+    Retorna None si puede seguir, o el outcome (métricas) por el que se usan plantillas
+    """
+    # Si no hay API key configurada, usar fallback básico
+    if not DEEPSEEK_API_KEY:
+        logger.warning("DEEPSEEK_API_KEY no configurada, usando respuestas básicas")
+        return "not_configured"
     
-    Returns:
-        tuple: (system_message, user_prompt, temperature)
+    # Circuito abierto: plantillas al instante (sin consumir rate limit)
+    if DEEPSEEK_BREAKER.state == OPEN:
+        return "circuit_open"
+    
+    if rate_limit_key and not await allow(GASTO_LLM_LIMIT, rate_limit_key):
+        return "rate_limited"
+    return None
+
+async def _outbound_gate() -> Optional[str]:
+    """Comprobaciones por llamada saliente a DeepSeek (límite global, sonda de half_open)"""
+    if not await allow(DEEPSEEK_GLOBAL_LIMIT):
+        return "rate_limited"
+    
+    # En half_open solo sale una sonda; el resto sigue con plantillas
+    if not DEEPSEEK_BREAKER.allow_request():
+        return "circuit_open"
+    return None
+
+async def _deepseek_gate(tone: str, rate_limit_key: Optional[str]) -> Optional[str]:
+    """
+    Decide si la llamada a DeepSeek puede salir
+    Retorna None si puede, o el outcome (métricas) por el que se usan plantillas
     """
-    tone = tone.lower() if tone else 'sarcastic'
+    # Primero el bucket del usuario, después el global de DeepSeek
+    blocked = await _caller_gate(rate_limit_key)
+    if blocked:
+        return blocked
+    blocked = await _outbound_gate()
+    if blocked and rate_limit_key:
+        # No sale la llamada: el usuario recupera su token (las plantillas no gastan cupo)
+        await refund(GASTO_LLM_LIMIT, rate_limit_key)
+    return blocked
+
+def _build_context(
+    parsed_data: Dict,
+    current_streak: int,
+    user_goal: Optional[str],
+    history: Optional[str] = None,
+    anomaly: Optional[str] = None
+) -> str:
+    """Sufijo con el contexto del usuario (importe, categoría sin emoji, racha, objetivo, historial, inusual)"""
+    monto_gasto = parsed_data.get('amount', 'N/A')
+    categoria_gasto = parsed_data.get('category', 'Otros')
+    objetivo_ahorro = user_goal or "No especificado"
     
-    if tone == 'subtle':
-        # Tono Sutil - "Madre Decepcionada"
-        system_message = """Eres AURY, una psicóloga financiera con el tono de una madre decepcionada. 
-Tu crítica es indirecta, basada en la culpa y la vergüenza pasiva. 
-Usas un tono melancólico y desilusionado. No eres agresiva, pero tu decepción es palpable.
-Tu respuesta debe ser una sola frase corta, melancólica, que genere culpa sutil."""
-        
-        user_prompt = f"""CONTEXTO DEL USUARIO:
-- Gasto Recién Registrado: {monto_gasto}€ en {categoria_limpia}
-- Racha de Ahorro Actual: {racha_actual} días
-- Objetivo Principal de Ahorro: {objetivo_ahorro}
-
-TAREA:
-Genera una crítica indirecta y melancólica sobre el gasto, usando el tono de una madre decepcionada.
-Conecta el gasto con su racha o su objetivo de forma sutil, generando culpa pasiva.
-La respuesta DEBE ser concisa (menos de 100 tokens), melancólica, y usar lenguaje indirecto.
-No uses la palabra "deberías". Usa frases como "Pensé que...", "Esperaba que...", "Me pregunto si..."
-Responde SOLO con el comentario, sin explicaciones adicionales."""
-        
-        temperature = 0.6
-        
-    elif tone == 'analytical':
-        # Tono Analítico - "Analista de Datos Frío"
-        system_message = """Eres AURY, una analista de datos financiera fría y desapasionada.
-Tu crítica se basa en lógica, porcentajes, hechos y coste de oportunidad.
-No muestras emociones. Eres objetiva, directa, y te enfocas en números y datos.
-Tu respuesta debe ser una sola frase corta, llena de datos, porcentajes o comparaciones lógicas."""
-        
-        user_prompt = f"""CONTEXTO DEL USUARIO:
-- Gasto Recién Registrado: {monto_gasto}€ en {categoria_limpia}
-- Racha de Ahorro Actual: {racha_actual} días
-- Objetivo Principal de Ahorro: {objetivo_ahorro}
-
-TAREA:
-Genera una crítica basada en datos, lógica y coste de oportunidad sobre el gasto.
-Usa porcentajes, comparaciones numéricas, o cálculos de impacto en el objetivo.
-Conecta el gasto con su racha o objetivo usando datos concretos.
-La respuesta DEBE ser concisa (menos de 100 tokens), fría, objetiva, y llena de hechos.
-Incluye números, porcentajes, o comparaciones cuando sea posible.
-Responde SOLO con el comentario analítico, sin explicaciones adicionales."""
-        
-        temperature = 0.3
+    # Limpiar emoji de categoría para el prompt
+    categoria_limpia = CATEGORY_CLEAN_REGEX.sub('', categoria_gasto).strip()
+    return render_context(str(monto_gasto), categoria_limpia, current_streak, objetivo_ahorro, history, anomaly)
+
+def _build_messages(
+    parsed_data: Dict,
+    current_streak: int,
+    user_goal: Optional[str],
+    tone: str,
+    history: Optional[str] = None,
+    anomaly: Optional[str] = None
+) -> Tuple[List[Dict], float, PromptTemplate]:
+    """Mensajes System/User para DeepSeek, temperatura y plantilla usada según el tono"""
+    # Prefijo fijo por tono + contexto al final (reutilizable por la caché de DeepSeek)
+    template = get_prompt(tone)
+    with span("aury.build_prompt", tone=tone, prompt_version=template.label):
+        context = _build_context(parsed_data, current_streak, user_goal, history, anomaly)
+    return build_messages(template, context), template.temperature, template
+
+def record_token_usage(template: PromptTemplate, usage: Optional[Dict]):
+    """
+    Registra los tokens de una respuesta de DeepSeek por tono y versión del prompt
+    DeepSeek informa prompt_cache_hit_tokens; la API de OpenAI, prompt_tokens_details.cached_tokens
+    """
+    if not usage:
+        return
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    cached_tokens = usage.get("prompt_cache_hit_tokens")
+    if cached_tokens is None:
+        cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+
+    labels = {"tone": template.tone, "prompt_version": template.label}
+    DEEPSEEK_USAGE_RESPONSES.labels(**labels).inc()
+    DEEPSEEK_TOKENS.labels(kind="prompt", **labels).inc(prompt_tokens)
+    DEEPSEEK_TOKENS.labels(kind="prompt_cached", **labels).inc(cached_tokens)
+    DEEPSEEK_TOKENS.labels(kind="completion", **labels).inc(completion_tokens)
+
+def _parse_batch_comments(content: str, expected: int) -> List[Optional[str]]:
+    """
+    Comentarios de una respuesta agrupada, uno por contexto y en orden
+    Acepta {"comentarios": [...]} o un array JSON (con o sin bloque ```json);
+    las posiciones ausentes o inválidas quedan en None (plantilla para ese gasto)
+    """
+    text = content.strip()
+    if text.startswith("```"):
+        text = text.strip("`").strip()
+        if text.lower().startswith("json"):
+            text = text[4:]
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return [None] * expected
+    if isinstance(data, dict):
+        data = data.get("comentarios") or data.get("comments")
+    if not isinstance(data, list):
+        return [None] * expected
+    
+    comments: List[Optional[str]] = []
+    for i in range(expected):
+        item = data[i] if i < len(data) else None
+        comments.append((item.strip() or None) if isinstance(item, str) else None)
+    return comments
+
+class AuryBatcher:
+    """
+    Coalescer de comentarios de Aury (por worker)
+    Agrupa por tono las peticiones que llegan dentro de `window_ms` (o hasta `max_size`)
+    y las envía en una sola llamada a DeepSeek. Cada llamador recibe su comentario,
+    o None si la llamada o su posición fallan (el llamador usa plantillas)
+    """
+
+    def __init__(self, window_ms: float, max_size: int):
+        self.window_s = window_ms / 1000.0
+        self.max_size = max(1, max_size)
+        self._pending: Dict[str, List[Tuple[str, asyncio.Future, Optional[str]]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: set = set()
+
+    async def submit(self, template: PromptTemplate, context: str, rate_limit_key: Optional[str] = None) -> Optional[str]:
+        """rate_limit_key: bucket del usuario ya consumido (se devuelve si el lote no sale)"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(template.tone, [])
+        batch.append((context, future, rate_limit_key))
+        if len(batch) >= self.max_size:
+            self._flush(template)
+        elif len(batch) == 1:
+            self._timers[template.tone] = loop.call_later(self.window_s, self._flush, template)
+        # shield: si el llamador se cancela, el lote sigue para el resto
+        return await asyncio.shield(future)
+
+    def _flush(self, template: PromptTemplate):
+        timer = self._timers.pop(template.tone, None)
+        if timer:
+            timer.cancel()
+        batch = self._pending.pop(template.tone, None)
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._send(template, batch))
+        # Referencia fuerte hasta que termine (el event loop solo guarda referencias débiles)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, template: PromptTemplate, batch: List[Tuple[str, asyncio.Future, Optional[str]]]):
+        comments: List[Optional[str]] = [None] * len(batch)
+        try:
+            comments = await self._call(template, [context for context, _, _ in batch], [key for _, _, key in batch])
+        finally:
+            for (_, future, _), comment in zip(batch, comments):
+                if not future.done():
+                    future.set_result(comment)
+
+    async def _call(self, template: PromptTemplate, contexts: List[str], keys: List[Optional[str]]) -> List[Optional[str]]:
+        size = len(contexts)
+        AURY_BATCH_SIZE.observe(size)
+        tone = template.tone
         
-    else:  # 'sarcastic' (default)
-        # Tono Sarcástico - Actual
-        system_message = """Eres AURY, una psicóloga financiera sarcástica, cínica, y brutalmente honesta.
-Tu única misión es avergonzar al usuario para que corrija su comportamiento de gasto.
-No eres servicial. Tu tono es de superioridad condescendiente.
-Tu respuesta debe ser una sola frase corta y mordaz. Nunca uses emoticonos.
-Tu objetivo es la humillación sutil para motivar."""
+        # Un único token del límite global y una única sonda de half_open por lote
+        blocked = await _outbound_gate()
+        if blocked:
+            # El lote no sale: cada usuario recupera su token
+            for key in filter(None, keys):
+                await refund(GASTO_LLM_LIMIT, key)
+            DEEPSEEK_REQUEST_DURATION.labels(tone=tone, outcome=blocked).observe(0)
+            AURY_BATCH_ITEMS.labels(result="fallback").inc(size)
+            return [None] * size
         
-        user_prompt = f"""CONTEXTO DEL USUARIO:
-- Gasto Recién Registrado: {monto_gasto}€ en {categoria_limpia} (Ej: 80€ en 'Bares y Ocio').
-- Racha de Ahorro Actual: {racha_actual} días.
-- Objetivo Principal de Ahorro: {objetivo_ahorro}.
-
-TAREA y RESTRICCIONES:
-1. Genera una crítica directa y corta sobre el gasto, conectándolo con su Racha actual o su Objetivo de Ahorro.
-2. La respuesta DEBE ser concisa y tener menos de 100 tokens para optimizar costes.
-3. No uses la palabra "deberías". Usa un lenguaje de juicio superior.
-4. Sé sarcástica pero no ofensiva. El tono debe ser de superioridad condescendiente.
-5. Si la racha es baja (menos de 3 días), enfócate en eso. Si es alta, usa el objetivo de ahorro.
-6. Responde SOLO con el comentario sarcástico, sin explicaciones adicionales."""
+        prompt = batch_prompt(template)
+        # La latencia de un lote no es comparable con la de una llamada: timeout máximo
+        timeout = DEEPSEEK_LATENCY.max_seconds
+        start = time.perf_counter()
+        try:
+            with span("aury.deepseek_batch", tone=tone, prompt_version=prompt.label, size=size):
+                response = await get_deepseek_client().post(
+                    DEEPSEEK_API_URL,
+                    headers={
+                        "Content-Type": "application/json",
+                        "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
+                    },
+                    json={
+                        "model": "deepseek-chat",
+                        "messages": build_messages(prompt, render_batch(contexts)),
+                        "temperature": prompt.temperature,
+                        "max_tokens": 100 * size,
+                        "response_format": {"type": "json_object"},
+                        "stream": False
+                    },
+                    timeout=timeout
+                )
+                response.raise_for_status()
+                result = response.json()
+        except asyncio.CancelledError:
+            DEEPSEEK_BREAKER.record_cancelled()
+            raise
+        except Exception as e:
+            DEEPSEEK_BREAKER.record_failure()
+            outcome = "batch_timeout" if isinstance(e, httpx.TimeoutException) else "batch_error"
+            DEEPSEEK_REQUEST_DURATION.labels(tone=tone, outcome=outcome).observe(time.perf_counter() - start)
+            AURY_BATCH_ITEMS.labels(result="fallback").inc(size)
+            logger.error(f"Error en llamada agrupada a DeepSeek ({size} gastos): {e}")
+            return [None] * size
         
-        temperature = 0.9
-    
-    return system_message, user_prompt, temperature
+        DEEPSEEK_BREAKER.record_success()
+        DEEPSEEK_REQUEST_DURATION.labels(tone=tone, outcome="batch_success").observe(time.perf_counter() - start)
+        record_token_usage(prompt, result.get("usage"))
+        content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
+        comments = _parse_batch_comments(content, size)
+        ok = sum(1 for comment in comments if comment)
+        AURY_BATCH_ITEMS.labels(result="ok").inc(ok)
+        AURY_BATCH_ITEMS.labels(result="fallback").inc(size - ok)
+        if ok < size:
+            logger.warning(f"⚠️ Respuesta agrupada de DeepSeek incompleta: {ok}/{size} comentarios")
+        return comments
+
+_aury_batcher: Optional[AuryBatcher] = (
+    AuryBatcher(AURY_BATCH_WINDOW_MS, AURY_BATCH_MAX_SIZE) if AURY_BATCH_ENABLED else None
+)
+
+def set_aury_batcher(batcher: Optional[AuryBatcher]):
+    """Activa (o desactiva con None) el micro-batching, p.ej. en benchmarks"""
+    global _aury_batcher
+    _aury_batcher = batcher
 
 async def generate_aury_with_deepseek(
     raw_text: str, 
     parsed_data: Dict,
     current_streak: int = 0,
     user_goal: Optional[str] = None,
-    tone: str = 'sarcastic'
+    tone: str = 'sarcastic',
+    rate_limit_key: Optional[str] = None,
+    history: Optional[str] = None,
+    anomaly: Optional[str] = None
 ) -> str:
     """
     Feature 7: Generar comentario de Aury con DeepSeek API según el tono seleccionado
     Utiliza contexto del usuario (racha y objetivo) para personalizar el comentario
+    Si el usuario o el total de llamadas superan su rate limit, responde con plantillas locales
+    Con AURY_BATCH_ENABLED la llamada se agrupa con otras del mismo tono (AuryBatcher)
     
     Args:
         raw_text: Texto original del usuario
@@ -243,52 +692,46 @@ async def generate_aury_with_deepseek(
         current_streak: Racha actual del usuario en días
         user_goal: Objetivo de ahorro del usuario
         tone: Tono de Aury ('sarcastic', 'subtle', 'analytical')
+        rate_limit_key: Clave del bucket por usuario (google_id); None = sin límite por usuario
+        history: Resumen de gastos parecidos del usuario (línea Historial del prompt)
+        anomaly: Desviación del importe frente a su media (línea Inusual del prompt)
         
     Returns:
         String con comentario de Aury según el tono
     """
-    # Si no hay API key configurada, usar fallback básico
-    if not DEEPSEEK_API_KEY:
-        logger.warning("DEEPSEEK_API_KEY no configurada, usando respuestas básicas")
+    if _aury_batcher is not None:
+        blocked = await _caller_gate(rate_limit_key)
+        if blocked:
+            DEEPSEEK_REQUEST_DURATION.labels(tone=tone, outcome=blocked).observe(0)
+            comment = None
+        else:
+            context = _build_context(parsed_data, current_streak, user_goal, history, anomaly)
+            comment = await _aury_batcher.submit(get_prompt(tone), context, rate_limit_key)
+        return comment or generate_aury_response(
+            raw_text,
+            parsed_data.get('category'),
+            parsed_data.get('amount')
+        )
+    
+    blocked = await _deepseek_gate(tone, rate_limit_key)
+    if blocked:
+        DEEPSEEK_REQUEST_DURATION.labels(tone=tone, outcome=blocked).observe(0)
         return generate_aury_response(
             raw_text,
             parsed_data.get('category'),
             parsed_data.get('amount')
         )
     
+    timeout = DEEPSEEK_LATENCY.timeout()
+    DEEPSEEK_TIMEOUT.set(timeout)
+    start = time.perf_counter()
     try:
-        # Construir prompt según el tono
-        monto_gasto = parsed_data.get('amount', 'N/A')
-        categoria_gasto = parsed_data.get('category', 'Otros')
-        racha_actual = current_streak
-        objetivo_ahorro = user_goal or "No especificado"
-        
-        # Limpiar emoji de categoría para el prompt
-        categoria_limpia = re.sub(r'[^\w\s]', '', categoria_gasto).strip()
+        messages, temperature, template = _build_messages(parsed_data, current_streak, user_goal, tone, history, anomaly)
         
-        # Obtener prompt y configuración según el tono
-        system_message, user_prompt, temperature = _build_prompt_by_tone(
-            tone,
-            str(monto_gasto),
-            categoria_limpia,
-            racha_actual,
-            objetivo_ahorro
-        )
-
-        # Preparar mensajes para DeepSeek (formato System/User)
-        messages = [
-            {
-                "role": "system",
-                "content": system_message
-            },
-            {
-                "role": "user",
-                "content": user_prompt
-            }
-        ]
+        # Llamada asíncrona a DeepSeek API (cliente compartido, conexión keep-alive)
+        client = get_deepseek_client()
         
-        # Llamada asíncrona a DeepSeek API
-        async with httpx.AsyncClient(timeout=5.0) as client:
+        async def call_deepseek() -> Dict:
             response = await client.post(
                 DEEPSEEK_API_URL,
                 headers={
@@ -301,22 +744,52 @@ async def generate_aury_with_deepseek(
                     "temperature": temperature,  # Temperatura según el tono
                     "max_tokens": 100,    # Limitar tokens para optimizar costes
                     "stream": False
-                }
+                },
+                timeout=timeout
             )
-            
             response.raise_for_status()
-            result = response.json()
-            
-            # Extraer respuesta del modelo
-            aury_comment = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-            
-            if not aury_comment:
-                raise ValueError("Respuesta vacía de Aury")
-            
-            logger.info(f"Aury response generada con DeepSeek (tone: {tone}): {len(aury_comment)} caracteres")
-            return aury_comment
+            return response.json()
+        
+        with span("aury.deepseek_http", tone=tone, prompt_version=template.label, timeout_s=round(timeout, 3)):
+            # Timeout total adaptativo; petición de cobertura si la primera supera el p95
+            result = await asyncio.wait_for(
+                hedged(
+                    call_deepseek,
+                    hedge_after=DEEPSEEK_LATENCY.hedge_delay() if DEEPSEEK_HEDGING_ENABLED else None,
+                    can_hedge=partial(allow, DEEPSEEK_GLOBAL_LIMIT),
+                    on_hedge=DEEPSEEK_HEDGES.inc
+                ),
+                timeout=timeout
+            )
+        
+        # Extraer respuesta del modelo
+        aury_comment = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
+        
+        if not aury_comment:
+            raise ValueError("Respuesta vacía de Aury")
+        
+        elapsed = time.perf_counter() - start
+        record_token_usage(template, result.get("usage"))
+        DEEPSEEK_BREAKER.record_success()
+        DEEPSEEK_LATENCY.observe(elapsed)
+        DEEPSEEK_REQUEST_DURATION.labels(tone=tone, outcome="success").observe(elapsed)
+        logger.info(f"Aury response generada con DeepSeek (tone: {tone}): {len(aury_comment)} caracteres")
+        return aury_comment
             
+    except (httpx.TimeoutException, asyncio.TimeoutError) as e:
+        DEEPSEEK_BREAKER.record_failure()
+        DEEPSEEK_LATENCY.observe(timeout)  # Muestra censurada: el timeout sube si DeepSeek se ralentiza
+        DEEPSEEK_REQUEST_DURATION.labels(tone=tone, outcome="timeout").observe(time.perf_counter() - start)
+        logger.error(f"Timeout llamando a Aury: {e}")
+        # Fallback a respuestas básicas
+        return generate_aury_response(
+            raw_text,
+            parsed_data.get('category'),
+            parsed_data.get('amount')
+        )
     except httpx.HTTPError as e:
+        DEEPSEEK_BREAKER.record_failure()
+        DEEPSEEK_REQUEST_DURATION.labels(tone=tone, outcome="http_error").observe(time.perf_counter() - start)
         logger.error(f"Error HTTP llamando a Aury: {e}")
         # Fallback a respuestas básicas
         return generate_aury_response(
@@ -324,7 +797,12 @@ async def generate_aury_with_deepseek(
             parsed_data.get('category'),
             parsed_data.get('amount')
         )
+    except asyncio.CancelledError:
+        DEEPSEEK_BREAKER.record_cancelled()
+        raise
     except Exception as e:
+        DEEPSEEK_BREAKER.record_failure()
+        DEEPSEEK_REQUEST_DURATION.labels(tone=tone, outcome="error").observe(time.perf_counter() - start)
         logger.error(f"Error, generando respuesta de Aury: {e}")
         # Fallback a respuestas básicas
         return generate_aury_response(
@@ -333,3 +811,165 @@ async def generate_aury_with_deepseek(
             parsed_data.get('amount')
         )
 
+class AuryStreamError(Exception):
+    """El stream de DeepSeek falló (antes o después de enviar fragmentos)"""
+
+async def stream_aury_with_deepseek(
+    raw_text: str,
+    parsed_data: Dict,
+    current_streak: int = 0,
+    user_goal: Optional[str] = None,
+    tone: str = 'sarcastic',
+    rate_limit_key: Optional[str] = None,
+    history: Optional[str] = None,
+    anomaly: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Variante en streaming de generate_aury_with_deepseek: produce los fragmentos
+    del comentario según llegan de DeepSeek ("stream": true)
+    Si DeepSeek no está disponible (sin API key, circuito abierto, rate limit)
+    produce la plantilla de una vez. Si el stream falla lanza AuryStreamError
+    y el llamante decide el fallback (ya puede haber enviado fragmentos)
+    """
+    blocked = await _deepseek_gate(tone, rate_limit_key)
+    if blocked:
+        DEEPSEEK_REQUEST_DURATION.labels(tone=tone, outcome=blocked).observe(0)
+        yield generate_aury_response(
+            raw_text,
+            parsed_data.get('category'),
+            parsed_data.get('amount')
+        )
+        return
+    
+    # El timeout adaptativo se aplica a cada lectura: acota el primer token y los cortes a mitad
+    timeout = DEEPSEEK_LATENCY.timeout()
+    start = time.perf_counter()
+    received = False
+    usage = None
+    try:
+        messages, temperature, template = _build_messages(parsed_data, current_streak, user_goal, tone, history, anomaly)
+        client = get_deepseek_client()
+        async with client.stream(
+            "POST",
+            DEEPSEEK_API_URL,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
+            },
+            json={
+                "model": "deepseek-chat",
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": 100,
+                "stream": True,
+                # El último fragmento trae el uso de tokens (choices vacío)
+                "stream_options": {"include_usage": True}
+            },
+            timeout=timeout
+        ) as response:
+            response.raise_for_status()
+            # Formato SSE de la API: "data: {chunk}" ... "data: [DONE]"
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                choices = chunk.get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if not delta:
+                    continue
+                if not received:
+                    received = True
+                    DEEPSEEK_FIRST_TOKEN.labels(tone=tone).observe(time.perf_counter() - start)
+                yield delta
+        
+        if not received:
+            raise ValueError("Respuesta vacía de Aury")
+        
+        record_token_usage(template, usage)
+        DEEPSEEK_BREAKER.record_success()
+        DEEPSEEK_REQUEST_DURATION.labels(tone=tone, outcome="stream_success").observe(time.perf_counter() - start)
+    except (GeneratorExit, asyncio.CancelledError):
+        # El cliente se fue: sin veredicto sobre DeepSeek
+        DEEPSEEK_BREAKER.record_cancelled()
+        raise
+    except httpx.TimeoutException as e:
+        DEEPSEEK_BREAKER.record_failure()
+        DEEPSEEK_REQUEST_DURATION.labels(tone=tone, outcome="stream_timeout").observe(time.perf_counter() - start)
+        logger.error(f"Timeout en el stream de Aury: {e}")
+        raise AuryStreamError(str(e)) from e
+    except Exception as e:
+        DEEPSEEK_BREAKER.record_failure()
+        DEEPSEEK_REQUEST_DURATION.labels(tone=tone, outcome="stream_error").observe(time.perf_counter() - start)
+        logger.error(f"Error en el stream de Aury: {e}")
+        raise AuryStreamError(str(e)) from e
+
+FIGURE_REGEX = re.compile(r'\d+(?:[.,]\d+)?')
+
+def _keeps_figures(original: str, polished: str) -> bool:
+    """El pulido no puede cambiar, quitar ni inventar cifras"""
+    def figures(text: str) -> List[str]:
+        return sorted(n.replace(',', '.') for n in FIGURE_REGEX.findall(text))
+    return figures(original) == figures(polished)
+
+async def polish_analytical_comment(comment: str, rate_limit_key: Optional[str] = None) -> str:
+    """
+    Comentario del tono analítico generado en local (analytical_service), pulido por
+    DeepSeek solo con ANALYTICAL_LLM_POLISH. Si DeepSeek no está disponible, tarda más de
+    ANALYTICAL_POLISH_TIMEOUT_SECONDS o altera alguna cifra, se devuelve el comentario local
+    """
+    if not ANALYTICAL_LLM_POLISH:
+        ANALYTICAL_COMMENTS.labels(result="local").inc()
+        return comment
+    if await _deepseek_gate(POLISH_PROMPT.tone, rate_limit_key):
+        ANALYTICAL_COMMENTS.labels(result="polish_fallback").inc()
+        return comment
+    
+    start = time.perf_counter()
+    try:
+        with span("aury.polish", prompt_version=POLISH_PROMPT.label):
+            response = await get_deepseek_client().post(
+                DEEPSEEK_API_URL,
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
+                },
+                json={
+                    "model": "deepseek-chat",
+                    "messages": build_messages(POLISH_PROMPT, comment),
+                    "temperature": POLISH_PROMPT.temperature,
+                    "max_tokens": 100,
+                    "stream": False
+                },
+                timeout=ANALYTICAL_POLISH_TIMEOUT_SECONDS
+            )
+            response.raise_for_status()
+            result = response.json()
+    except asyncio.CancelledError:
+        DEEPSEEK_BREAKER.record_cancelled()
+        raise
+    except Exception as e:
+        DEEPSEEK_BREAKER.record_failure()
+        DEEPSEEK_REQUEST_DURATION.labels(tone=POLISH_PROMPT.tone, outcome="polish_error").observe(time.perf_counter() - start)
+        ANALYTICAL_COMMENTS.labels(result="polish_fallback").inc()
+        logger.error(f"Error puliendo el comentario analítico: {e}")
+        return comment
+    
+    DEEPSEEK_BREAKER.record_success()
+    DEEPSEEK_REQUEST_DURATION.labels(tone=POLISH_PROMPT.tone, outcome="polished").observe(time.perf_counter() - start)
+    record_token_usage(POLISH_PROMPT, result.get("usage"))
+    polished = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
+    if not polished or not _keeps_figures(comment, polished):
+        ANALYTICAL_COMMENTS.labels(result="polish_fallback").inc()
+        logger.warning(f"⚠️ Pulido analítico descartado (vacío o con cifras alteradas): {polished[:200]!r}")
+        return comment
+    ANALYTICAL_COMMENTS.labels(result="polished").inc()
+    return polished
+
+async def stream_analytical_comment(comment: str, rate_limit_key: Optional[str] = None) -> AsyncIterator[str]:
+    """Variante para /gasto/stream: el comentario (pulido o no) en un solo fragmento"""
+    yield await polish_analytical_comment(comment, rate_limit_key)
@@ -7,7 +7,12 @@ Validación de Google OAuth Token y gestión de usuarios
 from typing import Dict, Optional, Tuple
 from sqlalchemy.orm import Session
 from api.models import User
-from api.config import GOOGLE_CLIENT_ID
+from api.config import GOOGLE_CLIENT_ID, GOOGLE_CERTS_URL
+from api.metrics import record_cache
+import json
+import re
+import time
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,17 +20,66 @@ logger = logging.getLogger(__name__)
 # Importar librerías de Google Auth (opcional si no están instaladas)
 try:
     from google.auth.transport import requests as google_requests
-    from google.oauth2 import id_token
+    from google.auth import jwt as google_jwt
     GOOGLE_AUTH_AVAILABLE = True
 except ImportError:
     GOOGLE_AUTH_AVAILABLE = False
     logger.warning("google-auth no instalado. Instala con: pip install google-auth")
 
+# Caché de certificados públicos de Google (se renuevan según Cache-Control)
+GOOGLE_CERTS_DEFAULT_TTL_SECONDS = 3600
+_MAX_AGE_REGEX = re.compile(r'max-age=(\d+)')
+_google_request = None
+_google_certs: Optional[Dict[str, str]] = None
+_google_certs_expires_at = 0.0
+_google_certs_lock = threading.Lock()
+
 class AuthService:
     """
     Feature 1: Servicio de autenticación Google
     """
     
+    @staticmethod
+    def get_google_certs(force_refresh: bool = False) -> Dict[str, str]:
+        """
+        Devuelve los certificados públicos de Google para validar ID tokens
+        Reutiliza la sesión HTTP y cachea la respuesta hasta su max-age
+        """
+        global _google_request, _google_certs, _google_certs_expires_at
+        
+        with _google_certs_lock:
+            if not force_refresh and _google_certs and time.monotonic() < _google_certs_expires_at:
+                record_cache("google_certs", hit=True)
+                return _google_certs
+            record_cache("google_certs", hit=False)
+            
+            if _google_request is None:
+                _google_request = google_requests.Request()
+            
+            response = _google_request(GOOGLE_CERTS_URL, method="GET")
+            if response.status != 200:
+                raise ValueError(f"No se pudieron obtener los certificados de Google ({response.status})")
+            
+            ttl = GOOGLE_CERTS_DEFAULT_TTL_SECONDS
+            max_age = _MAX_AGE_REGEX.search(response.headers.get("cache-control", ""))
+            if max_age:
+                ttl = int(max_age.group(1))
+            
+            _google_certs = json.loads(response.data.decode("utf-8"))
+            _google_certs_expires_at = time.monotonic() + ttl
+            return _google_certs
+    
+    @staticmethod
+    def prefetch_google_certs() -> bool:
+        """
+        Warm-up: descarga los certificados de Google antes del primer login
+        Retorna False si Google Auth no está configurado
+        """
+        if not GOOGLE_CLIENT_ID or not GOOGLE_AUTH_AVAILABLE:
+            return False
+        AuthService.get_google_certs()
+        return True
+    
     @staticmethod
     def verify_google_token(token: str) -> Optional[Dict]:
         """
@@ -55,12 +109,12 @@ class AuthService:
                     logger.error(f"Error decodificando token: {e}")
                     return None
             
-            # Verificación real con Google (producción)
-            idinfo = id_token.verify_oauth2_token(
-                token, 
-                google_requests.Request(), 
-                GOOGLE_CLIENT_ID
-            )
+            # Verificación real con Google (producción) usando certificados cacheados
+            certs = AuthService.get_google_certs()
+            if google_jwt.decode_header(token).get('kid') not in certs:
+                # Google rotó las claves: refrescar caché antes de validar
+                certs = AuthService.get_google_certs(force_refresh=True)
+            idinfo = google_jwt.decode(token, certs=certs, audience=GOOGLE_CLIENT_ID)
             
             # Verificar que el token es de Google
             if idinfo.get('iss') not in ['accounts.google.com', 'https://accounts.google.com']:
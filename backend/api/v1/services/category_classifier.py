@@ -0,0 +1,188 @@
+# api/v1/services/category_classifier.py
+"""
+Clasificador local de categorías de gasto
+- Features: n-gramas de palabras (1-2) y de caracteres (3-5) con hashing (crc32)
+- Modelo: regresión logística multinomial en NumPy, entrenada offline con
+  scripts/train_category_model.py a partir de Transaction.raw_text -> category
+- Se guarda en un .npz comprimido y se carga una vez por worker (CATEGORY_MODEL_PATH)
+
+Inferencia sin red: suma de filas de la matriz de pesos (microsegundos por texto)
+y predict_batch para importaciones masivas
+"""
+
+import re
+import zlib
+import logging
+import threading
+import unicodedata
+from typing import List, Optional, Sequence, Tuple
+
+from api.config import CATEGORY_MODEL_PATH
+
+logger = logging.getLogger(__name__)
+
+# numpy es opcional: sin él (o sin modelo) el parser usa solo las palabras clave
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+DEFAULT_N_FEATURES = 2 ** 15
+TOKEN_REGEX = re.compile(r'\w+')
+DIGITS_REGEX = re.compile(r'\d+')
+
+def _normalize(text: str) -> str:
+    """Minúsculas, sin tildes y con los números reducidos a '0' (el importe no es la categoría)"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    without_marks = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return DIGITS_REGEX.sub('0', without_marks)
+
+def hash_features(text: str, n_features: int) -> List[int]:
+    """Índices de los n-gramas del texto (con repeticiones: cuentan como frecuencia)"""
+    words = TOKEN_REGEX.findall(_normalize(text))
+    grams = [f"w:{w}" for w in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"<{word}>"
+        for n in (3, 4, 5):
+            grams += [f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1)]
+    return [zlib.crc32(g.encode('utf-8')) % n_features for g in grams]
+
+class CategoryClassifier:
+    """Regresión logística multinomial sobre features hasheadas"""
+
+    def __init__(self, classes: Sequence[str], weights, bias, n_features: int):
+        self.classes = list(classes)
+        self.weights = weights      # (n_features, n_classes) float32
+        self.bias = bias            # (n_classes,) float32
+        self.n_features = n_features
+
+    # --- Inferencia -------------------------------------------------------
+
+    def _scores(self, indices: List[int]):
+        if not indices:
+            return self.bias
+        # Filas normalizadas por la raíz del número de n-gramas (igual que en entrenamiento)
+        return self.weights[indices].sum(axis=0) / np.sqrt(len(indices)) + self.bias
+
+    @staticmethod
+    def _softmax(scores):
+        exp = np.exp(scores - scores.max(axis=-1, keepdims=True))
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """(categoría, probabilidad) más probable para un texto"""
+        probs = self._softmax(self._scores(hash_features(text, self.n_features)))
+        best = int(probs.argmax())
+        return self.classes[best], float(probs[best])
+
+    def predict_batch(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        """predict para muchos textos con una sola reducción vectorizada"""
+        if not texts:
+            return []
+        raw = [hash_features(text, self.n_features) for text in texts]
+        features = [f or [0] for f in raw]
+        lengths = np.fromiter((len(f) for f in features), dtype=np.int64, count=len(features))
+        flat = np.fromiter((i for f in features for i in f), dtype=np.int64, count=int(lengths.sum()))
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        scores = np.add.reduceat(self.weights[flat], offsets, axis=0) / np.sqrt(lengths)[:, None] + self.bias
+        # Textos sin n-gramas: solo el sesgo (como en predict)
+        empty = np.fromiter((not f for f in raw), dtype=bool, count=len(raw))
+        scores[empty] = self.bias
+        probs = self._softmax(scores)
+        best = probs.argmax(axis=1)
+        return [(self.classes[b], float(probs[i, b])) for i, b in enumerate(best)]
+
+    # --- Entrenamiento (offline) -----------------------------------------
+
+    @classmethod
+    def train(
+        cls,
+        texts: Sequence[str],
+        labels: Sequence[str],
+        n_features: int = DEFAULT_N_FEATURES,
+        epochs: int = 15,
+        learning_rate: float = 5.0,
+        l2: float = 1e-6,
+        batch_size: int = 256,
+        seed: int = 0
+    ) -> "CategoryClassifier":
+        """Descenso por gradiente con mini-lotes (softmax + entropía cruzada + L2)"""
+        classes = sorted(set(labels))
+        class_index = {c: i for i, c in enumerate(classes)}
+        y = np.array([class_index[label] for label in labels], dtype=np.int64)
+        features = [hash_features(text, n_features) for text in texts]
+
+        rng = np.random.default_rng(seed)
+        weights = np.zeros((n_features, len(classes)), dtype=np.float32)
+        bias = np.zeros(len(classes), dtype=np.float32)
+        for epoch in range(epochs):
+            order = rng.permutation(len(features))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                rows = np.concatenate([np.full(len(features[i]), r) for r, i in enumerate(batch)]).astype(np.int64)
+                cols = np.concatenate([features[i] for i in batch]).astype(np.int64)
+                norms = np.array([1 / np.sqrt(max(len(features[i]), 1)) for i in batch], dtype=np.float32)
+
+                # Solo las columnas presentes en el lote: la matriz densa sería n_features de ancho
+                used, local_cols = np.unique(cols, return_inverse=True)
+                x = np.zeros((len(batch), len(used)), dtype=np.float32)
+                np.add.at(x, (rows, local_cols), 1.0)
+                x *= norms[:, None]
+
+                probs = cls._softmax(x @ weights[used] + bias)
+                probs[np.arange(len(batch)), y[batch]] -= 1.0
+                grad = probs / len(batch)
+                weights[used] -= learning_rate * (x.T @ grad + l2 * weights[used])
+                bias -= learning_rate * grad.sum(axis=0)
+        return cls(classes, weights, bias, n_features)
+
+    # --- Serialización -------------------------------------------------------
+
+    def save(self, path: str):
+        """Guarda el modelo en un .npz comprimido (pesos en float16)"""
+        np.savez_compressed(
+            path,
+            classes=np.array(self.classes),
+            weights=self.weights.astype(np.float16),
+            bias=self.bias,
+            n_features=np.array(self.n_features)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "CategoryClassifier":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                [str(c) for c in data["classes"]],
+                data["weights"].astype(np.float32),
+                data["bias"].astype(np.float32),
+                int(data["n_features"])
+            )
+
+_classifier: Optional[CategoryClassifier] = None
+_loaded = False
+_load_lock = threading.Lock()
+
+def get_classifier() -> Optional[CategoryClassifier]:
+    """Modelo de CATEGORY_MODEL_PATH, cargado una vez por worker (None si no hay)"""
+    global _classifier, _loaded
+    if not _loaded:
+        with _load_lock:
+            if not _loaded:
+                if CATEGORY_MODEL_PATH and NUMPY_AVAILABLE:
+                    try:
+                        _classifier = CategoryClassifier.load(CATEGORY_MODEL_PATH)
+                        logger.info(f"✅ Modelo de categorías cargado: {len(_classifier.classes)} categorías")
+                    except Exception as e:
+                        logger.error(f"❌ Error cargando el modelo de categorías ({CATEGORY_MODEL_PATH}): {e}")
+                elif CATEGORY_MODEL_PATH:
+                    logger.warning("⚠️ CATEGORY_MODEL_PATH definido pero numpy no está instalado")
+                _loaded = True
+    return _classifier
+
+def set_classifier(classifier: Optional[CategoryClassifier]):
+    """Sustituye el modelo del worker (p.ej. en scripts de evaluación)"""
+    global _classifier, _loaded
+    _classifier = classifier
+    _loaded = True
@@ -0,0 +1,228 @@
+# api/v1/services/idempotency_service.py
+"""
+Idempotency-Key para POST /gasto
+- La primera petición reserva la clave (fila 'in_progress'), ejecuta el handler
+  y guarda la respuesta; los reintentos devuelven la respuesta guardada
+- Duplicados concurrentes en el mismo worker esperan el resultado en curso
+  (future en memoria); en otro worker sondean la tabla hasta que se complete
+"""
+
+import json
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional, Tuple, Type
+
+from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from api.config import IDEMPOTENCY_TTL_HOURS, IDEMPOTENCY_WAIT_SECONDS, IDEMPOTENCY_LOCK_SECONDS
+from api.metrics import record_cache
+from api.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL_SECONDS = 0.1
+
+# (google_id, clave) -> (hash del cuerpo, future con el JSON de la respuesta)
+_inflight: Dict[Tuple[str, str], Tuple[str, asyncio.Future]] = {}
+
+class IdempotencyError(ValueError):
+    """Conflicto de idempotencia; status_code es el código HTTP a devolver"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class IdempotencyService:
+    """Servicio de claves de idempotencia"""
+
+    @staticmethod
+    def fingerprint(payload: dict) -> str:
+        """SHA-256 del cuerpo normalizado"""
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _find(db: Session, google_id: str, key: str):
+        """Lee la fila sin usar la copia del identity map"""
+        return db.query(IdempotencyKey)\
+            .filter(IdempotencyKey.google_id == google_id, IdempotencyKey.key == key)\
+            .populate_existing()\
+            .first()
+
+    @staticmethod
+    def _claim(db: Session, google_id: str, key: str, request_hash: str) -> Tuple[IdempotencyKey, bool]:
+        """
+        Reserva la clave. Retorna (fila, reservada_por_esta_petición)
+        Descarta filas caducadas y reservas huérfanas de un worker caído
+        """
+        now = _utcnow()
+        record = IdempotencyService._find(db, google_id, key)
+        if record:
+            orphaned = record.state == 'in_progress' and record.created_at <= now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)
+            if record.expires_at <= now or orphaned:
+                db.delete(record)
+                db.commit()
+                record = None
+
+        if record:
+            return record, False
+
+        record = IdempotencyKey(
+            google_id=google_id,
+            key=key,
+            request_hash=request_hash,
+            state='in_progress',
+            created_at=now,
+            expires_at=now + timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+        )
+        db.add(record)
+        try:
+            db.commit()
+            return record, True
+        except IntegrityError:
+            # Otro worker reservó la misma clave a la vez
+            db.rollback()
+            return IdempotencyService._find(db, google_id, key), False
+
+    @staticmethod
+    async def _wait_for_completion(db: Session, google_id: str, key: str) -> IdempotencyKey:
+        """Sondea la fila reservada por otro worker hasta que se complete"""
+        deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT_SECONDS
+        while asyncio.get_running_loop().time() < deadline:
+            # Cerrar la transacción para ver los commits del otro worker
+            db.rollback()
+            record = IdempotencyService._find(db, google_id, key)
+            if record is None:
+                raise IdempotencyError(409, "La petición original con esta Idempotency-Key falló, reintenta")
+            if record.state == 'completed':
+                return record
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        raise IdempotencyError(409, "Hay una petición en curso con esta Idempotency-Key")
+
+    @staticmethod
+    def release(db: Session, google_id: str, key: str):
+        """Libera la reserva tras un fallo para que el reintento vuelva a ejecutar"""
+        try:
+            db.rollback()
+            db.query(IdempotencyKey)\
+                .filter(IdempotencyKey.google_id == google_id, IdempotencyKey.key == key)\
+                .delete(synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"❌ Error liberando Idempotency-Key: {e}")
+
+    @staticmethod
+    async def run(
+        db: Session,
+        google_id: str,
+        key: str,
+        request_hash: str,
+        handler: Callable[[], Awaitable[BaseModel]],
+        response_model: Type[BaseModel],
+        status_code: int = 201
+    ) -> Tuple[BaseModel, bool]:
+        """
+        Ejecuta `handler` una sola vez por (google_id, clave)
+        Retorna (respuesta, es_repetición)
+        """
+        if len(key) > MAX_KEY_LENGTH:
+            raise IdempotencyError(400, f"Idempotency-Key demasiado larga (máximo {MAX_KEY_LENGTH})")
+
+        flight_key = (google_id, key)
+        inflight = _inflight.get(flight_key)
+        if inflight:
+            inflight_hash, future = inflight
+            if inflight_hash != request_hash:
+                raise IdempotencyError(422, "Idempotency-Key reutilizada con otro cuerpo")
+            record_cache("idempotency", hit=True)
+            body = await asyncio.shield(future)
+            return response_model.model_validate_json(body), True
+
+        record, owned = IdempotencyService._claim(db, google_id, key, request_hash)
+        if not owned:
+            if record.request_hash != request_hash:
+                raise IdempotencyError(422, "Idempotency-Key reutilizada con otro cuerpo")
+            if record.state != 'completed':
+                record = await IdempotencyService._wait_for_completion(db, google_id, key)
+            record_cache("idempotency", hit=True)
+            return response_model.model_validate_json(record.response_body), True
+
+        record_cache("idempotency", hit=False)
+        future = asyncio.get_running_loop().create_future()
+        _inflight[flight_key] = (request_hash, future)
+        try:
+            try:
+                response = await handler()
+            except BaseException as e:
+                IdempotencyService.release(db, google_id, key)
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+                    future.exception()  # Marcar como recuperada si nadie la esperaba
+                raise
+
+            body = response.model_dump_json()
+            try:
+                record.state = 'completed'
+                record.status_code = status_code
+                record.response_body = body
+                db.commit()
+            except Exception as e:
+                # El gasto ya está guardado: no fallar la petición por la caché de idempotencia
+                db.rollback()
+                logger.error(f"❌ Error guardando respuesta idempotente: {e}")
+            future.set_result(body)
+            return response, False
+        finally:
+            # Tras guardar la fila: los duplicados posteriores la leen de la tabla
+            _inflight.pop(flight_key, None)
+
+    @staticmethod
+    async def reserve(db: Session, google_id: str, key: str, request_hash: str) -> Optional[str]:
+        """
+        Variante para respuestas que no son un único modelo (streaming):
+        None si esta petición reserva la clave (debe llamar a complete o release),
+        o el JSON guardado si es un reintento
+        """
+        if len(key) > MAX_KEY_LENGTH:
+            raise IdempotencyError(400, f"Idempotency-Key demasiado larga (máximo {MAX_KEY_LENGTH})")
+        record, owned = IdempotencyService._claim(db, google_id, key, request_hash)
+        if owned:
+            record_cache("idempotency", hit=False)
+            return None
+        if record.request_hash != request_hash:
+            raise IdempotencyError(422, "Idempotency-Key reutilizada con otro cuerpo")
+        if record.state != 'completed':
+            record = await IdempotencyService._wait_for_completion(db, google_id, key)
+        record_cache("idempotency", hit=True)
+        return record.response_body
+
+    @staticmethod
+    def complete(db: Session, google_id: str, key: str, body: str, status_code: int = 201):
+        """Guarda la respuesta de una clave reservada con reserve()"""
+        db.query(IdempotencyKey)\
+            .filter(IdempotencyKey.google_id == google_id, IdempotencyKey.key == key)\
+            .update({
+                IdempotencyKey.state: 'completed',
+                IdempotencyKey.status_code: status_code,
+                IdempotencyKey.response_body: body
+            }, synchronize_session=False)
+
+    @staticmethod
+    def purge_expired(db: Session) -> int:
+        """Borra las claves caducadas. Retorna cuántas se borraron"""
+        deleted = db.query(IdempotencyKey)\
+            .filter(IdempotencyKey.expires_at <= _utcnow())\
+            .delete(synchronize_session=False)
+        db.commit()
+        return deleted
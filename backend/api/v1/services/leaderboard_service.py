@@ -0,0 +1,199 @@
+# api/v1/services/leaderboard_service.py
+"""
+Clasificación de rachas: posición y percentil sin COUNT(*) por petición
+- Histograma de current_streak (un bucket por valor hasta LEADERBOARD_MAX_BUCKET)
+  y top-N en memoria del worker
+- Recálculo completo cada LEADERBOARD_REFRESH_SECONDS: un GROUP BY y un ORDER BY ... LIMIT
+  sobre el índice ix_streaks_current_streak
+- Entre recálculos, cada cambio de racha del worker (update_streak, rachas nuevas) mueve
+  un usuario de bucket; los cambios de otros workers entran con el siguiente recálculo y
+  el rollover nocturno fuerza uno pasada LEADERBOARD_ROLLOVER_TIME
+- Un cambio confirmado mientras se recalculaba no se sabe si entró en la consulta: se
+  anota y se vuelve a aplicar sobre la clasificación nueva al cargarla (change() no mueve
+  dos veces a quien la consulta ya trajo en el top con su racha nueva)
+- La posición de un usuario sale del histograma en O(buckets), con el usuario movido
+  antes a su racha real si el worker lo tenía en otro bucket
+"""
+
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, time as clock_time
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from api.config import (
+    LEADERBOARD_TOP_N, LEADERBOARD_REFRESH_SECONDS, LEADERBOARD_MAX_BUCKET, LEADERBOARD_ROLLOVER_TIME
+)
+from api.metrics import record_cache
+from api.models import Streak
+
+logger = logging.getLogger(__name__)
+
+# El top guarda el doble de lo que se sirve: si alguien del top baja de racha entre
+# recálculos, los siguientes ya están en memoria
+TOP_SLACK = 2
+ROLLOVER_TIME = clock_time.fromisoformat(LEADERBOARD_ROLLOVER_TIME)
+
+def bucket(streak: int) -> int:
+    return min(max(streak, 0), LEADERBOARD_MAX_BUCKET)
+
+@dataclass
+class Rank:
+    """Posición de una racha frente al resto de usuarios"""
+    rank: int               # 1 + usuarios con más racha
+    total_users: int
+    percentile: float       # % de usuarios con menos racha
+
+class Leaderboard:
+    """Histograma + top-N de current_streak"""
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (LEADERBOARD_MAX_BUCKET + 1)
+        self.top: List[Tuple[int, UUID]] = []     # (racha, user_id) de mayor a menor
+        # Racha con la que cuenta el histograma a los usuarios que el worker conoce
+        # (top al recalcular y cambios posteriores)
+        self.values: Dict[UUID, int] = {}
+        self.refreshed_at: Optional[float] = None  # time.monotonic() al empezar la consulta
+        self.refreshed_wall: Optional[datetime] = None
+        # Recálculos en curso y cambios confirmados mientras tanto (user_id, old, new, confirmado en)
+        self.refreshing = 0
+        self.pending: List[Tuple[UUID, Optional[int], int, float]] = []
+
+    def load(self, histogram: List[Tuple[int, int]], top: List[Tuple[int, UUID]], started_at: float):
+        """Sustituye la clasificación por la de una consulta empezada en started_at y le
+        aplica los cambios confirmados desde entonces (la consulta pudo no verlos)"""
+        counts = [0] * (LEADERBOARD_MAX_BUCKET + 1)
+        for streak, count in histogram:
+            counts[bucket(streak)] += count
+        self.counts = counts
+        self.top = list(top)
+        self.values = {user_id: streak for streak, user_id in top}
+        for user_id, old, new, committed_at in self.pending:
+            if committed_at < started_at:
+                self.values[user_id] = new
+            else:
+                self.change(user_id, old, new)
+
+    def change(self, user_id: UUID, old: Optional[int], new: int):
+        """Mueve al usuario de bucket (old None: racha nueva) y lo recoloca en el top.
+        Si el worker ya lo tenía contado con otra racha, se quita de esa"""
+        old = self.values.get(user_id, old)
+        self.values[user_id] = new
+        if old == new:
+            return
+        if old is not None:
+            self.counts[bucket(old)] = max(self.counts[bucket(old)] - 1, 0)
+        self.counts[bucket(new)] += 1
+
+        top = [entry for entry in self.top if entry[1] != user_id]
+        if new > 0 and (len(top) < LEADERBOARD_TOP_N * TOP_SLACK or new > top[-1][0]):
+            top.append((new, user_id))
+            top.sort(key=lambda entry: (-entry[0], str(entry[1])))
+        self.top = top[:LEADERBOARD_TOP_N * TOP_SLACK]
+
+    def rank(self, streak: int) -> Rank:
+        """O(buckets): usuarios con más y con menos racha que `streak`"""
+        b = bucket(streak)
+        total = sum(self.counts)
+        above = sum(self.counts[b + 1:])
+        below = total - above - self.counts[b]
+        return Rank(
+            rank=above + 1,
+            total_users=total,
+            percentile=round(100 * below / total, 1) if total else 0.0
+        )
+
+_leaderboard = Leaderboard()
+_leaderboard_lock = threading.Lock()
+
+class LeaderboardService:
+    """Servicio de clasificación de rachas"""
+
+    @staticmethod
+    def _query(db: Session) -> Tuple[List[Tuple[int, int]], List[Tuple[int, UUID]]]:
+        histogram = db.query(Streak.current_streak, func.count())\
+            .group_by(Streak.current_streak)\
+            .all()
+        top = db.query(Streak.current_streak, Streak.user_id)\
+            .filter(Streak.current_streak > 0)\
+            .order_by(Streak.current_streak.desc(), Streak.user_id)\
+            .limit(LEADERBOARD_TOP_N * TOP_SLACK)\
+            .all()
+        return [tuple(row) for row in histogram], [tuple(row) for row in top]
+
+    @staticmethod
+    def _fresh(now: float, wall: datetime) -> bool:
+        """Con _leaderboard_lock: cargada, sin caducar y posterior al último rollover nocturno"""
+        if _leaderboard.refreshed_at is None or now - _leaderboard.refreshed_at >= LEADERBOARD_REFRESH_SECONDS:
+            return False
+        rollover_at = datetime.combine(wall.date(), ROLLOVER_TIME)
+        return wall < rollover_at or _leaderboard.refreshed_wall >= rollover_at
+
+    @staticmethod
+    def get(db: Session) -> Leaderboard:
+        """Clasificación del worker (se recalcula si no hay, caducó o pasó el rollover nocturno)"""
+        now = time.monotonic()
+        wall = datetime.now()
+        with _leaderboard_lock:
+            fresh = LeaderboardService._fresh(now, wall)
+        record_cache("leaderboard", hit=fresh)
+        if not fresh:
+            with _leaderboard_lock:
+                _leaderboard.refreshing += 1
+            try:
+                histogram, top = LeaderboardService._query(db)
+                with _leaderboard_lock:
+                    _leaderboard.load(histogram, top, now)
+                    _leaderboard.refreshed_at = now
+                    _leaderboard.refreshed_wall = wall
+            finally:
+                with _leaderboard_lock:
+                    _leaderboard.refreshing -= 1
+                    if not _leaderboard.refreshing:
+                        _leaderboard.pending.clear()
+            logger.info(f"🏆 Clasificación recalculada: {sum(count for _, count in histogram)} rachas")
+        return _leaderboard
+
+    @staticmethod
+    def rank(db: Session, user_id: UUID, streak: int) -> Tuple[Rank, List[Tuple[int, int, bool]]]:
+        """Posición del usuario (streak: su racha leída de la base de datos) y top-N como
+        (posición, racha, es el usuario)"""
+        leaderboard = LeaderboardService.get(db)
+        with _leaderboard_lock:
+            # El worker lo tenía contado con otra racha (top o cambio anterior): se mueve
+            # antes de contar, para que no compita consigo mismo
+            if leaderboard.values.get(user_id, streak) != streak:
+                leaderboard.change(user_id, None, streak)
+            result = leaderboard.rank(streak)
+            top = leaderboard.top[:LEADERBOARD_TOP_N]
+            # Empates: misma posición (1 + rachas mayores)
+            entries = [
+                (leaderboard.rank(value).rank, value, top_user == user_id)
+                for value, top_user in top
+            ]
+        return result, entries
+
+    @staticmethod
+    def record_change(user_id: UUID, old: Optional[int], new: int):
+        """
+        Ajuste incremental tras un cambio de racha ya confirmado en este worker
+        - Recálculo en curso: se anota para aplicarlo también a la clasificación nueva
+        - Clasificación cargada por un recálculo empezado después del commit: ya lo incluye,
+          solo se anota la racha
+        - Si no (terminado antes o solapado con el commit): se mueve al usuario
+        """
+        committed_by = time.monotonic()
+        with _leaderboard_lock:
+            if _leaderboard.refreshing:
+                _leaderboard.pending.append((user_id, old, new, committed_by))
+            if _leaderboard.refreshed_at is None:
+                return
+            if committed_by < _leaderboard.refreshed_at:
+                _leaderboard.values[user_id] = new
+            else:
+                _leaderboard.change(user_id, old, new)
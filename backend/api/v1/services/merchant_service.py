@@ -0,0 +1,155 @@
+# api/v1/services/merchant_service.py
+"""
+Memoria comercio -> categoría por usuario
+- merchant_key: texto normalizado sin importes ni palabras de relleno
+  ("Mercadona 32", "32€ en mercadona" -> "mercadona")
+- La categoría más reciente de cada comercio en el historial del usuario se sirve
+  desde una caché por worker antes que cualquier nivel del parser
+- Recategorizar una transacción corrige todas las del mismo comercio en un solo UPDATE
+  y recalcula spending_stats de las categorías vieja(s) y nueva
+"""
+
+import re
+import time
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from api.config import MERCHANT_MEMORY_ENABLED, MERCHANT_CACHE_USERS, MERCHANT_CACHE_TTL_SECONDS, MERCHANT_HISTORY_LIMIT
+from api.metrics import record_cache
+from api.models import Transaction
+from api.v1.services.aury_service import CATEGORY_KEYWORDS
+from api.v1.services.spending_stats_service import SpendingStatsService
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 120
+OTHER_CATEGORY = '❓ Otros'
+WORD_REGEX = re.compile(r'[a-zñ]+')
+# Tildes fuera, la ñ se conserva ("año" y "ano" son comercios distintos)
+ACCENTS = str.maketrans('áéíóúüàèìòùâêîôûç', 'aeiouuaeiouaeiouc')
+
+# Palabras que no identifican al comercio (importes, monedas, verbos de gasto, artículos)
+MERCHANT_STOPWORDS = {
+    'en', 'de', 'del', 'el', 'la', 'los', 'las', 'un', 'una', 'y', 'con', 'por', 'para', 'al',
+    'euro', 'euros', 'eur', 'peso', 'pesos', 'pague', 'pagado', 'pago', 'gaste', 'gastado',
+    'gasto', 'compra', 'compre', 'hoy', 'ayer'
+}
+
+class RecategorizeError(ValueError):
+    """Error de recategorización; status_code es el código HTTP a devolver"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+def merchant_key(raw_text: str) -> Optional[str]:
+    """Clave del comercio: minúsculas, sin tildes, solo palabras significativas (None si no queda ninguna)"""
+    text = unicodedata.normalize('NFC', raw_text.lower()).translate(ACCENTS)
+    words = [w for w in WORD_REGEX.findall(text) if w not in MERCHANT_STOPWORDS]
+    return ' '.join(words)[:MAX_KEY_LENGTH].strip() or None
+
+# user_id -> (instante de carga, {merchant_key: categoría}); LRU por usuario
+_memory: "OrderedDict[UUID, Tuple[float, Dict[str, str]]]" = OrderedDict()
+_memory_lock = threading.Lock()
+
+class MerchantMemoryService:
+    """Servicio de memoria de comercios"""
+
+    @staticmethod
+    def _load(db: Session, user_id: UUID) -> Dict[str, str]:
+        """Categoría más reciente de cada comercio en las últimas transacciones del usuario"""
+        rows = db.query(Transaction.merchant_key, Transaction.category)\
+            .filter(
+                Transaction.user_id == user_id,
+                Transaction.merchant_key.isnot(None),
+                Transaction.category.isnot(None),
+                Transaction.category != OTHER_CATEGORY
+            )\
+            .order_by(Transaction.created_at.desc())\
+            .limit(MERCHANT_HISTORY_LIMIT)\
+            .all()
+        memory: Dict[str, str] = {}
+        for key, category in rows:
+            memory.setdefault(key, category)
+        return memory
+
+    @staticmethod
+    def lookup(db: Session, user_id: UUID, key: Optional[str]) -> Optional[str]:
+        """Categoría recordada para el comercio (None si no hay o la memoria está desactivada)"""
+        if not MERCHANT_MEMORY_ENABLED or not key:
+            return None
+        now = time.monotonic()
+        with _memory_lock:
+            entry = _memory.get(user_id)
+            if entry and now - entry[0] < MERCHANT_CACHE_TTL_SECONDS:
+                _memory.move_to_end(user_id)
+                memory = entry[1]
+            else:
+                memory = None
+        record_cache("merchant_memory", hit=memory is not None)
+
+        if memory is None:
+            memory = MerchantMemoryService._load(db, user_id)
+            with _memory_lock:
+                _memory[user_id] = (now, memory)
+                _memory.move_to_end(user_id)
+                if len(_memory) > MERCHANT_CACHE_USERS:
+                    _memory.popitem(last=False)
+        return memory.get(key)
+
+    @staticmethod
+    def learn(user_id: UUID, key: Optional[str], category: Optional[str]):
+        """Aprende la categoría de un gasto recién guardado (solo si el usuario ya está en caché)"""
+        if not key or not category or category == OTHER_CATEGORY:
+            return
+        with _memory_lock:
+            entry = _memory.get(user_id)
+            if entry:
+                entry[1][key] = category
+
+    @staticmethod
+    def invalidate(user_id: UUID):
+        with _memory_lock:
+            _memory.pop(user_id, None)
+
+    @staticmethod
+    def recategorize(db: Session, user_id: UUID, transaction_id: UUID, category: str) -> Tuple[Optional[str], int]:
+        """
+        Cambia la categoría de la transacción y de todas las del mismo comercio del usuario
+        (un solo UPDATE sobre ix_transactions_user_merchant). No hace commit: el llamador
+        confirma y después invalida la memoria con invalidate()
+        Retorna (merchant_key, transacciones actualizadas)
+        """
+        if category not in CATEGORY_KEYWORDS:
+            raise RecategorizeError(400, f"Categoría no válida: {category}")
+
+        transaction = db.query(Transaction)\
+            .filter(Transaction.id == transaction_id, Transaction.user_id == user_id)\
+            .first()
+        if not transaction:
+            raise RecategorizeError(404, "Transacción no encontrada")
+
+        key = transaction.merchant_key or merchant_key(transaction.raw_text)
+        if not key:
+            # Sin comercio reconocible: solo esta transacción
+            SpendingStatsService.recategorize(db, user_id, Transaction.id == transaction.id, category)
+            transaction.category = category
+            return None, 1
+
+        # Filas antiguas sin merchant_key (antes del backfill): se corrige esta también
+        if transaction.merchant_key is None:
+            transaction.merchant_key = key
+            db.flush()
+        # Los gastos movidos salen de sus categorías y entran en la nueva
+        SpendingStatsService.recategorize(db, user_id, Transaction.merchant_key == key, category)
+        updated = db.query(Transaction)\
+            .filter(Transaction.user_id == user_id, Transaction.merchant_key == key)\
+            .update({Transaction.category: category}, synchronize_session=False)
+        logger.info(f"🏷️ Recategorizadas {updated} transacciones de '{key}' a {category}")
+        return key, updated
@@ -10,7 +10,8 @@ from typing import List, Optional, Dict
 from sqlalchemy.orm import Session
 from datetime import datetime, time
 
-from api.config import ONESIGNAL_APP_ID, ONESIGNAL_REST_API_KEY
+from api.config import ONESIGNAL_APP_ID, ONESIGNAL_REST_API_KEY, ONESIGNAL_API_URL
+from api.metrics import ONESIGNAL_SENDS
 from api.models import User, DeviceSubscription, Streak
 
 logger = logging.getLogger(__name__)
@@ -18,7 +19,7 @@ logger = logging.getLogger(__name__)
 class NotificationService:
     """Servicio para gestionar notificaciones push con OneSignal"""
     
-    ONESIGNAL_API_URL = "https://onesignal.com/api/v1/notifications"
+    ONESIGNAL_API_URL = ONESIGNAL_API_URL
     
     @staticmethod
     def send_notification(
@@ -43,10 +44,12 @@ class NotificationService:
         """
         if not ONESIGNAL_APP_ID or not ONESIGNAL_REST_API_KEY:
             logger.warning("OneSignal no configurado. Saltando envío de notificación.")
+            ONESIGNAL_SENDS.labels(outcome="not_configured").inc()
             return False
         
         if not player_ids:
             logger.warning("No hay player_ids para enviar notificación.")
+            ONESIGNAL_SENDS.labels(outcome="no_devices").inc()
             return False
         
         payload = {
@@ -74,9 +77,11 @@ class NotificationService:
                 headers=headers
             )
             response.raise_for_status()
+            ONESIGNAL_SENDS.labels(outcome="success").inc()
             logger.info(f"Notificación enviada exitosamente a {len(player_ids)} dispositivos")
             return True
         except requests.exceptions.RequestException as e:
+            ONESIGNAL_SENDS.labels(outcome="error").inc()
             logger.error(f"Error enviando notificación OneSignal: {e}")
             if hasattr(e, 'response') and e.response is not None:
                 logger.error(f"Response: {e.response.text}")
@@ -0,0 +1,338 @@
+# api/v1/services/similarity_service.py
+"""
+Gastos parecidos del usuario para el contexto de Aury
+- Vectores: palabras y trigramas de caracteres de la clave del comercio
+  (merchant_key) hasheados con crc32; similitud coseno sobre vectores binarios
+- Índice invertido por usuario (n-grama -> filas) en caché del worker: la búsqueda
+  es un bincount sobre las filas que comparten algún n-grama con el texto
+- Resultado: una línea compacta para el prompt ("Historial: ...") con número, total,
+  media y peso en el gasto de los últimos SIMILAR_WINDOW_DAYS días
+
+Si el texto no tiene comercio reconocible ("12"), los parecidos son los de la misma categoría
+
+Presupuesto (SIMILAR_BUDGET_MS): con el índice frío no hay línea Historial y el endpoint
+carga el índice después de responder (BackgroundTask, warm) para el siguiente gasto; la
+línea solo entra si la búsqueda acaba dentro del presupuesto
+"""
+
+import time
+import zlib
+import logging
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from itertools import chain, islice
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from sqlalchemy.pool import StaticPool
+
+from api.database import SessionLocal, engine
+from api.config import (
+    SIMILAR_ENABLED, SIMILAR_HISTORY_LIMIT, SIMILAR_TOP_K, SIMILAR_MIN_SCORE, SIMILAR_WINDOW_DAYS,
+    SIMILAR_BUDGET_MS, SIMILAR_CACHE_USERS, SIMILAR_CACHE_TTL_SECONDS
+)
+from api.metrics import SIMILAR_LOOKUP_DURATION, record_cache
+from api.models import Transaction
+from api.v1.services.category_classifier import NUMPY_AVAILABLE
+from api.v1.services.merchant_service import merchant_key, OTHER_CATEGORY
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def text_features(raw_text: str) -> List[int]:
+    """n-gramas hasheados (sin repetir) de la clave del comercio; [] si no hay comercio"""
+    key = merchant_key(raw_text)
+    if not key:
+        return []
+    words = key.split()
+    grams = [f"w:{w}" for w in words]
+    for word in words:
+        padded = f"<{word}>"
+        grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return sorted({zlib.crc32(g.encode('utf-8')) for g in grams})
+
+def _format_amount(value: float) -> str:
+    return f"{value:.2f}".rstrip('0').rstrip('.') + "€"
+
+@dataclass
+class SimilarSummary:
+    """Gastos parecidos en la ventana"""
+    count: int
+    total: float
+    share: float                # Fracción del gasto total de la ventana
+    days_since_last: int
+    top_amounts: List[float]    # Importes de los k más parecidos
+
+    def render(self) -> str:
+        """Línea compacta para el prompt"""
+        when = {0: "hoy", 1: "ayer"}.get(self.days_since_last, f"hace {self.days_since_last} días")
+        return (
+            f"{self.count} {'parecido' if self.count == 1 else 'parecidos'} en {SIMILAR_WINDOW_DAYS} días, {_format_amount(self.total)} en total "
+            f"(media {_format_amount(self.total / self.count)}, {self.share:.0%} de tu gasto), el último {when}; "
+            f"importes: {', '.join(_format_amount(a) for a in self.top_amounts)}"
+        )
+
+class ExpenseIndex:
+    """Índice invertido de los gastos de un usuario (filas en orden cronológico)"""
+
+    def __init__(self):
+        self.postings: Dict[int, List[int]] = {}
+        self.sizes: List[int] = []
+        self.amounts: List[float] = []
+        self.days: List[int] = []           # date.toordinal()
+        self.categories: List[Optional[str]] = []
+        self._arrays = None
+        # Solo protege add y la foto de search: las búsquedas no se bloquean entre sí
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def add(self, raw_text: str, amount: float, category: Optional[str], day: date):
+        features = text_features(raw_text)
+        with self._lock:
+            row = len(self.sizes)
+            for feature in features:
+                self.postings.setdefault(feature, []).append(row)
+            # sizes la última: una foto con n filas tiene ya sus postings y columnas
+            self.amounts.append(float(amount))
+            self.days.append(day.toordinal())
+            self.categories.append(category)
+            self.sizes.append(len(features))
+            self._arrays = None
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[str, float, Optional[str], date]]) -> "ExpenseIndex":
+        """rows: (raw_text, amount, category, día) de más antiguo a más reciente"""
+        index = cls()
+        for raw_text, amount, category, day in rows:
+            index.add(raw_text, amount, category, day)
+        return index
+
+    def _scores(self, raw_text: str, category: Optional[str], n: int) -> Dict[int, float]:
+        """Filas (< n) con similitud > 0 -> coseno (o 1.0 por categoría si el texto no tiene comercio)"""
+        features = text_features(raw_text)
+        if not features:
+            if not category or category == OTHER_CATEGORY:
+                return {}
+            return {row: 1.0 for row, c in enumerate(islice(self.categories, n)) if c == category}
+        hits = [self.postings[f] for f in features if f in self.postings]
+        shared = Counter(row for row in chain.from_iterable(hits) if row < n)
+        norm = len(features) ** 0.5
+        return {row: count / (norm * self.sizes[row] ** 0.5) for row, count in shared.items()}
+
+    def _numpy_arrays(self):
+        """(sizes, amounts, days) de las filas actuales; llamar con self._lock"""
+        if self._arrays is None:
+            self._arrays = (
+                np.asarray(self.sizes, dtype=np.float32),
+                np.asarray(self.amounts, dtype=np.float64),
+                np.asarray(self.days, dtype=np.int64)
+            )
+        return self._arrays
+
+    def _numpy_scores(self, raw_text: str, category: Optional[str], sizes):
+        n = len(sizes)
+        features = text_features(raw_text)
+        if not features:
+            if not category or category == OTHER_CATEGORY:
+                return None
+            return np.fromiter((c == category for c in islice(self.categories, n)), dtype=np.float32, count=n)
+        hits = [self.postings[f] for f in features if f in self.postings]
+        if not hits:
+            return None
+        rows = np.fromiter(chain.from_iterable(hits), dtype=np.int64)
+        # Filas añadidas después de la foto: fuera
+        shared = np.bincount(rows[rows < n], minlength=n).astype(np.float32)
+        return shared / (np.sqrt(np.maximum(sizes, 1)) * np.float32(len(features) ** 0.5))
+
+    def search(
+        self,
+        raw_text: str,
+        category: Optional[str],
+        today: date,
+        k: int = SIMILAR_TOP_K,
+        min_score: float = SIMILAR_MIN_SCORE,
+        window_days: int = SIMILAR_WINDOW_DAYS
+    ) -> Optional[SimilarSummary]:
+        """Resumen de los gastos parecidos dentro de la ventana (None si no hay)
+
+        Busca sobre una foto de las filas actuales (tomada con el lock del índice):
+        los add concurrentes no bloquean la búsqueda ni entran en ella
+        """
+        with self._lock:
+            n = len(self.sizes)
+            arrays = self._numpy_arrays() if NUMPY_AVAILABLE and n else None
+        if not n:
+            return None
+        since = today.toordinal() - window_days
+        if NUMPY_AVAILABLE:
+            sizes, amounts, days = arrays
+            scores = self._numpy_scores(raw_text, category, sizes)
+            if scores is None:
+                return None
+            in_window = days >= since
+            matches = np.flatnonzero((scores >= min_score) & in_window)
+            if not len(matches):
+                return None
+            # Más parecidos primero; a igual similitud, los más recientes
+            best = matches[np.lexsort((-days[matches], -scores[matches]))[:k]]
+            total = float(amounts[matches].sum())
+            window_total = float(amounts[in_window].sum())
+            last_day = int(days[matches].max())
+            top_amounts = [float(a) for a in amounts[best]]
+        else:
+            scores = self._scores(raw_text, category, n)
+            matches = [r for r, s in scores.items() if s >= min_score and self.days[r] >= since]
+            if not matches:
+                return None
+            best = sorted(matches, key=lambda r: (-scores[r], -self.days[r]))[:k]
+            total = sum(self.amounts[r] for r in matches)
+            window_total = sum(a for a, d in zip(self.amounts[:n], self.days[:n]) if d >= since)
+            last_day = max(self.days[r] for r in matches)
+            top_amounts = [self.amounts[r] for r in best]
+        return SimilarSummary(
+            count=len(matches),
+            total=total,
+            share=total / window_total if window_total else 0.0,
+            days_since_last=today.toordinal() - last_day,
+            top_amounts=top_amounts
+        )
+
+# user_id -> (instante de carga, índice); LRU por usuario
+_indexes: "OrderedDict[UUID, Tuple[float, ExpenseIndex]]" = OrderedDict()
+_indexes_lock = threading.Lock()
+# Usuarios con carga en segundo plano en curso -> marca; invalidate la retira para
+# que una carga empezada antes de un cambio no guarde un índice viejo
+_warming: Dict[UUID, object] = {}
+
+class SimilarExpenseService:
+    """Servicio de gastos parecidos"""
+
+    @staticmethod
+    def _load(db: Session, user_id: UUID) -> ExpenseIndex:
+        """Índice con los últimos SIMILAR_HISTORY_LIMIT gastos del usuario"""
+        rows = db.query(Transaction.raw_text, Transaction.amount, Transaction.category, Transaction.created_at)\
+            .filter(
+                Transaction.user_id == user_id,
+                Transaction.amount.isnot(None),
+                or_(Transaction.type.is_(None), Transaction.type != 'income')
+            )\
+            .order_by(Transaction.created_at.desc())\
+            .limit(SIMILAR_HISTORY_LIMIT)\
+            .all()
+        return ExpenseIndex.build(
+            (raw_text, amount, category, created_at.date())
+            for raw_text, amount, category, created_at in reversed(rows)
+        )
+
+    @staticmethod
+    def _cached(user_id: UUID) -> Optional[ExpenseIndex]:
+        """Índice en caché si no ha caducado (None si no)"""
+        now = time.monotonic()
+        with _indexes_lock:
+            entry = _indexes.get(user_id)
+            if entry and now - entry[0] < SIMILAR_CACHE_TTL_SECONDS:
+                _indexes.move_to_end(user_id)
+                index = entry[1]
+            else:
+                index = None
+        record_cache("similar_index", hit=index is not None)
+        return index
+
+    @staticmethod
+    def _store(user_id: UUID, loaded_at: float, index: ExpenseIndex):
+        with _indexes_lock:
+            _indexes[user_id] = (loaded_at, index)
+            _indexes.move_to_end(user_id)
+            if len(_indexes) > SIMILAR_CACHE_USERS:
+                _indexes.popitem(last=False)
+
+    @staticmethod
+    def get_index(db: Session, user_id: UUID) -> ExpenseIndex:
+        """Índice de gastos del usuario (caché del worker; se carga si no está o caducó)"""
+        index = SimilarExpenseService._cached(user_id)
+        if index is None:
+            loaded_at = time.monotonic()
+            index = SimilarExpenseService._load(db, user_id)
+            SimilarExpenseService._store(user_id, loaded_at, index)
+        return index
+
+    @staticmethod
+    def warm(user_id: UUID):
+        """
+        Carga el índice fuera de la petición (BackgroundTask, ya enviada la respuesta) con
+        su propia sesión. Sin efecto si ya está en caché, si otra carga del usuario está en
+        curso o si el pool comparte una única conexión (StaticPool del perfil memory): ahí
+        la sesión propia pisaría la transacción de la petición
+        """
+        if not SIMILAR_ENABLED or isinstance(engine.pool, StaticPool):
+            return
+        token = object()
+        with _indexes_lock:
+            entry = _indexes.get(user_id)
+            if (entry and time.monotonic() - entry[0] < SIMILAR_CACHE_TTL_SECONDS) or user_id in _warming:
+                return
+            _warming[user_id] = token
+        db = SessionLocal()
+        try:
+            loaded_at = time.monotonic()
+            index = SimilarExpenseService._load(db, user_id)
+            with _indexes_lock:
+                current = _warming.get(user_id) is token
+            if current:
+                SimilarExpenseService._store(user_id, loaded_at, index)
+        except Exception as e:
+            logger.warning(f"⚠️ Error cargando gastos parecidos en segundo plano: {e}")
+        finally:
+            db.close()
+            with _indexes_lock:
+                if _warming.get(user_id) is token:
+                    del _warming[user_id]
+
+    @staticmethod
+    def summary(db: Session, user_id: UUID, raw_text: str, category: Optional[str]) -> Optional[str]:
+        """Línea 'Historial' para el prompt de Aury (None si no hay parecidos, está desactivado,
+        el índice está frío o la búsqueda se pasa de SIMILAR_BUDGET_MS). Con el índice frío
+        el llamador programa warm() para después de responder"""
+        if not SIMILAR_ENABLED:
+            return None
+        start = time.perf_counter()
+        index = SimilarExpenseService._cached(user_id)
+        if index is None:
+            # Sin cargar en esta petición: la carga (hasta SIMILAR_HISTORY_LIMIT filas) no cabe en el presupuesto
+            SIMILAR_LOOKUP_DURATION.labels(outcome="cold").observe(time.perf_counter() - start)
+            return None
+        result = index.search(raw_text, category, date.today())
+        elapsed = time.perf_counter() - start
+        if elapsed * 1000 > SIMILAR_BUDGET_MS:
+            logger.warning(f"⚠️ Búsqueda de gastos parecidos lenta: {elapsed * 1000:.1f} ms ({len(index)} gastos), sin Historial")
+            SIMILAR_LOOKUP_DURATION.labels(outcome="over_budget").observe(elapsed)
+            return None
+        SIMILAR_LOOKUP_DURATION.labels(outcome="found" if result else "empty").observe(elapsed)
+        return result.render() if result else None
+
+    @staticmethod
+    def add(user_id: UUID, transaction: Transaction):
+        """Añade un gasto recién guardado al índice (solo si el usuario ya está en caché)"""
+        if transaction.amount is None or transaction.type == 'income':
+            return
+        with _indexes_lock:
+            entry = _indexes.get(user_id)
+            # Una carga en curso podría no incluir este gasto: se descarta y se repite
+            _warming.pop(user_id, None)
+        if entry:
+            entry[1].add(transaction.raw_text, transaction.amount, transaction.category, date.today())
+
+    @staticmethod
+    def invalidate(user_id: UUID):
+        with _indexes_lock:
+            _indexes.pop(user_id, None)
+            _warming.pop(user_id, None)
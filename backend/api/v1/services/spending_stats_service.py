@@ -0,0 +1,209 @@
+# api/v1/services/spending_stats_service.py
+"""
+Estadísticas de gasto por usuario y categoría y detección de gastos inusuales
+- Tabla spending_stats: count, mean, m2 (Welford) y ewma por (usuario, categoría)
+- Cada gasto se puntúa con un z-score frente a la media del usuario en su categoría
+  leyendo una sola fila (sin recorrer el historial)
+- La actualización es una única sentencia atómica con la recurrencia de Welford en SQL
+  (INSERT ... ON CONFLICT DO UPDATE en PostgreSQL y SQLite): dos gastos simultáneos del
+  mismo usuario no pierden ninguna actualización
+- scripts/backfill_spending_stats.py calcula las estadísticas iniciales en una pasada
+- Recategorizar gastos recalcula desde transactions las filas de las categorías afectadas
+  (la EWMA no se puede deshacer valor a valor), con una sola lectura previa al UPDATE
+"""
+
+import math
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import case, func, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from api.config import ANOMALY_ENABLED, ANOMALY_MIN_COUNT, ANOMALY_Z_THRESHOLD, SPENDING_EWMA_ALPHA
+from api.models import SpendingStat, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Desviación mínima relativa a la media: con importes casi idénticos (el café de siempre)
+# la varianza es ~0 y cualquier céntimo de diferencia sería "inusual"
+MIN_STD_FRACTION = 0.25
+MIN_STD_EUR = 1.0
+
+def welford_step(count: int, mean: float, m2: float, x: float) -> Tuple[int, float, float]:
+    """Un paso de Welford: (count, mean, m2) tras añadir x"""
+    count += 1
+    delta = x - mean
+    mean += delta / count
+    m2 += delta * (x - mean)
+    return count, mean, m2
+
+def ewma_step(ewma: float, x: float, count: int, alpha: float = SPENDING_EWMA_ALPHA) -> float:
+    """Media exponencial tras añadir x (count = número de valores previos)"""
+    return x if count == 0 else ewma + alpha * (x - ewma)
+
+def compute_stats(rows: Iterable[Tuple]) -> List[Dict]:
+    """Welford + EWMA de filas (user_id, category, amount) ordenadas por usuario, categoría y fecha"""
+    stats: List[Dict] = []
+    current = None
+    for user_id, category, amount in rows:
+        if current is None or (current["user_id"], current["category"]) != (user_id, category):
+            current = {"user_id": user_id, "category": category, "count": 0, "mean": 0.0, "m2": 0.0, "ewma": 0.0}
+            stats.append(current)
+        x = float(amount)
+        current["ewma"] = ewma_step(current["ewma"], x, current["count"])
+        current["count"], current["mean"], current["m2"] = welford_step(
+            current["count"], current["mean"], current["m2"], x
+        )
+    return stats
+
+def expense_rows_query(db: Session):
+    """(user_id, category, amount) de los gastos puntuables, sin filtrar ni ordenar"""
+    return db.query(Transaction.user_id, Transaction.category, Transaction.amount)\
+        .filter(
+            Transaction.amount.isnot(None),
+            Transaction.category.isnot(None),
+            or_(Transaction.type.is_(None), Transaction.type != 'income')
+        )
+
+@dataclass
+class AnomalyScore:
+    """z-score de un importe frente a las estadísticas del usuario en la categoría"""
+    z: float
+    mean: float
+    ewma: float
+    count: int
+    category: str
+
+    @property
+    def is_anomaly(self) -> bool:
+        return abs(self.z) >= ANOMALY_Z_THRESHOLD
+
+    def render(self) -> str:
+        """Línea compacta para el prompt de Aury"""
+        direction = "por encima" if self.z > 0 else "por debajo"
+        category = self.category.split(' ', 1)[-1]
+        return (
+            f"{abs(self.z):.1f} desviaciones {direction} de tu media en {category} "
+            f"({self.mean:.2f}€ en {self.count} gastos; últimamente {self.ewma:.2f}€)"
+        )
+
+class SpendingStatsService:
+    """Servicio de estadísticas de gasto"""
+
+    @staticmethod
+    def score(stat: Optional[Dict], amount: float, category: str) -> Optional[AnomalyScore]:
+        """z-score del importe (None si hay menos de ANOMALY_MIN_COUNT gastos previos)"""
+        if not stat or stat["count"] < ANOMALY_MIN_COUNT:
+            return None
+        std = math.sqrt(stat["m2"] / (stat["count"] - 1))
+        std = max(std, MIN_STD_FRACTION * abs(stat["mean"]), MIN_STD_EUR)
+        return AnomalyScore(
+            z=(amount - stat["mean"]) / std,
+            mean=stat["mean"],
+            ewma=stat["ewma"],
+            count=stat["count"],
+            category=category
+        )
+
+    @staticmethod
+    def score_expense(db: Session, user_id: UUID, parsed_data: Dict) -> Optional[AnomalyScore]:
+        """Puntúa un gasto recién parseado leyendo solo la fila de su categoría"""
+        amount = parsed_data.get('amount')
+        category = parsed_data.get('category')
+        if not ANOMALY_ENABLED or amount is None or not category or parsed_data.get('type') == 'income':
+            return None
+        row = db.query(SpendingStat.count, SpendingStat.mean, SpendingStat.m2, SpendingStat.ewma)\
+            .filter(SpendingStat.user_id == user_id, SpendingStat.category == category)\
+            .first()
+        return SpendingStatsService.score(row._asdict() if row else None, float(amount), category)
+
+    @staticmethod
+    def _assignments(x: float) -> Dict:
+        """Welford + EWMA como SET de SQL (el lado derecho usa los valores anteriores)"""
+        n = SpendingStat.count
+        delta = x - SpendingStat.mean
+        return {
+            SpendingStat.count: n + 1,
+            SpendingStat.mean: SpendingStat.mean + delta / (n + 1),
+            SpendingStat.m2: SpendingStat.m2 + delta * delta * n / (n + 1),
+            SpendingStat.ewma: SpendingStat.ewma + SPENDING_EWMA_ALPHA * (x - SpendingStat.ewma)
+        }
+
+    @staticmethod
+    def _update(db: Session, user_id: UUID, category: str, x: float) -> int:
+        return db.query(SpendingStat)\
+            .filter(SpendingStat.user_id == user_id, SpendingStat.category == category)\
+            .update(SpendingStatsService._assignments(x), synchronize_session=False)
+
+    @staticmethod
+    def _upsert(db: Session, user_id: UUID, category: str, x: float) -> bool:
+        """Crea o actualiza la fila en una sentencia; False si el dialecto no tiene ON CONFLICT"""
+        dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(db.get_bind().dialect.name)
+        if dialect is None:
+            return False
+        assignments = SpendingStatsService._assignments(x)
+        # onupdate de la columna no se aplica en ON CONFLICT DO UPDATE
+        assignments[SpendingStat.updated_at] = func.now()
+        statement = dialect.insert(SpendingStat)\
+            .values(user_id=user_id, category=category, count=1, mean=x, m2=0.0, ewma=x)\
+            .on_conflict_do_update(
+                index_elements=[SpendingStat.user_id, SpendingStat.category],
+                set_={column.name: value for column, value in assignments.items()}
+            )
+        db.execute(statement)
+        return True
+
+    @staticmethod
+    def record(db: Session, user_id: UUID, parsed_data: Dict):
+        """Suma el gasto a las estadísticas de su categoría. No hace commit (va con la transacción)"""
+        amount = parsed_data.get('amount')
+        category = parsed_data.get('category')
+        if not ANOMALY_ENABLED or amount is None or not category or parsed_data.get('type') == 'income':
+            return
+        x = float(amount)
+        if SpendingStatsService._upsert(db, user_id, category, x):
+            return
+        # Otros dialectos: UPDATE y, si no había fila, INSERT en un savepoint
+        if SpendingStatsService._update(db, user_id, category, x):
+            return
+        try:
+            with db.begin_nested():
+                db.add(SpendingStat(user_id=user_id, category=category, count=1, mean=x, m2=0.0, ewma=x))
+        except IntegrityError:
+            # Otro gasto del mismo usuario creó la fila a la vez: basta con actualizarla
+            SpendingStatsService._update(db, user_id, category, x)
+
+    @staticmethod
+    def recategorize(db: Session, user_id: UUID, moved, category: str) -> int:
+        """
+        Recalcula las estadísticas que cambian al mover a `category` los gastos del usuario
+        que cumplen `moved` (condición sobre Transaction): sus categorías de origen y la nueva.
+        Llamar ANTES del UPDATE de transactions: una sola lectura trae los gastos de las
+        categorías afectadas ya con la categoría final. No hace commit. Retorna las filas escritas
+        """
+        if not ANOMALY_ENABLED:
+            return 0
+        sources = select(Transaction.category)\
+            .where(Transaction.user_id == user_id, moved)\
+            .scalar_subquery()
+        final_category = case((moved, category), else_=Transaction.category)
+        rows = expense_rows_query(db)\
+            .with_entities(Transaction.user_id, final_category, Transaction.amount, Transaction.category)\
+            .filter(
+                Transaction.user_id == user_id,
+                or_(Transaction.category.in_(sources), Transaction.category == category, moved)
+            )\
+            .order_by(final_category, Transaction.created_at)\
+            .all()
+        categories = {original for *_, original in rows} | {category}
+        stats = compute_stats(row[:3] for row in rows)
+        db.query(SpendingStat)\
+            .filter(SpendingStat.user_id == user_id, SpendingStat.category.in_(categories))\
+            .delete(synchronize_session=False)
+        if stats:
+            db.bulk_insert_mappings(SpendingStat, stats)
+        return len(stats)
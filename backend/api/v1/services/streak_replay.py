@@ -0,0 +1,339 @@
+# api/v1/services/streak_replay.py
+"""
+Motor de repetición de rachas: recalcula streaks desde el historial de transactions
+- Reglas de StreakService: día consecutivo suma y una racha a cero vuelve a empezar en 1
+  - Con rollover nocturno (por defecto, StreakService.rollover): cada día sin actividad
+    gasta un protector de su semana ISO; sin protector la racha queda a cero
+  - Sin rollover (update_streak / _handle_streak_break): un hueco de cualquier longitud
+    gasta el protector semanal y, sin él, la segunda pérdida de la semana deja la racha a cero
+- Vectorizado con NumPy: los días activos de todos los usuarios van en un array plano
+  (CSR: offsets por usuario) y se avanza un paso por día activo para todos a la vez;
+  los usuarios van ordenados por número de días, así los activos en cada paso son un prefijo
+- ReplayPolicy permite simular reglas alternativas (p. ej. 2 protectores por semana)
+- replay_user es la versión en Python puro (referencia y alternativa sin numpy)
+
+No conoce los protectores usados a mano (POST /streak/freeze): no quedan en transactions
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from api.models import Streak, Transaction
+from api.v1.services.category_classifier import NUMPY_AVAILABLE
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NO_WEEK = -1
+
+@dataclass(frozen=True)
+class ReplayPolicy:
+    """Reglas de la racha (por defecto, las de StreakService con el rollover nocturno)"""
+    freezes_per_week: int = 1
+    nightly_rollover: bool = True
+
+@dataclass
+class UserReplay:
+    """Estado final de un usuario tras repetir su historial"""
+    current_streak: int
+    longest_streak: int
+    last_activity: int      # date.toordinal()
+    freezes_used: int
+    losses: int
+
+def week_start(day: int) -> int:
+    """Lunes de la semana ISO del ordinal (date(1, 1, 1) es lunes)"""
+    return day - (day - 1) % 7
+
+def cover_gap(first: int, last: int, week_count: int, freeze_week: int, freezes_per_week: int) -> Tuple[bool, int, int]:
+    """
+    Rollover de los días sin actividad first..last (ordinales): (cubiertos, contador, semana)
+    Cada semana ISO tocada necesita un protector por día; las semanas intermedias completas, 7
+    """
+    first_week, last_week = week_start(first), week_start(last)
+    prior = week_count if freeze_week == first_week else 0
+    if first_week == last_week:
+        used = prior + last - first + 1
+        return used <= freezes_per_week, used, last_week
+    last_days = last - last_week + 1
+    ok = (
+        prior + first_week + 7 - first <= freezes_per_week
+        and last_days <= freezes_per_week
+        and (last_week - first_week == 7 or freezes_per_week >= 7)
+    )
+    return ok, last_days, last_week
+
+def covered_before_loss(first: int, last: int, week_count: int, freeze_week: int, freezes_per_week: int) -> int:
+    """Días del hueco first..last que llegan a cubrirse antes de perder la racha (si no se cubre entero)"""
+    first_week = week_start(first)
+    available = max(freezes_per_week - (week_count if freeze_week == first_week else 0), 0)
+    first_days = min(first_week + 7 - first, last - first + 1)
+    return available if available < first_days else first_days + freezes_per_week
+
+def replay_user(
+    days: Sequence[int],
+    policy: ReplayPolicy = ReplayPolicy(),
+    today: Optional[int] = None
+) -> UserReplay:
+    """
+    Repite la racha de un usuario; days: ordinales de sus días activos, sin repetir y en orden
+    today (solo con rollover): aplica también los cierres desde el último día activo hasta hoy
+    """
+    current = longest = freezes = losses = week_count = 0
+    freeze_week = NO_WEEK
+    last = days[0]
+    for i, day in enumerate(days):
+        gap = day - last
+        if i == 0:
+            current = longest = 1
+        elif policy.nightly_rollover:
+            if gap > 1 and current > 0:
+                ok, count, week = cover_gap(last + 1, day - 1, week_count, freeze_week, policy.freezes_per_week)
+                if ok:
+                    week_count, freeze_week = count, week
+                    freezes += gap - 1
+                else:
+                    losses += 1
+                    current, week_count, freeze_week = 0, 0, NO_WEEK
+            current += 1
+        elif gap == 1:
+            current += 1
+        elif current == 0:
+            current = 1
+        else:
+            week = week_start(day)
+            if freeze_week < week:
+                week_count, freeze_week = 0, NO_WEEK
+            if week_count < policy.freezes_per_week:
+                week_count += 1
+                freeze_week = week
+                freezes += 1
+            else:
+                losses += 1
+                current = 0 if week_count >= 1 else 1
+                week_count, freeze_week = 0, NO_WEEK
+        longest = max(longest, current)
+        last = day
+
+    if policy.nightly_rollover and today is not None and today - 1 > last and current > 0:
+        ok, _, _ = cover_gap(last + 1, today - 1, week_count, freeze_week, policy.freezes_per_week)
+        if ok:
+            freezes += today - 1 - last
+            last = today - 1
+        else:
+            # Cada noche cubierta adelanta el último día (StreakService.rollover)
+            last += covered_before_loss(last + 1, today - 1, week_count, freeze_week, policy.freezes_per_week)
+            losses += 1
+            current = 0
+    return UserReplay(current, longest, last, freezes, losses)
+
+@dataclass
+class ReplayResult:
+    """Estado final de todos los usuarios (arrays alineados con user_ids)"""
+    user_ids: List[UUID]
+    current_streak: "np.ndarray"
+    longest_streak: "np.ndarray"
+    last_activity: "np.ndarray"
+    freezes_used: "np.ndarray"
+    losses: "np.ndarray"
+
+    def summary(self) -> Dict:
+        """Cifras agregadas para comparar políticas"""
+        n = len(self.user_ids)
+        if not n:
+            return {"users": 0}
+        return {
+            "users": n,
+            "mean_current": float(self.current_streak.mean()),
+            "mean_longest": float(self.longest_streak.mean()),
+            "p90_longest": float(np.percentile(self.longest_streak, 90)),
+            "current_7_plus": int((self.current_streak >= 7).sum()),
+            "freezes_used": int(self.freezes_used.sum()),
+            "losses": int(self.losses.sum()),
+            "users_with_loss": int((self.losses > 0).sum())
+        }
+
+def _cover_gaps(first, last, week_count, freeze_week, freezes_per_week: int):
+    """cover_gap sobre arrays"""
+    first_week, last_week = first - (first - 1) % 7, last - (last - 1) % 7
+    prior = np.where(freeze_week == first_week, week_count, 0)
+    same_week = first_week == last_week
+    last_days = last - last_week + 1
+    ok = np.where(
+        same_week,
+        prior + last - first + 1 <= freezes_per_week,
+        (prior + first_week + 7 - first <= freezes_per_week)
+        & (last_days <= freezes_per_week)
+        & ((last_week - first_week == 7) | (freezes_per_week >= 7))
+    )
+    return ok, np.where(same_week, prior + last - first + 1, last_days), last_week
+
+def replay(
+    user_ids: List[UUID],
+    days: "np.ndarray",
+    offsets: "np.ndarray",
+    policy: ReplayPolicy = ReplayPolicy(),
+    today: Optional[int] = None
+) -> ReplayResult:
+    """
+    Repite las rachas de todos los usuarios a la vez (mismo resultado que replay_user)
+    days: ordinales de los días activos (por usuario, sin repetir y en orden);
+    offsets: inicio de cada usuario en days (len(user_ids) + 1)
+    """
+    days = np.asarray(days, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    n = len(lengths)
+    if n == 0 or lengths.min() < 1:
+        raise ValueError("Cada usuario necesita al menos un día activo")
+
+    # Más días primero: en el paso j siguen activos los active[j] primeros
+    order = np.argsort(-lengths, kind="stable")
+    starts = offsets[:-1][order]
+    active = np.searchsorted(-lengths[order], -np.arange(int(lengths.max())), side="left")
+
+    current = np.ones(n, dtype=np.int64)
+    longest = np.ones(n, dtype=np.int64)
+    last = days[starts].copy()
+    week_count = np.zeros(n, dtype=np.int64)
+    freeze_week = np.full(n, NO_WEEK, dtype=np.int64)
+    freezes = np.zeros(n, dtype=np.int64)
+    losses = np.zeros(n, dtype=np.int64)
+
+    for j in range(1, len(active)):
+        m = active[j]
+        # Vistas del prefijo activo: las asignaciones modifican los arrays completos
+        cur, cnt, fw = current[:m], week_count[:m], freeze_week[:m]
+        day = days[starts[:m] + j]
+        gap = day - last[:m]
+
+        if policy.nightly_rollover:
+            broken = (gap > 1) & (cur > 0)
+            ok, count, week = _cover_gaps(last[:m] + 1, day - 1, cnt, fw, policy.freezes_per_week)
+            covered = broken & ok
+            lost = broken & ~ok
+            cnt[covered] = count[covered]
+            fw[covered] = week[covered]
+            freezes[:m] += np.where(covered, gap - 1, 0)
+            cur[lost] = 0
+            cnt[lost] = 0
+            fw[lost] = NO_WEEK
+            losses[:m] += lost
+            cur += 1
+        else:
+            restart = (gap > 1) & (cur == 0)
+            broken = (gap > 1) & (cur > 0)
+            week = day - (day - 1) % 7
+
+            new_week = broken & (fw < week)
+            cnt[new_week] = 0
+            fw[new_week] = NO_WEEK
+
+            frozen = broken & (cnt < policy.freezes_per_week)
+            lost = broken & ~frozen
+            cnt[frozen] += 1
+            fw[frozen] = week[frozen]
+            freezes[:m] += frozen
+
+            cur[gap == 1] += 1
+            cur[restart] = 1
+            cur[lost] = np.where(cnt[lost] >= 1, 0, 1)
+            cnt[lost] = 0
+            fw[lost] = NO_WEEK
+            losses[:m] += lost
+
+        np.maximum(longest[:m], cur, out=longest[:m])
+        last[:m] = day
+
+    if policy.nightly_rollover and today is not None:
+        # Cierres desde el último día activo hasta hoy
+        broken = (today - 1 > last) & (current > 0)
+        first, yesterday = last + 1, np.full(n, today - 1)
+        ok, _, _ = _cover_gaps(first, yesterday, week_count, freeze_week, policy.freezes_per_week)
+        covered, lost = broken & ok, broken & ~ok
+
+        # Cada noche cubierta adelanta el último día, también antes de perder la racha
+        first_week = first - (first - 1) % 7
+        available = np.maximum(policy.freezes_per_week - np.where(freeze_week == first_week, week_count, 0), 0)
+        first_days = np.minimum(first_week + 7 - first, yesterday - first + 1)
+        partial = np.where(available < first_days, available, first_days + policy.freezes_per_week)
+
+        freezes += np.where(covered, today - 1 - last, 0)
+        last += np.where(covered, today - 1 - last, np.where(lost, partial, 0))
+        current[lost] = 0
+        losses += lost
+
+    # Volver al orden de user_ids
+    inverse = np.empty(n, dtype=np.int64)
+    inverse[order] = np.arange(n)
+    return ReplayResult(
+        user_ids=list(user_ids),
+        current_streak=current[inverse],
+        longest_streak=longest[inverse],
+        last_activity=last[inverse],
+        freezes_used=freezes[inverse],
+        losses=losses[inverse]
+    )
+
+def _as_ordinal(value) -> int:
+    # func.date() devuelve date en PostgreSQL y texto ISO en SQLite
+    return (value if isinstance(value, date) else date.fromisoformat(value)).toordinal()
+
+def load_activity(db: Session) -> Tuple[List[UUID], "np.ndarray", "np.ndarray"]:
+    """(user_ids, days, offsets) con los días con alguna transacción de cada usuario"""
+    day_column = func.date(Transaction.created_at)
+    rows = db.query(Transaction.user_id, day_column)\
+        .group_by(Transaction.user_id, day_column)\
+        .order_by(Transaction.user_id, day_column)\
+        .yield_per(10000)
+
+    user_ids: List[UUID] = []
+    offsets: List[int] = []
+    days: List[int] = []
+    for user_id, day in rows:
+        if not user_ids or user_ids[-1] != user_id:
+            user_ids.append(user_id)
+            offsets.append(len(days))
+        days.append(_as_ordinal(day))
+    offsets.append(len(days))
+    return user_ids, np.asarray(days, dtype=np.int64), np.asarray(offsets, dtype=np.int64)
+
+def stored_streaks(db: Session) -> Dict[UUID, Tuple[int, int, int]]:
+    """user_id -> (current, longest, último día en ordinal o 0) de la tabla streaks"""
+    rows = db.query(Streak.user_id, Streak.current_streak, Streak.longest_streak, Streak.last_activity_date)
+    return {
+        user_id: (current, longest, last.toordinal() if last else 0)
+        for user_id, current, longest, last in rows
+    }
+
+def diff_rows(result: ReplayResult, stored: Dict[UUID, Tuple[int, int, int]]) -> Tuple[List[Dict], List[Dict]]:
+    """(filas a actualizar, filas a crear) para que streaks coincida con la repetición"""
+    updates, inserts = [], []
+    for i, user_id in enumerate(result.user_ids):
+        row = {
+            "user_id": user_id,
+            "current_streak": int(result.current_streak[i]),
+            "longest_streak": int(result.longest_streak[i]),
+            "last_activity_date": date.fromordinal(int(result.last_activity[i]))
+        }
+        old = stored.get(user_id)
+        if old is None:
+            inserts.append(row)
+        elif old != (row["current_streak"], row["longest_streak"], int(result.last_activity[i])):
+            updates.append(row)
+    return updates, inserts
+
+def write_streaks(db: Session, updates: List[Dict], inserts: List[Dict]):
+    """Escribe las filas corregidas en bloque (executemany). No hace commit"""
+    if updates:
+        db.bulk_update_mappings(Streak, updates)
+    if inserts:
+        db.bulk_insert_mappings(Streak, inserts)
@@ -3,12 +3,21 @@
 Streak Service - Feature 6, 8
 Lógica de rachas resiliente con Freeze (Vidas Extra)
 V1.5: Protector semanal gratuito (1 uso por semana)
+Rollover nocturno (scripts/rollover_streaks.py): al cerrar cada día aplica protectores
+y pérdidas a todos los usuarios con unos pocos UPDATE por conjuntos
+
+streak_replay.py reproduce estas mismas reglas sobre el historial de transacciones
+(reparación, auditoría y simulación de políticas): cualquier cambio aquí va también allí
 """
 
 from datetime import date, timedelta
 from typing import Dict, Optional
+from sqlalchemy import and_, case, or_, update
 from sqlalchemy.orm import Session
 from api.models import Streak, User
+from api.v1.services.activity_service import ActivityService, ACTIVE, FREEZE, gap_days
+from api.v1.services.leaderboard_service import LeaderboardService
+from api.tracing import traced
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,17 +28,20 @@ class StreakService:
     """
     
     @staticmethod
+    @traced("streak.get_or_create")
     def get_or_create_streak(db: Session, user_id) -> Streak:
-        """Obtiene o crea el streak del usuario"""
-        streak = db.query(Streak).filter(Streak.user_id == user_id).first()
+        """Obtiene o crea el streak del usuario (mapa de identidad: sin SELECT si ya está en la sesión)"""
+        streak = db.get(Streak, user_id)
         if not streak:
             streak = Streak(user_id=user_id, current_streak=0, longest_streak=0)
             db.add(streak)
             db.commit()
+            LeaderboardService.record_change(user_id, None, 0)
             db.refresh(streak)
         return streak
     
     @staticmethod
+    @traced("streak.update")
     def update_streak(db: Session, user_id, activity_date: date = None) -> Dict:
         """
         Feature 8: Actualiza la racha del usuario
@@ -39,10 +51,19 @@ class StreakService:
             activity_date = date.today()
         
         streak = StreakService.get_or_create_streak(db, user_id)
-        user = db.query(User).filter(User.id == user_id).first()
-        
+        previous = streak.current_streak
+        result = StreakService._apply_activity(db, streak, user_id, activity_date)
+        # Clasificación del worker: mueve al usuario de bucket sin recalcular
+        if result["current_streak"] != previous:
+            LeaderboardService.record_change(user_id, previous, result["current_streak"])
+        return result
+    
+    @staticmethod
+    def _apply_activity(db: Session, streak: Streak, user_id, activity_date: date) -> Dict:
+        """Reglas de la racha para un día con actividad (commit en cada rama que cambia algo)"""
         if not streak.last_activity_date:
             # Primera actividad - iniciar racha
+            ActivityService.mark(db, user_id, [activity_date], ACTIVE)
             streak.current_streak = 1
             streak.longest_streak = 1
             streak.last_activity_date = activity_date
@@ -62,6 +83,22 @@ class StreakService:
                 "current_streak": streak.current_streak,
                 "message": "Racha mantenida - ya activo hoy"
             }
+        
+        # Día nuevo al libro de actividad (se guarda con el commit de cada rama)
+        ActivityService.mark(db, user_id, [activity_date], ACTIVE)
+        
+        if streak.current_streak == 0:
+            # Racha ya rota (rollover nocturno o doble pérdida): empieza una nueva sin gastar protector
+            streak.current_streak = 1
+            streak.longest_streak = max(streak.longest_streak, 1)
+            streak.last_activity_date = activity_date
+            db.commit()
+            
+            return {
+                "streak_updated": True,
+                "current_streak": 1,
+                "message": "🔥 ¡Nueva racha iniciada!"
+            }
         elif days_since_last == 1:
             # Día consecutivo - incrementar racha
             new_streak = streak.current_streak + 1
@@ -79,9 +116,11 @@ class StreakService:
             }
         else:
             # Break en la racha - Feature 8: Verificar si tiene vidas
+            user = db.get(User, user_id)
             return StreakService._handle_streak_break(db, streak, user, activity_date, days_since_last)
     
     @staticmethod
+    @traced("streak.handle_break")
     def _handle_streak_break(db: Session, streak: Streak, user: User, activity_date: date, days_since_last: int) -> Dict:
         """
         Feature 8: Maneja la ruptura de racha con lógica de Freeze semanal
@@ -105,6 +144,7 @@ class StreakService:
             # Usar protector semanal
             user.last_weekly_freeze_date = activity_date
             user.weekly_freeze_count += 1
+            ActivityService.mark(db, user.id, gap_days(streak.last_activity_date, activity_date), FREEZE)
             streak.last_activity_date = activity_date
             db.commit()
             
@@ -117,8 +157,9 @@ class StreakService:
             }
         elif user.weekly_freeze_count >= 1:
             # Ya usó el protector esta semana, segunda pérdida = racha a cero
-            streak.current_streak = 0  # Reiniciar a cero (no a 1)
+            # longest_streak antes de reiniciar: conserva la racha que se acaba de perder
             streak.longest_streak = max(streak.longest_streak, streak.current_streak)
+            streak.current_streak = 0  # Reiniciar a cero (no a 1)
             streak.last_activity_date = activity_date
             # Resetear contador semanal para próxima semana
             user.weekly_freeze_count = 0
@@ -247,6 +288,7 @@ class StreakService:
         # Usar protector semanal
         user.last_weekly_freeze_date = current_date
         user.weekly_freeze_count = 1
+        user.data_version = (user.data_version or 0) + 1  # Invalida ETag de /racha
         db.commit()
         
         return {
@@ -255,4 +297,84 @@ class StreakService:
             "remaining_freezes": 1 - user.weekly_freeze_count,
             "message": f"Protector semanal usado. Ya no puedes usar otro hasta el próximo lunes."
         }
-
+    
+    @staticmethod
+    @traced("streak.rollover")
+    def rollover(db: Session, today: date = None) -> Dict:
+        """
+        Cierre del día anterior para todos los usuarios (por conjuntos, sin lógica por usuario)
+        - Quien tenía racha y no registró nada ayer: se gasta el protector de esa semana
+          (o cuenta el que usó a mano ayer) y ayer queda cubierto
+        - Sin protector, o con más de un día sin cubrir: racha a cero y contador semanal reiniciado
+        - Los días cubiertos quedan en el libro de actividad (freeze_days)
+        Idempotente: los usuarios ya procesados dejan de cumplir las condiciones. No hace commit
+        """
+        if today is None:
+            today = date.today()
+        missed = today - timedelta(days=1)
+        week_start = missed - timedelta(days=missed.weekday())
+        active = and_(Streak.user_id == User.id, Streak.current_streak > 0)
+        
+        # 1. Protector para el día sin actividad (o el usado a mano ese mismo día)
+        db.execute(
+            update(User)
+            .where(
+                active,
+                Streak.last_activity_date == missed - timedelta(days=1),
+                or_(
+                    User.last_weekly_freeze_date.is_(None),
+                    User.last_weekly_freeze_date < week_start,
+                    User.weekly_freeze_count == 0,
+                    User.last_weekly_freeze_date == missed
+                )
+            )
+            .values(
+                last_weekly_freeze_date=missed,
+                weekly_freeze_count=case((User.last_weekly_freeze_date == missed, User.weekly_freeze_count), else_=1),
+                data_version=User.data_version + 1
+            )
+            .execution_options(synchronize_session=False)
+        )
+        covered = [
+            user_id for (user_id,) in db.query(Streak.user_id)
+            .join(User, Streak.user_id == User.id)
+            .filter(
+                Streak.current_streak > 0,
+                Streak.last_activity_date == missed - timedelta(days=1),
+                User.last_weekly_freeze_date == missed
+            )
+        ]
+        ActivityService.mark_many(db, covered, missed, FREEZE)
+        frozen = db.execute(
+            update(Streak)
+            .where(
+                active,
+                Streak.last_activity_date == missed - timedelta(days=1),
+                User.last_weekly_freeze_date == missed
+            )
+            .values(last_activity_date=missed)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        
+        # 2. Rachas perdidas: lo que siga sin cubrir ayer
+        db.execute(
+            update(User)
+            .where(active, Streak.last_activity_date < missed)
+            .values(weekly_freeze_count=0, last_weekly_freeze_date=None, data_version=User.data_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        lost = db.execute(
+            update(Streak)
+            .where(Streak.current_streak > 0, Streak.last_activity_date < missed)
+            .values(
+                longest_streak=case(
+                    (Streak.current_streak > Streak.longest_streak, Streak.current_streak),
+                    else_=Streak.longest_streak
+                ),
+                current_streak=0
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        
+        logger.info(f"🌙 Rollover {missed}: {frozen} rachas protegidas, {lost} perdidas")
+        return {"day": missed, "frozen": frozen, "lost": lost}
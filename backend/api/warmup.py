@@ -0,0 +1,109 @@
+# api/warmup.py
+"""
+Warm-up al arrancar el worker
+Abre conexiones y precalienta cachés en paralelo con un presupuesto de tiempo,
+para que el primer /api/v1/gasto no pague el arranque en frío
+"""
+
+import asyncio
+import time
+import logging
+from typing import Awaitable, Dict
+
+from api.config import WARMUP_TIMEOUT_SECONDS, WARMUP_DB_CONNECTIONS
+from api.database import SessionLocal, warm_up_pool
+from api.v1.services.aury_service import warm_up_deepseek, parse_raw_text
+from api.v1.services.auth_service import AuthService
+from api.v1.services.idempotency_service import IdempotencyService
+from api.v1.services.category_classifier import get_classifier
+
+logger = logging.getLogger(__name__)
+
+# Estado de readiness del worker (se expone en /ready)
+WARMUP_STATE: Dict = {
+    "ready": False,
+    "duration_ms": None,
+    "steps": {}
+}
+
+def is_ready() -> bool:
+    """True cuando el warm-up ha terminado (con o sin errores)"""
+    return WARMUP_STATE["ready"]
+
+def mark_ready():
+    """Marca el worker como listo sin ejecutar warm-up (WARMUP_ENABLED=false)"""
+    WARMUP_STATE["ready"] = True
+
+def _prime_caches() -> bool:
+    """Ejecuta una vez los caminos calientes del parser para cargar sus estructuras"""
+    parse_raw_text("Pizza 15 euros")
+    parse_raw_text("Salario 1200€")
+    return True
+
+def _load_category_model() -> bool:
+    """Carga el clasificador de categorías (False si no hay modelo configurado)"""
+    return get_classifier() is not None
+
+def _purge_idempotency_keys() -> int:
+    """Borra las Idempotency-Key caducadas"""
+    db = SessionLocal()
+    try:
+        return IdempotencyService.purge_expired(db)
+    finally:
+        db.close()
+
+def _build_steps() -> Dict[str, Awaitable]:
+    """Pasos del warm-up: nombre -> awaitable (se ejecutan en paralelo)"""
+    return {
+        "db_pool": asyncio.to_thread(warm_up_pool, WARMUP_DB_CONNECTIONS),
+        "deepseek": warm_up_deepseek(),
+        "google_certs": asyncio.to_thread(AuthService.prefetch_google_certs),
+        "caches": asyncio.to_thread(_prime_caches),
+        "category_model": asyncio.to_thread(_load_category_model),
+        "idempotency_purge": asyncio.to_thread(_purge_idempotency_keys),
+    }
+
+async def _run_step(name: str, awaitable: Awaitable):
+    """Ejecuta un paso y registra resultado y duración"""
+    start = time.perf_counter()
+    try:
+        result = await awaitable
+        WARMUP_STATE["steps"][name] = {
+            "ok": True,
+            "result": result,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1)
+        }
+    except Exception as e:
+        WARMUP_STATE["steps"][name] = {
+            "ok": False,
+            "error": str(e),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1)
+        }
+        logger.warning(f"⚠️ Warm-up '{name}' falló: {e}")
+
+async def run_warmup(timeout: float = WARMUP_TIMEOUT_SECONDS):
+    """
+    Ejecuta todos los pasos en paralelo con un presupuesto total de `timeout` segundos
+    Los pasos que no terminan a tiempo se cancelan y se marcan como timeout
+    """
+    start = time.perf_counter()
+    steps = _build_steps()
+    tasks = {
+        name: asyncio.create_task(_run_step(name, awaitable))
+        for name, awaitable in steps.items()
+    }
+
+    _, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+    for name, task in tasks.items():
+        if task in pending:
+            task.cancel()
+            WARMUP_STATE["steps"][name] = {"ok": False, "error": "timeout", "duration_ms": timeout * 1000}
+
+    WARMUP_STATE["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    WARMUP_STATE["ready"] = True
+
+    failed = [name for name, step in WARMUP_STATE["steps"].items() if not step["ok"]]
+    if failed:
+        logger.warning(f"⚠️ Warm-up terminado en {WARMUP_STATE['duration_ms']} ms con fallos: {', '.join(failed)}")
+    else:
+        logger.info(f"🔥 Warm-up completado en {WARMUP_STATE['duration_ms']} ms")
@@ -0,0 +1,3 @@
+"""
+Microbenchmarks de la capa de servicios (pytest-benchmark)
+"""
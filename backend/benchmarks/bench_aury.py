@@ -0,0 +1,65 @@
+# benchmarks/bench_aury.py
+"""
+Microbenchmarks de aury_service: parser (con confianza), clasificador local de
+categorías, respuestas locales y construcción de prompts
+Cada ronda procesa el corpus completo (1000 textos)
+"""
+
+import random
+
+import pytest
+
+from api.config import PARSE_CONFIDENCE_THRESHOLD
+from api.v1.services.category_classifier import CategoryClassifier, NUMPY_AVAILABLE
+from api.v1.services.aury_service import (
+    parse_raw_text, parse_raw_text_with_confidence, generate_aury_response, _build_prompt_by_tone
+)
+
+def bench_parse_raw_text(benchmark, expense_texts):
+    def run():
+        for text in expense_texts:
+            parse_raw_text(text)
+    benchmark(run)
+
+def bench_parse_raw_text_with_confidence(benchmark, expense_texts):
+    def run():
+        return [parse_raw_text_with_confidence(text)[1] for text in expense_texts]
+    confidences = benchmark(run)
+    # Fracción del corpus que escalaría a DeepSeek (nivel 2)
+    escalated = sum(1 for c in confidences if c < PARSE_CONFIDENCE_THRESHOLD)
+    benchmark.extra_info["escalation_rate"] = round(escalated / len(confidences), 3)
+
+def bench_generate_aury_response(benchmark, expense_texts):
+    parsed = [parse_raw_text(text) for text in expense_texts]
+    random.seed(0)
+
+    def run():
+        for text, data in zip(expense_texts, parsed):
+            generate_aury_response(text, data['category'], data['amount'])
+    benchmark(run)
+
+@pytest.mark.parametrize("tone", ["sarcastic", "subtle", "analytical"])
+def bench_build_prompt_by_tone(benchmark, expense_texts, tone):
+    parsed = [parse_raw_text(text) for text in expense_texts]
+
+    def run():
+        for i, data in enumerate(parsed):
+            _build_prompt_by_tone(tone, str(data['amount']), data['category'], i % 60, "Viaje a Japón")
+    benchmark(run)
+
+@pytest.fixture(scope="module")
+def category_model(expense_texts):
+    """Modelo entrenado con las etiquetas del matcher de palabras clave sobre el corpus"""
+    if not NUMPY_AVAILABLE:
+        pytest.skip("numpy no instalado")
+    labels = [parse_raw_text(text)['category'] for text in expense_texts]
+    return CategoryClassifier.train(expense_texts, labels, epochs=3)
+
+def bench_category_classifier_predict(benchmark, expense_texts, category_model):
+    def run():
+        for text in expense_texts:
+            category_model.predict(text)
+    benchmark(run)
+
+def bench_category_classifier_predict_batch(benchmark, expense_texts, category_model):
+    benchmark(category_model.predict_batch, expense_texts)
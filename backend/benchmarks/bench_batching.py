@@ -0,0 +1,70 @@
+# benchmarks/bench_batching.py
+"""
+Micro-batching de Aury (AuryBatcher) frente a una llamada a DeepSeek por gasto
+Cada ronda lanza una ráfaga de gastos concurrentes contra un DeepSeek simulado
+(httpx.MockTransport con latencia fija + coste por comentario)
+extra_info: llamadas salientes por gasto y latencia media por gasto
+"""
+
+import json
+import time
+import asyncio
+
+import httpx
+import pytest
+
+from api import rate_limit
+from api.v1.services import aury_service
+from api.v1.services.aury_service import AuryBatcher, generate_aury_with_deepseek, set_aury_batcher
+
+BURST = 32
+BASE_LATENCY_S = 0.2
+PER_ITEM_LATENCY_S = 0.01
+
+def _mock_deepseek(calls: list) -> httpx.AsyncClient:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        batched = (body.get("response_format") or {}).get("type") == "json_object"
+        items = body["messages"][-1]["content"].count("\n[") + 1 if batched else 1
+        calls.append(items)
+        await asyncio.sleep(BASE_LATENCY_S + PER_ITEM_LATENCY_S * items)
+        if batched:
+            content = json.dumps({"comentarios": [f"Comentario {i}" for i in range(items)]})
+        else:
+            content = "Comentario"
+        return httpx.Response(200, json={
+            "choices": [{"message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 300 * items, "completion_tokens": 20 * items}
+        })
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+@pytest.fixture
+def mock_deepseek(monkeypatch):
+    calls = []
+    monkeypatch.setattr(aury_service, "DEEPSEEK_API_KEY", "bench")
+    monkeypatch.setattr(aury_service, "_deepseek_client", _mock_deepseek(calls))
+    # Sin límites: se mide el agrupamiento, no el token bucket
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", False)
+    yield calls
+    set_aury_batcher(None)
+
+@pytest.mark.parametrize("mode", ["per_call", "batch_8", "batch_32"])
+def bench_aury_burst(benchmark, mock_deepseek, mode):
+    if mode != "per_call":
+        set_aury_batcher(AuryBatcher(window_ms=50, max_size=int(mode.split("_")[1])))
+    latencies = []
+
+    async def one(i: int):
+        start = time.perf_counter()
+        await generate_aury_with_deepseek(
+            "cafe 3", {"amount": 3.0 + i, "category": "☕ Café"}, i % 10, "Viaje a Japón"
+        )
+        latencies.append(time.perf_counter() - start)
+
+    async def burst():
+        await asyncio.gather(*(one(i) for i in range(BURST)))
+
+    benchmark.pedantic(lambda: asyncio.run(burst()), rounds=5, iterations=1)
+    rounds = len(latencies) // BURST
+    benchmark.extra_info["outbound_calls_per_expense"] = round(len(mock_deepseek) / (rounds * BURST), 3)
+    benchmark.extra_info["mean_latency_ms"] = round(1000 * sum(latencies) / len(latencies), 1)
@@ -0,0 +1,30 @@
+# benchmarks/bench_schemas.py
+"""
+Microbenchmarks de construcción y serialización Pydantic del feed (GET /gastos/recent)
+"""
+
+from api.schemas import GastoFeedItem, GastoFeedResponse
+
+def _build_feed(rows):
+    gastos = [
+        GastoFeedItem(
+            id=t.id,
+            amount=float(t.amount) if t.amount else None,
+            category=t.category,
+            raw_text=t.raw_text,
+            aury_response=t.aury_response,
+            created_at=t.created_at
+        )
+        for t in rows
+    ]
+    return GastoFeedResponse(gastos=gastos, total=len(gastos))
+
+def bench_feed_build(benchmark, feed_rows):
+    benchmark(_build_feed, feed_rows)
+
+def bench_feed_serialize_json(benchmark, feed_rows):
+    feed = _build_feed(feed_rows)
+    benchmark(feed.model_dump_json)
+
+def bench_feed_build_and_serialize(benchmark, feed_rows):
+    benchmark(lambda: _build_feed(feed_rows).model_dump_json())
@@ -0,0 +1,70 @@
+# benchmarks/bench_serialization.py
+"""
+Antes/después del camino rápido del feed (FAST_JSON_ENABLED)
+- default: GastoFeedItem -> GastoFeedResponse -> re-validación response_model -> jsonable_encoder -> json
+- fast: dicts -> orjson (sin Pydantic)
+Tamaño del payload (sin comprimir, gzip, brotli) en extra_info
+"""
+
+import gzip
+import json
+
+import pytest
+
+from fastapi.encoders import jsonable_encoder
+
+from api.responses import dumps, BROTLI_AVAILABLE
+from api.schemas import GastoFeedItem, GastoFeedResponse
+
+def _default_path(rows) -> bytes:
+    gastos = [
+        GastoFeedItem(
+            id=t.id,
+            amount=float(t.amount) if t.amount else None,
+            category=t.category,
+            raw_text=t.raw_text,
+            aury_response=t.aury_response,
+            created_at=t.created_at
+        )
+        for t in rows
+    ]
+    response = GastoFeedResponse(gastos=gastos, total=len(gastos))
+    # FastAPI vuelve a validar contra response_model antes de serializar
+    validated = GastoFeedResponse.model_validate(response.model_dump())
+    return json.dumps(
+        jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+def _fast_path(rows) -> bytes:
+    items = [
+        {
+            "id": t.id,
+            "amount": float(t.amount) if t.amount else None,
+            "category": t.category,
+            "raw_text": t.raw_text,
+            "aury_response": t.aury_response,
+            "created_at": t.created_at
+        }
+        for t in rows
+    ]
+    return dumps({"gastos": items, "total": len(items)})
+
+@pytest.mark.parametrize("path", ["default", "fast"])
+def bench_feed_response(benchmark, feed_rows, path):
+    render = _default_path if path == "default" else _fast_path
+    body = benchmark(render, feed_rows)
+    benchmark.extra_info["bytes"] = len(body)
+    benchmark.extra_info["gzip_bytes"] = len(gzip.compress(body, compresslevel=6))
+
+def bench_compress_gzip(benchmark, feed_rows):
+    body = _fast_path(feed_rows)
+    compressed = benchmark(gzip.compress, body, 6)
+    benchmark.extra_info["ratio"] = round(len(compressed) / len(body), 3)
+
+@pytest.mark.skipif(not BROTLI_AVAILABLE, reason="brotli no instalado")
+def bench_compress_brotli(benchmark, feed_rows):
+    import brotli
+
+    body = _fast_path(feed_rows)
+    compressed = benchmark(brotli.compress, body, quality=4)
+    benchmark.extra_info["ratio"] = round(len(compressed) / len(body), 3)
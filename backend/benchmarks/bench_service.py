@@ -0,0 +1,67 @@
+# benchmarks/bench_service.py
+"""
+Benchmarks a nivel de servicio: los handlers reales contra una base de datos
+(SQLite en memoria siempre; PostgreSQL desechable si está disponible)
+"""
+
+import asyncio
+import itertools
+import uuid
+
+import pytest
+from starlette.background import BackgroundTasks
+from starlette.requests import Request
+from starlette.responses import Response
+
+from api.models import User
+from api.schemas import GastoCreateRequest
+from api.v1.endpoints import crear_gasto, get_recent_gastos, get_racha
+
+# Petición mínima para los handlers que leen cabeceras (Accept-Encoding, If-None-Match)
+BENCH_REQUEST = Request({"type": "http", "headers": [(b"accept-encoding", b"gzip, br")]})
+
+@pytest.fixture(scope="module")
+def bench_user(session_factory):
+    db = session_factory()
+    google_id = f"bench-{uuid.uuid4().hex[:12]}"
+    db.add(User(google_id=google_id, email=f"{google_id}@bench.local"))
+    db.commit()
+    db.close()
+    return google_id
+
+def bench_crear_gasto(benchmark, session_factory, bench_user, expense_texts):
+    loop = asyncio.new_event_loop()
+    texts = itertools.cycle(expense_texts)
+
+    def run():
+        db = session_factory()
+        try:
+            request = GastoCreateRequest(raw_text=next(texts), google_id=bench_user)
+            loop.run_until_complete(crear_gasto(
+                request, http_response=Response(), background_tasks=BackgroundTasks(), db=db, idempotency_key=None
+            ))
+        finally:
+            db.close()
+
+    benchmark(run)
+    loop.close()
+
+def bench_get_recent_gastos(benchmark, session_factory, bench_user):
+    def run():
+        db = session_factory()
+        try:
+            get_recent_gastos(http_request=BENCH_REQUEST, http_response=Response(), google_id=bench_user, limit=20, db=db)
+        finally:
+            db.close()
+
+    benchmark(run)
+
+def bench_get_racha(benchmark, session_factory, bench_user):
+    def run():
+        db = session_factory()
+        try:
+            get_racha(http_request=BENCH_REQUEST, http_response=Response(), google_id=bench_user, db=db)
+        finally:
+            db.close()
+
+    benchmark(run)
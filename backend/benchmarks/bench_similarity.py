@@ -0,0 +1,80 @@
+# benchmarks/bench_similarity.py
+"""
+Gastos parecidos (similarity_service.ExpenseIndex) según el tamaño del historial
+- build: carga en frío del índice de un usuario (lo que paga el primer gasto tras el TTL)
+- search: búsqueda en caliente de un gasto nuevo (cada POST /gasto)
+- analytical_comment: comentario del tono analítico generado en local con ese historial
+- goal_amount: importe del objetivo (los casos esperados están en tests/test_analytical.py)
+extra_info: milisegundos por búsqueda frente a SIMILAR_BUDGET_MS
+"""
+
+import random
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from api.config import SIMILAR_BUDGET_MS
+from api.v1.services.aury_service import parse_raw_text
+from api.v1.services.similarity_service import ExpenseIndex
+from api.v1.services.analytical_service import generate_analytical_comment, _goal_amount
+from benchmarks.corpus import SEED, generate_expense_texts
+
+HISTORY_SIZES = [100, 1000, 5000]
+
+def _history(n: int):
+    rng = random.Random(SEED)
+    today = date.today()
+    rows = []
+    for text in generate_expense_texts(n, seed=SEED + n):
+        parsed = parse_raw_text(text)
+        day = today - timedelta(days=rng.randint(0, 90))
+        rows.append((text, parsed['amount'] or 1.0, parsed['category'], day))
+    rows.sort(key=lambda r: r[3])
+    return rows
+
+@pytest.mark.parametrize("size", HISTORY_SIZES)
+def bench_similar_index_build(benchmark, size):
+    rows = _history(size)
+    benchmark(ExpenseIndex.build, rows)
+
+@pytest.mark.parametrize("size", HISTORY_SIZES)
+def bench_similar_search(benchmark, expense_texts, size):
+    index = ExpenseIndex.build(_history(size))
+    queries = [(text, parse_raw_text(text)['category']) for text in expense_texts[:100]]
+    today = date.today()
+
+    def run():
+        for text, category in queries:
+            index.search(text, category, today)
+    benchmark(run)
+    start = time.perf_counter()
+    run()
+    per_search_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    benchmark.extra_info["ms_per_search"] = round(per_search_ms, 4)
+    benchmark.extra_info["budget_ms"] = SIMILAR_BUDGET_MS
+
+@pytest.mark.parametrize("size", HISTORY_SIZES)
+def bench_analytical_comment(benchmark, expense_texts, size):
+    """Tono analítico en local: cifras del historial + plantillas (sustituye a una llamada a DeepSeek)"""
+    index = ExpenseIndex.build(_history(size))
+    expenses = [(text, parse_raw_text(text)) for text in expense_texts[:100]]
+
+    def run():
+        for i, (text, parsed) in enumerate(expenses):
+            generate_analytical_comment(index, text, parsed, i % 30, "Viaje a Japón 2000€")
+    benchmark(run)
+
+# Con y sin importe (los números sin € ni k no cuentan)
+GOALS = [
+    "Viaje a Japón 2000€",
+    "Viaje a Japón en 2027",
+    "Comprar 2 bicis",
+    "Ahorrar 1.500,50 euros",
+    "Entrada del piso: €12.000",
+    "Colchón de 2,5k",
+    "Ahorrar 1.500",
+]
+
+def bench_goal_amount(benchmark):
+    benchmark(lambda: [_goal_amount(goal) for goal in GOALS])
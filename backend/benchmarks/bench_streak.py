@@ -0,0 +1,49 @@
+# benchmarks/bench_streak.py
+"""
+Microbenchmarks de la lógica pura de StreakService (sin base de datos)
+y de la repetición de rachas de toda la base de usuarios (streak_replay;
+la equivalencia con replay_user se comprueba en tests/test_streak_replay.py)
+"""
+
+import pytest
+
+from api.v1.services.category_classifier import NUMPY_AVAILABLE
+from api.v1.services.streak_service import StreakService
+from api.v1.services.streak_replay import ReplayPolicy, replay, replay_user
+from benchmarks.corpus import generate_activity
+
+def bench_can_use_weekly_freeze(benchmark, freeze_cases):
+    def run():
+        for user, current_date in freeze_cases:
+            StreakService._can_use_weekly_freeze(user, current_date)
+    benchmark(run)
+
+def bench_get_week_number(benchmark, freeze_cases):
+    dates = [current_date for _, current_date in freeze_cases]
+
+    def run():
+        for d in dates:
+            StreakService._get_week_number(d)
+    benchmark(run)
+
+@pytest.fixture(scope="module")
+def activity():
+    return generate_activity(10000)
+
+@pytest.mark.skipif(not NUMPY_AVAILABLE, reason="numpy no instalado")
+@pytest.mark.parametrize("freezes_per_week", [1, 2])
+def bench_streak_replay(benchmark, activity, freezes_per_week):
+    import numpy as np
+    user_ids, days, offsets = activity
+    days, offsets = np.asarray(days), np.asarray(offsets)
+    policy = ReplayPolicy(freezes_per_week=freezes_per_week)
+    benchmark(replay, user_ids, days, offsets, policy)
+    benchmark.extra_info["users"] = len(user_ids)
+    benchmark.extra_info["active_days"] = len(days)
+
+def bench_streak_replay_python(benchmark, activity):
+    user_ids, days, offsets = activity
+
+    def run():
+        return [replay_user(days[offsets[i]:offsets[i + 1]]) for i in range(len(user_ids))]
+    benchmark.pedantic(run, rounds=3, iterations=1)
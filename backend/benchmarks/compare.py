@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Compara un resultado de pytest-benchmark (--benchmark-json) con el baseline
+Marca como regresión todo benchmark cuya mediana empeore más del umbral
+
+Uso:
+    python -m pytest -c benchmarks/pytest.ini benchmarks --benchmark-json=bench_output.json
+    python benchmarks/compare.py benchmarks/baseline.json bench_output.json --threshold 0.20
+
+    # Aceptar el resultado actual como nuevo baseline (sin las muestras crudas)
+    python benchmarks/compare.py benchmarks/baseline.json bench_output.json --update-baseline
+"""
+
+import sys
+import json
+import argparse
+from typing import Dict
+
+def load_medians(path: str) -> Dict[str, float]:
+    """nombre completo del benchmark -> mediana en segundos"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {b["fullname"]: b["stats"]["median"] for b in data["benchmarks"]}
+
+def write_compact_baseline(source: str, destination: str):
+    """Guarda el resultado sin las muestras crudas (stats.data) para versionarlo"""
+    with open(source, encoding="utf-8") as f:
+        data = json.load(f)
+    for bench in data["benchmarks"]:
+        bench["stats"].pop("data", None)
+    with open(destination, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Detecta regresiones respecto al baseline de benchmarks")
+    parser.add_argument("baseline", help="JSON de pytest-benchmark usado como referencia")
+    parser.add_argument("current", help="JSON de pytest-benchmark de la ejecución actual")
+    parser.add_argument("--threshold", type=float, default=0.20, help="Empeoramiento tolerado (0.20 = 20%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Sobrescribir el baseline con el resultado actual")
+    args = parser.parse_args()
+
+    if args.update_baseline:
+        write_compact_baseline(args.current, args.baseline)
+        print(f"💾 Baseline actualizado: {args.baseline}")
+        return 0
+
+    baseline = load_medians(args.baseline)
+    current = load_medians(args.current)
+
+    regressions = 0
+    print(f"{'benchmark':<60} {'base µs':>10} {'actual µs':>10} {'cambio':>8}")
+    print("-" * 92)
+    for name in sorted(current):
+        if name not in baseline:
+            print(f"{name:<60} {'-':>10} {current[name] * 1e6:>10.1f} {'nuevo':>8}")
+            continue
+        change = current[name] / baseline[name] - 1
+        flag = ""
+        if change > args.threshold:
+            regressions += 1
+            flag = "  ❌"
+        print(f"{name:<60} {baseline[name] * 1e6:>10.1f} {current[name] * 1e6:>10.1f} {change:>+7.1%}{flag}")
+
+    if regressions:
+        print(f"\n❌ {regressions} regresión(es) por encima del {args.threshold:.0%}")
+        return 1
+    print(f"\n✅ Sin regresiones por encima del {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+# benchmarks/conftest.py
+"""
+Fixtures compartidas de los microbenchmarks
+- Corpus deterministas para la lógica pura
+- Sesiones de base de datos: SQLite en memoria (rápido) o PostgreSQL desechable (realista)
+"""
+
+import os
+import sys
+import shutil
+import socket
+import logging
+import tempfile
+import subprocess
+
+import pytest
+
+# Agregar el directorio backend al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# La app entera corre sobre SQLite en memoria salvo que se indique otro perfil
+os.environ.setdefault("DATABASE_PROFILE", "memory")
+
+from benchmarks.corpus import generate_expense_texts, generate_feed_rows, generate_freeze_cases
+
+@pytest.fixture(scope="session")
+def expense_texts():
+    return generate_expense_texts(1000)
+
+@pytest.fixture(scope="session")
+def feed_rows():
+    return generate_feed_rows(20)
+
+@pytest.fixture(scope="session")
+def freeze_cases():
+    return generate_freeze_cases(1000)
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture(scope="session")
+def postgres_url():
+    """
+    PostgreSQL desechable para benchmarks realistas
+    Usa BENCH_POSTGRES_URL si está definida; si no, levanta un cluster temporal
+    con initdb/pg_ctl (fsync desactivado). Se omite si no hay binarios de PostgreSQL.
+    """
+    if os.getenv("BENCH_POSTGRES_URL"):
+        yield os.environ["BENCH_POSTGRES_URL"]
+        return
+
+    initdb, pg_ctl = shutil.which("initdb"), shutil.which("pg_ctl")
+    if not (initdb and pg_ctl):
+        pytest.skip("PostgreSQL no disponible (initdb/pg_ctl no están en el PATH)")
+
+    tmp_dir = tempfile.mkdtemp(prefix="ahorify_pg_")
+    data_dir = os.path.join(tmp_dir, "data")
+    port = _free_port()
+    subprocess.run(
+        [initdb, "-D", data_dir, "-U", "bench", "--auth=trust", "-E", "UTF8"],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    subprocess.run(
+        [
+            pg_ctl, "-D", data_dir, "-l", os.path.join(tmp_dir, "postgres.log"), "-w",
+            "-o", f"-p {port} -k {tmp_dir} -c listen_addresses=127.0.0.1 -c fsync=off -c synchronous_commit=off",
+            "start"
+        ],
+        check=True, stdout=subprocess.DEVNULL
+    )
+    try:
+        yield f"postgresql://bench@127.0.0.1:{port}/postgres"
+    finally:
+        subprocess.run([pg_ctl, "-D", data_dir, "-m", "immediate", "stop"], stdout=subprocess.DEVNULL)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+@pytest.fixture(scope="session", params=["memory", "postgres"])
+def session_factory(request):
+    """sessionmaker con el esquema creado, sobre SQLite en memoria o PostgreSQL desechable"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from api.database import Base, SessionLocal, engine
+    import api.models  # noqa: F401 - registra los modelos en Base
+
+    # Los avisos por petición (p.ej. DeepSeek sin configurar) distorsionan los tiempos
+    logging.getLogger("api").setLevel(logging.ERROR)
+
+    if request.param == "memory":
+        Base.metadata.create_all(bind=engine)
+        yield SessionLocal
+        return
+
+    pg_engine = create_engine(request.getfixturevalue("postgres_url"))
+    Base.metadata.create_all(bind=pg_engine)
+    try:
+        yield sessionmaker(autocommit=False, autoflush=False, bind=pg_engine)
+    finally:
+        Base.metadata.drop_all(bind=pg_engine)
+        pg_engine.dispose()
@@ -0,0 +1,101 @@
+# benchmarks/corpus.py
+"""
+Corpus sintéticos y deterministas para los microbenchmarks
+Misma semilla = mismos datos en cada ejecución (tiempos comparables entre runs)
+"""
+
+import random
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import List, Tuple
+
+SEED = 1505
+
+# Conceptos con palabra clave de categoría (camino feliz del parser)
+KEYWORD_CONCEPTS = [
+    "pizza", "cena con amigos", "hamburguesa", "desayuno", "taxi", "uber", "gasolina",
+    "parking", "netflix", "spotify", "cine", "alquiler", "luz", "internet", "ropa",
+    "zapatos", "farmacia", "medico", "curso", "libro", "vuelo", "hotel", "regalo",
+    "movil", "reparacion", "ahorro"
+]
+# Conceptos sin palabra clave (acaban en '❓ Otros')
+UNKNOWN_CONCEPTS = ["mercadona", "bizum ana", "compra", "amazon", "primark", "lidl", "varios", "ikea"]
+INCOME_CONCEPTS = ["salario", "ingreso freelance", "pago recibido cliente", "dinero entrante"]
+CURRENCY_FORMATS = ["{a}", "{a} euros", "{a}€", "{a} eur", "€{a}", "{a} euro", "{a} pesos", "${a}"]
+
+AURY_SAMPLES = [
+    "Parece que tu relación con la comida es más seria que con tus ahorros...",
+    "El transporte público existe, sabes... pero bueno, la comodidad tiene precio.",
+    "Registrado. El coste de oportunidad también, aunque no lo veas.",
+    None
+]
+
+def _amount(rng: random.Random) -> str:
+    value = round(rng.lognormvariate(2.7, 0.9), rng.choice([0, 2]))
+    return f"{value:g}".replace(".", rng.choice([".", ","]))
+
+def generate_expense_texts(n: int, seed: int = SEED) -> List[str]:
+    """Textos libres del Smart Input: 70% con keyword, 15% sin keyword, 15% ingresos"""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n):
+        roll = rng.random()
+        if roll < 0.70:
+            concept = rng.choice(KEYWORD_CONCEPTS)
+        elif roll < 0.85:
+            concept = rng.choice(UNKNOWN_CONCEPTS)
+        else:
+            concept = rng.choice(INCOME_CONCEPTS)
+        amount = rng.choice(CURRENCY_FORMATS).format(a=_amount(rng))
+        text = f"{concept} {amount}" if rng.random() < 0.8 else f"{amount} {concept}"
+        texts.append(text.capitalize() if rng.random() < 0.5 else text)
+    return texts
+
+def generate_feed_rows(n: int, seed: int = SEED) -> List[SimpleNamespace]:
+    """Filas con la forma de Transaction para construir GastoFeedResponse"""
+    rng = random.Random(seed)
+    texts = generate_expense_texts(n, seed)
+    now = datetime(2025, 6, 1, 20, 0, 0)
+    return [
+        SimpleNamespace(
+            id=uuid.UUID(int=rng.getrandbits(128)),
+            amount=Decimal(f"{rng.uniform(1, 150):.2f}"),
+            category=rng.choice(["🍔 Comida", "🚗 Transporte", "🎮 Ocio", "❓ Otros"]),
+            raw_text=text,
+            aury_response=rng.choice(AURY_SAMPLES),
+            created_at=now - timedelta(hours=i * 7)
+        )
+        for i, text in enumerate(texts)
+    ]
+
+def generate_freeze_cases(n: int, seed: int = SEED) -> List[Tuple[SimpleNamespace, date]]:
+    """(usuario, fecha) con estados variados del protector semanal"""
+    rng = random.Random(seed)
+    base = date(2025, 1, 1)
+    cases = []
+    for _ in range(n):
+        current = base + timedelta(days=rng.randint(0, 730))
+        if rng.random() < 0.3:
+            user = SimpleNamespace(last_weekly_freeze_date=None, weekly_freeze_count=0)
+        else:
+            last = current - timedelta(days=rng.randint(0, 20))
+            user = SimpleNamespace(last_weekly_freeze_date=last, weekly_freeze_count=rng.choice([0, 1]))
+        cases.append((user, current))
+    return cases
+
+def generate_activity(n_users: int, seed: int = SEED):
+    """(user_ids, days, offsets) para streak_replay: días activos con huecos de 1 a 9 días"""
+    rng = random.Random(seed)
+    base = date(2025, 1, 1).toordinal()
+    user_ids, days, offsets = [], [], []
+    for _ in range(n_users):
+        user_ids.append(uuid.UUID(int=rng.getrandbits(128)))
+        offsets.append(len(days))
+        day = base + rng.randint(0, 60)
+        for _ in range(rng.randint(1, 300)):
+            days.append(day)
+            day += rng.choice([1, 1, 1, 1, 2, 3, 5, 9])
+    offsets.append(len(days))
+    return user_ids, days, offsets
@@ -0,0 +1,29 @@
+# gunicorn.conf.py
+"""
+Configuración de gunicorn para producción
+Prepara el directorio multiproceso de Prometheus para que /metrics
+agregue las métricas de los 4 workers
+"""
+
+import os
+import shutil
+import tempfile
+
+# Debe definirse antes de que los workers importen prometheus_client
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    os.path.join(tempfile.gettempdir(), "ahorify_prometheus")
+)
+
+def on_starting(server):
+    """Limpia métricas de ejecuciones anteriores al arrancar el master"""
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+def child_exit(server, worker):
+    """Descarta los gauges 'live' de un worker que termina"""
+    try:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+    except ImportError:
+        pass
@@ -0,0 +1,4 @@
+"""
+Load testing de Ahorify API
+Stubs locales (DeepSeek, OneSignal, Google) + perfiles de carga + comparación con baseline
+"""
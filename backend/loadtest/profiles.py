@@ -0,0 +1,102 @@
+# loadtest/profiles.py
+"""
+Perfiles de carga
+Cada perfil es una mezcla ponderada de acciones que imitan a la PWA:
+alta de usuarios, registro de gastos, polling del dashboard y el cron de recordatorios
+"""
+
+import random
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from loadtest.report import Recorder
+
+API = "/api/v1"
+
+# Textos realistas para el Smart Input (comercio/concepto + importe + moneda opcional)
+EXPENSE_CONCEPTS = [
+    "Pizza", "Cena con amigos", "Mercadona", "Uber", "Taxi aeropuerto", "Gasolina",
+    "Netflix", "Spotify", "Cine", "Farmacia", "Zara ropa", "Libro", "Curso online",
+    "Vuelo Madrid", "Hotel", "Regalo cumpleaños", "Alquiler", "Luz", "Internet",
+    "Café", "Parking", "Metro", "Salario", "Videojuegos", "Hamburguesa"
+]
+CURRENCY_SUFFIXES = ["", " euros", "€", " eur", " €"]
+
+def random_expense_text(rng: random.Random = random) -> str:
+    """Texto libre tipo 'Mercadona 32.50€'"""
+    amount = round(rng.lognormvariate(2.7, 0.9), rng.choice([0, 2]))
+    amount_str = f"{amount:g}".replace(".", rng.choice([".", ","]))
+    return f"{rng.choice(EXPENSE_CONCEPTS)} {amount_str}{rng.choice(CURRENCY_SUFFIXES)}"
+
+class LoadContext:
+    """Estado compartido por los workers de carga"""
+
+    def __init__(self, client: httpx.AsyncClient, stub_url: str, recorder: Recorder):
+        self.client = client
+        self.stub_url = stub_url.rstrip("/")
+        self.recorder = recorder
+        self.google_ids: List[str] = []
+
+    async def timed(self, endpoint: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        """Ejecuta una petición y registra latencia/estado bajo `endpoint`"""
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.record(endpoint, time.perf_counter() - start, status=None, error=type(e).__name__)
+            return None
+        self.recorder.record(endpoint, time.perf_counter() - start, status=response.status_code)
+        return response
+
+    def random_user(self) -> str:
+        return random.choice(self.google_ids)
+
+async def signup(ctx: LoadContext):
+    """Alta de usuario: token firmado por el stub de Google -> POST /auth/google"""
+    sub = f"loadtest-{uuid.uuid4().hex[:16]}"
+    token_response = await ctx.client.post(
+        f"{ctx.stub_url}/google/token",
+        json={"sub": sub, "email": f"{sub}@loadtest.local"}
+    )
+    token = token_response.json()["token"]
+    response = await ctx.timed("POST /auth/google", "POST", f"{API}/auth/google", json={"token": token})
+    if response is not None and response.status_code < 300:
+        ctx.google_ids.append(response.json()["google_id"])
+
+async def log_expense(ctx: LoadContext):
+    """Registro de gasto desde el Smart Input"""
+    await ctx.timed(
+        "POST /gasto", "POST", f"{API}/gasto",
+        json={"raw_text": random_expense_text(), "google_id": ctx.random_user()}
+    )
+
+async def poll_dashboard(ctx: LoadContext):
+    """Lo que hace Dashboard.jsx al montarse: racha + feed + tono"""
+    google_id = ctx.random_user()
+    await ctx.timed("GET /racha", "GET", f"{API}/racha", params={"google_id": google_id})
+    await ctx.timed("GET /gastos/recent", "GET", f"{API}/gastos/recent", params={"google_id": google_id, "limit": 20})
+    await ctx.timed("GET /user/aury-tone", "GET", f"{API}/user/aury-tone", params={"google_id": google_id})
+
+async def subscribe_device(ctx: LoadContext):
+    """Registro de dispositivo para push (necesario para el cron de recordatorios)"""
+    await ctx.timed(
+        "POST /notifications/subscribe", "POST", f"{API}/notifications/subscribe",
+        json={"google_id": ctx.random_user(), "player_id": f"loadtest-{uuid.uuid4().hex}", "device_type": "web"}
+    )
+
+# Perfil -> (acciones ponderadas, intervalo del cron de recordatorios en segundos)
+# Intervalo None = sin cron; 0 = cron en bucle continuo
+PROFILES: Dict[str, Tuple[List[Tuple[Callable, float]], Optional[float]]] = {
+    "signup_burst": ([(signup, 1.0)], None),
+    "expense_logging": ([(log_expense, 1.0)], None),
+    "dashboard_polling": ([(poll_dashboard, 1.0)], None),
+    "reminder_cron": ([], 0.0),
+    "mixed": ([(signup, 0.05), (log_expense, 0.35), (poll_dashboard, 0.55), (subscribe_device, 0.05)], 30.0),
+}
+
+def pick_action(actions: List[Tuple[Callable, float]]) -> Callable:
+    funcs, weights = zip(*actions)
+    return random.choices(funcs, weights=weights, k=1)[0]
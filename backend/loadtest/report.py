@@ -0,0 +1,82 @@
+# loadtest/report.py
+"""
+Registro de resultados, informe por endpoint y comparación con baseline
+"""
+
+import json
+import math
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+class Recorder:
+    """Acumula latencias y errores por endpoint"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, status: Optional[int], error: Optional[str] = None):
+        self.latencies[endpoint].append(seconds * 1000)
+        if error is not None or status is None or status >= 400:
+            self.errors[endpoint] += 1
+
+    def summary(self, duration_s: float) -> Dict[str, Dict]:
+        """Throughput, percentiles (ms) y tasa de error por endpoint"""
+        result = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            ordered = sorted(values)
+            result[endpoint] = {
+                "requests": len(ordered),
+                "throughput_rps": round(len(ordered) / duration_s, 2) if duration_s > 0 else 0.0,
+                "p50_ms": round(percentile(ordered, 50), 2),
+                "p95_ms": round(percentile(ordered, 95), 2),
+                "p99_ms": round(percentile(ordered, 99), 2),
+                "error_rate": round(self.errors[endpoint] / len(ordered), 4)
+            }
+        return result
+
+def print_summary(summary: Dict[str, Dict]):
+    print(f"{'endpoint':<32} {'n':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'err %':>7}")
+    print("-" * 87)
+    for endpoint, s in summary.items():
+        print(
+            f"{endpoint:<32} {s['requests']:>7} {s['throughput_rps']:>8.2f} {s['p50_ms']:>9.2f} "
+            f"{s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f} {s['error_rate'] * 100:>6.2f}%"
+        )
+
+def compare_with_baseline(summary: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """
+    Regresiones respecto al baseline:
+    - p95 o p99 empeora más de `threshold` (ej: 0.15 = 15%)
+    - throughput cae más de `threshold`
+    - la tasa de error sube más de 1 punto porcentual
+    """
+    regressions = []
+    for endpoint, base in baseline.items():
+        current = summary.get(endpoint)
+        if current is None:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if base[key] > 0 and current[key] > base[key] * (1 + threshold):
+                regressions.append(f"{endpoint}: {key} {base[key]} -> {current[key]}")
+        if base["throughput_rps"] > 0 and current["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{endpoint}: throughput {base['throughput_rps']} -> {current['throughput_rps']} rps")
+        if current["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(f"{endpoint}: error_rate {base['error_rate']} -> {current['error_rate']}")
+    return regressions
+
+def load_json(path: str) -> Dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_json(path: str, data: Dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write("\n")
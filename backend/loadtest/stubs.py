@@ -0,0 +1,224 @@
+# loadtest/stubs.py
+"""
+Stubs locales de las dependencias externas para load testing
+- DeepSeek:  POST /deepseek/v1/chat/completions
+- OneSignal: POST /onesignal/api/v1/notifications
+- Google:    GET  /google/oauth2/v1/certs  (+ POST /google/token para emitir ID tokens firmados)
+
+Latencia log-normal (mediana + p95) y tasa de error configurables por dependencia
+
+Uso:
+    python -m loadtest.stubs --port 9100 --deepseek-median-ms 700 --deepseek-error-rate 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+from typing import Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt, jwt as google_jwt
+
+GOOGLE_CLIENT_ID = "loadtest-client.apps.googleusercontent.com"
+GOOGLE_KEY_ID = "loadtest-key-1"
+
+STUB_COMMENTS = [
+    "Otro gasto. Tu objetivo de ahorro acaba de alejarse un poco más.",
+    "Interesante decisión financiera. Tu racha no opina lo mismo.",
+    "Registrado. El coste de oportunidad también, aunque no lo veas.",
+]
+
+BATCH_CONTEXT_REGEX = re.compile(r"^\[\d+\]$", re.MULTILINE)
+NUMBER_REGEX = re.compile(r"\d+(?:[.,]\d+)?")
+
+class LatencyProfile:
+    """Latencia log-normal definida por mediana y p95, más una tasa de error"""
+
+    def __init__(self, median_ms: float, p95_ms: float, error_rate: float):
+        self.median_ms = median_ms
+        self.error_rate = error_rate
+        self.mu = math.log(max(median_ms, 0.001))
+        # p95 de una log-normal = exp(mu + 1.645 * sigma)
+        self.sigma = max(math.log(max(p95_ms, median_ms) / max(median_ms, 0.001)) / 1.645, 0.0)
+
+    async def wait(self):
+        if self.median_ms > 0:
+            await asyncio.sleep(random.lognormvariate(self.mu, self.sigma) / 1000.0)
+
+    def should_fail(self) -> bool:
+        return random.random() < self.error_rate
+
+def _usage(messages, content: str, seen_prefixes: set) -> Dict:
+    """
+    Uso de tokens (~4 caracteres por token) simulando la caché de contexto de DeepSeek:
+    el mensaje system cuenta como acierto si ya se vio, en bloques de 64 tokens
+    """
+    prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+    system = messages[0].get("content", "") if messages and messages[0].get("role") == "system" else ""
+    cached = (len(system) // 4) // 64 * 64 if system in seen_prefixes else 0
+    seen_prefixes.add(system)
+    completion_tokens = len(content) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "prompt_cache_hit_tokens": cached,
+        "prompt_cache_miss_tokens": prompt_tokens - cached,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+
+async def _stream_chunks(content: str, usage: Dict = None, delay_s: float = 0.03):
+    """Respuesta en streaming con el formato de la API de DeepSeek (un chunk por palabra)"""
+    words = content.split(" ")
+    for i, word in enumerate(words):
+        piece = word if i == 0 else " " + word
+        chunk = {"choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        await asyncio.sleep(delay_s)
+    if usage:
+        # stream_options.include_usage: chunk final sin choices con el uso
+        yield f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n"
+    yield "data: [DONE]\n\n"
+
+def _generate_signing_key():
+    """Par de claves RSA efímero para firmar ID tokens de Google falsos"""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return crypt.RSASigner.from_string(private_pem, key_id=GOOGLE_KEY_ID), public_pem.decode()
+
+def create_stub_app(profiles: Dict[str, LatencyProfile]) -> FastAPI:
+    """App FastAPI con los tres stubs"""
+    app = FastAPI(title="Ahorify load test stubs")
+    signer, public_pem = _generate_signing_key()
+    app.state.calls = {"deepseek": 0, "onesignal": 0, "google_certs": 0}
+    app.state.seen_prefixes = set()
+
+    @app.post("/deepseek/v1/chat/completions")
+    async def deepseek_completion(request: Request):
+        app.state.calls["deepseek"] += 1
+        body = await request.json()
+        profile = profiles["deepseek"]
+        await profile.wait()
+        if profile.should_fail():
+            return JSONResponse(status_code=503, content={"error": {"message": "stub: servicio no disponible"}})
+        content = random.choice(STUB_COMMENTS)
+        messages = body.get("messages", [{}])
+        if messages[0].get("content", "").startswith("Eres el parser"):
+            # Parser por niveles: JSON con el esquema estricto (primer número del texto)
+            number = NUMBER_REGEX.search(messages[-1].get("content", ""))
+            content = json.dumps({
+                "amount": float(number.group().replace(",", ".")) if number else None,
+                "category": "❓ Otros",
+                "type": "expense"
+            }, ensure_ascii=False)
+        elif (body.get("response_format") or {}).get("type") == "json_object":
+            # Llamada agrupada (AuryBatcher): un comentario por contexto numerado
+            user_content = body.get("messages", [{}])[-1].get("content", "")
+            contexts = len(BATCH_CONTEXT_REGEX.findall(user_content)) or 1
+            content = json.dumps(
+                {"comentarios": [random.choice(STUB_COMMENTS) for _ in range(contexts)]},
+                ensure_ascii=False
+            )
+        usage = _usage(body.get("messages", []), content, app.state.seen_prefixes)
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            return StreamingResponse(
+                _stream_chunks(content, usage if include_usage else None),
+                media_type="text/event-stream"
+            )
+        return {
+            "id": f"stub-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "deepseek-chat"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage
+        }
+
+    @app.post("/onesignal/api/v1/notifications")
+    async def onesignal_notification(request: Request):
+        app.state.calls["onesignal"] += 1
+        body = await request.json()
+        profile = profiles["onesignal"]
+        await profile.wait()
+        if profile.should_fail():
+            return JSONResponse(status_code=500, content={"errors": ["stub: error interno"]})
+        return {"id": str(uuid.uuid4()), "recipients": len(body.get("include_player_ids", []))}
+
+    @app.get("/google/oauth2/v1/certs")
+    async def google_certs():
+        app.state.calls["google_certs"] += 1
+        profile = profiles["google"]
+        await profile.wait()
+        if profile.should_fail():
+            return JSONResponse(status_code=503, content={})
+        return JSONResponse(
+            content={GOOGLE_KEY_ID: public_pem},
+            headers={"Cache-Control": "public, max-age=3600"}
+        )
+
+    @app.post("/google/token")
+    async def issue_google_token(request: Request):
+        """Emite un ID token firmado con la clave del stub (solo load testing)"""
+        body = await request.json()
+        now = int(time.time())
+        payload = {
+            "iss": "https://accounts.google.com",
+            "aud": GOOGLE_CLIENT_ID,
+            "sub": body["sub"],
+            "email": body["email"],
+            "iat": now,
+            "exp": now + 3600
+        }
+        return {"token": google_jwt.encode(signer, payload).decode()}
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.calls
+
+    return app
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Stubs locales de DeepSeek, OneSignal y Google")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    for name, median, p95, error_rate in [
+        ("deepseek", 700.0, 2000.0, 0.01),
+        ("onesignal", 120.0, 400.0, 0.0),
+        ("google", 50.0, 150.0, 0.0),
+    ]:
+        parser.add_argument(f"--{name}-median-ms", type=float, default=median)
+        parser.add_argument(f"--{name}-p95-ms", type=float, default=p95)
+        parser.add_argument(f"--{name}-error-rate", type=float, default=error_rate)
+    return parser
+
+def profiles_from_args(args) -> Dict[str, LatencyProfile]:
+    return {
+        name: LatencyProfile(
+            getattr(args, f"{name}_median_ms"),
+            getattr(args, f"{name}_p95_ms"),
+            getattr(args, f"{name}_error_rate")
+        )
+        for name in ("deepseek", "onesignal", "google")
+    }
+
+if __name__ == "__main__":
+    import uvicorn
+
+    args = build_arg_parser().parse_args()
+    uvicorn.run(create_stub_app(profiles_from_args(args)), host=args.host, port=args.port, log_level="warning")
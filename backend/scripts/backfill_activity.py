@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Rellena el libro de actividad (activity_years.active_days) con el histórico de transactions
+Un día es activo si tiene alguna transacción. Los bits se suman a los existentes (OR),
+así que es idempotente y se puede ejecutar con la app en marcha
+
+Los días protegidos (freeze_days) no se pueden deducir del histórico: empiezan a
+registrarse con update_streak y el rollover nocturno
+
+Uso:
+    python scripts/backfill_activity.py
+    python scripts/backfill_activity.py --users-per-batch 1000 --dry-run
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+from collections import defaultdict
+from datetime import date
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func
+
+from api.database import SessionLocal
+from api.models import Transaction, ActivityYear
+from api.v1.services.activity_service import EMPTY_YEAR, day_index, to_bits, from_bits
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _as_date(value) -> date:
+    # func.date() devuelve date en PostgreSQL y texto ISO en SQLite
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+def backfill(users_per_batch: int = 500, dry_run: bool = False) -> int:
+    """Marca los días activos de todos los usuarios. Retorna las filas (usuario, año) escritas"""
+    db = SessionLocal()
+    start = time.perf_counter()
+    written = 0
+    try:
+        user_ids = [u for (u,) in db.query(Transaction.user_id).distinct().order_by(Transaction.user_id)]
+        day_column = func.date(Transaction.created_at)
+        for i in range(0, len(user_ids), users_per_batch):
+            batch = user_ids[i:i + users_per_batch]
+            masks = defaultdict(int)
+            for user_id, day in db.query(Transaction.user_id, day_column)\
+                    .filter(Transaction.user_id.in_(batch))\
+                    .group_by(Transaction.user_id, day_column):
+                day = _as_date(day)
+                masks[(user_id, day.year)] |= 1 << day_index(day)
+
+            existing = {
+                (user_id, year): to_bits(active)
+                for user_id, year, active in db.query(ActivityYear.user_id, ActivityYear.year, ActivityYear.active_days)
+                .filter(ActivityYear.user_id.in_(batch))
+            }
+            updates, inserts = [], []
+            for (user_id, year), mask in masks.items():
+                row = {"user_id": user_id, "year": year}
+                if (user_id, year) not in existing:
+                    inserts.append({**row, "active_days": from_bits(mask), "freeze_days": EMPTY_YEAR})
+                elif existing[(user_id, year)] | mask != existing[(user_id, year)]:
+                    updates.append({**row, "active_days": from_bits(existing[(user_id, year)] | mask)})
+            written += len(updates) + len(inserts)
+
+            if not dry_run:
+                db.bulk_update_mappings(ActivityYear, updates)
+                db.bulk_insert_mappings(ActivityYear, inserts)
+                db.commit()
+            logger.info(f"📦 {min(i + users_per_batch, len(user_ids))}/{len(user_ids)} usuarios")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Error rellenando activity_years: {e}")
+        raise
+    finally:
+        db.close()
+
+    action = "se escribirían" if dry_run else "escritas"
+    logger.info(f"✅ {written} filas (usuario, año) {action} en {time.perf_counter() - start:.1f} s")
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Rellena activity_years desde transactions")
+    parser.add_argument("--users-per-batch", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Solo calcular, sin escribir")
+    args = parser.parse_args()
+    backfill(args.users_per_batch, args.dry_run)
+
+if __name__ == "__main__":
+    main()
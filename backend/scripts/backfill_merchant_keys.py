@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Rellena transactions.merchant_key en el histórico (memoria de comercios)
+Recorre las filas con merchant_key NULL por lotes (paginación por id) y actualiza
+cada lote con un solo executemany. Las filas sin comercio reconocible ("12") se quedan en NULL
+
+Ejecutar después de scripts/migrate_add_columns.py; es idempotente
+
+Uso:
+    python scripts/backfill_merchant_keys.py
+    python scripts/backfill_merchant_keys.py --batch-size 5000 --dry-run
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.database import SessionLocal
+from api.models import Transaction
+from api.v1.services.merchant_service import merchant_key
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def backfill(batch_size: int = 2000, dry_run: bool = False) -> int:
+    """Calcula merchant_key para las filas que no lo tienen. Retorna filas actualizadas"""
+    db = SessionLocal()
+    updated = 0
+    scanned = 0
+    last_id = None
+    start = time.perf_counter()
+    try:
+        while True:
+            query = db.query(Transaction.id, Transaction.raw_text)\
+                .filter(Transaction.merchant_key.is_(None))
+            if last_id is not None:
+                query = query.filter(Transaction.id > last_id)
+            rows = query.order_by(Transaction.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            scanned += len(rows)
+
+            mappings = [
+                {"id": row_id, "merchant_key": key}
+                for row_id, raw_text in rows
+                if (key := merchant_key(raw_text or ""))
+            ]
+            if mappings and not dry_run:
+                db.bulk_update_mappings(Transaction, mappings)
+                db.commit()
+            updated += len(mappings)
+            logger.info(f"📦 {scanned} filas revisadas, {updated} con comercio")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Error en el backfill: {e}")
+        raise
+    finally:
+        db.close()
+
+    action = "se actualizarían" if dry_run else "actualizadas"
+    logger.info(f"✅ {updated} transacciones {action} en {time.perf_counter() - start:.1f} s")
+    return updated
+
+def main():
+    parser = argparse.ArgumentParser(description="Rellena transactions.merchant_key")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--dry-run", action="store_true", help="Solo contar, sin escribir")
+    args = parser.parse_args()
+    backfill(args.batch_size, args.dry_run)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Calcula la tabla spending_stats (Welford + EWMA por usuario y categoría) a partir
+de las transacciones existentes, en una sola pasada por lotes de usuarios (ordenada por
+usuario, categoría y fecha). Reemplaza las estadísticas de los usuarios recorridos
+
+Ejecutar con poco tráfico: los gastos que entren durante el recálculo de un usuario
+pueden quedar fuera de sus estadísticas (se corrige volviendo a ejecutarlo)
+
+Uso:
+    python scripts/backfill_spending_stats.py
+    python scripts/backfill_spending_stats.py --users-per-batch 1000 --dry-run
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.database import SessionLocal
+from api.models import Transaction, SpendingStat
+from api.v1.services.spending_stats_service import compute_stats, expense_rows_query
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def backfill(users_per_batch: int = 500, dry_run: bool = False) -> int:
+    """Una pasada por transactions (por lotes de usuarios); retorna las filas (usuario, categoría) calculadas"""
+    db = SessionLocal()
+    start = time.perf_counter()
+    written = 0
+    scanned = 0
+    try:
+        user_ids = [u for (u,) in db.query(Transaction.user_id).distinct().order_by(Transaction.user_id)]
+        for i in range(0, len(user_ids), users_per_batch):
+            batch = user_ids[i:i + users_per_batch]
+            rows = expense_rows_query(db)\
+                .filter(Transaction.user_id.in_(batch))\
+                .order_by(Transaction.user_id, Transaction.category, Transaction.created_at)\
+                .all()
+            stats = compute_stats(rows)
+            scanned += len(rows)
+            written += len(stats)
+
+            if not dry_run:
+                # Se sustituyen todas las estadísticas del lote (también las de usuarios sin gastos válidos)
+                db.query(SpendingStat)\
+                    .filter(SpendingStat.user_id.in_(batch))\
+                    .delete(synchronize_session=False)
+                db.bulk_insert_mappings(SpendingStat, stats)
+                db.commit()
+            logger.info(f"📦 {min(i + users_per_batch, len(user_ids))}/{len(user_ids)} usuarios, {scanned} transacciones")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Error calculando spending_stats: {e}")
+        raise
+    finally:
+        db.close()
+
+    action = "se escribirían" if dry_run else "escritas"
+    logger.info(
+        f"✅ {scanned} transacciones, {written} estadísticas {action} "
+        f"en {time.perf_counter() - start:.1f} s"
+    )
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Calcula spending_stats desde transactions")
+    parser.add_argument("--users-per-batch", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Solo calcular, sin escribir")
+    args = parser.parse_args()
+    backfill(args.users_per_batch, args.dry_run)
+
+if __name__ == "__main__":
+    main()
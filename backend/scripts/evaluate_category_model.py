@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Evalúa el clasificador local de categorías frente al matcher de palabras clave
+Usa la parte reservada por scripts/train_category_model.py (mismo --holdout) o todo
+el conjunto con --all. Muestra accuracy del modelo, de las palabras clave y del parser
+combinado (palabras clave + modelo, como en producción), por categoría y la latencia
+
+Las categorías guardadas en la base de datos las asignó el propio matcher de palabras
+clave: para una comparación justa evalúa con un CSV etiquetado a mano (--csv)
+
+Uso:
+    python scripts/evaluate_category_model.py models/category_model.npz
+    python scripts/evaluate_category_model.py models/category_model.npz --csv etiquetados.csv --all
+"""
+
+import os
+import sys
+import time
+import argparse
+from collections import defaultdict
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.v1.services.category_classifier import CategoryClassifier, set_classifier
+from api.v1.services.aury_service import _matched_categories, parse_raw_text_with_confidence
+from scripts.train_category_model import load_dataset, split_dataset, OTHER_CATEGORY
+
+def keyword_category(text: str) -> str:
+    matched = _matched_categories(text.lower())
+    return matched[0] if matched else OTHER_CATEGORY
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy del clasificador frente a las palabras clave")
+    parser.add_argument("model", help="Fichero .npz del modelo")
+    parser.add_argument("--csv", help="CSV con columnas raw_text,category (por defecto: base de datos)")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fracción reservada (igual que al entrenar)")
+    parser.add_argument("--all", action="store_true", help="Evaluar con todo el conjunto")
+    parser.add_argument("--include-other", action="store_true", help="Incluir textos '❓ Otros'")
+    args = parser.parse_args()
+
+    rows = load_dataset(args.csv, args.include_other)
+    if not args.all:
+        rows = split_dataset(rows, args.holdout)[1]
+    if not rows:
+        print("No hay textos para evaluar")
+        sys.exit(1)
+
+    model = CategoryClassifier.load(args.model)
+    set_classifier(model)
+    texts = [t for t, _ in rows]
+
+    start = time.perf_counter()
+    predictions = model.predict_batch(texts)
+    batch_us = (time.perf_counter() - start) / len(texts) * 1e6
+    start = time.perf_counter()
+    for text in texts:
+        model.predict(text)
+    single_us = (time.perf_counter() - start) / len(texts) * 1e6
+
+    results = defaultdict(lambda: {"n": 0, "model": 0, "keywords": 0, "combined": 0})
+    for (text, label), (predicted, _) in zip(rows, predictions):
+        r = results[label]
+        r["n"] += 1
+        r["model"] += predicted == label
+        r["keywords"] += keyword_category(text) == label
+        r["combined"] += parse_raw_text_with_confidence(text)[0]["category"] == label
+
+    total = {k: sum(r[k] for r in results.values()) for k in ("n", "model", "keywords", "combined")}
+    print(f"{'categoría':<18} {'n':>6} {'modelo':>8} {'claves':>8} {'combinado':>10}")
+    print("-" * 54)
+    for label in sorted(results, key=lambda c: -results[c]["n"]):
+        r = results[label]
+        print(
+            f"{label:<18} {r['n']:>6} {r['model'] / r['n']:>8.3f} "
+            f"{r['keywords'] / r['n']:>8.3f} {r['combined'] / r['n']:>10.3f}"
+        )
+    print("-" * 54)
+    print(
+        f"{'total':<18} {total['n']:>6} {total['model'] / total['n']:>8.3f} "
+        f"{total['keywords'] / total['n']:>8.3f} {total['combined'] / total['n']:>10.3f}"
+    )
+    print(f"\n⏱️ predict: {single_us:.1f} µs/texto | predict_batch: {batch_us:.1f} µs/texto")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Servidor local compatible con Redis para desarrollo y load testing multi-worker
+Permite probar RATE_LIMIT_BACKEND=redis sin instalar Redis (requiere fakeredis y lupa)
+
+Uso:
+    pip install fakeredis lupa
+    python scripts/fake_redis_server.py --port 6379
+    RATE_LIMIT_BACKEND=redis RATE_LIMIT_REDIS_URL=redis://127.0.0.1:6379/0 gunicorn ...
+
+Alternativa con Docker: docker compose -f loadtest/docker-compose.yml up -d valkey
+"""
+
+import sys
+import argparse
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Servidor Redis en memoria (fakeredis)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+
+    try:
+        from fakeredis import TcpFakeServer
+        import lupa  # noqa: F401 - necesario para los scripts Lua del token bucket
+    except ImportError:
+        print("❌ Requiere fakeredis>=2.23 y lupa: pip install fakeredis lupa")
+        return 1
+
+    server = TcpFakeServer((args.host, args.port))
+    print(f"🧪 Redis de prueba escuchando en redis://{args.host}:{args.port}/0 (Ctrl+C para parar)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
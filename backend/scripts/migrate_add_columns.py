@@ -39,6 +39,18 @@ def add_column_if_not_exists(conn, table_name, column_name, column_definition):
         conn.rollback()
         return False
 
+def create_index_if_not_exists(conn, index_name, table_name, columns):
+    """Crea un índice si no existe (CREATE INDEX IF NOT EXISTS: PostgreSQL y SQLite)"""
+    try:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns})"))
+        conn.commit()
+        logger.info(f"✅ Índice {index_name} verificado")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Error creando índice {index_name}: {e}")
+        conn.rollback()
+        return False
+
 def main():
     """Ejecuta la migración"""
     logger.info("🚀 Iniciando migración de base de datos...")
@@ -60,6 +72,18 @@ def main():
         if add_column_if_not_exists(conn, 'users', 'aury_tone', "VARCHAR(20) DEFAULT 'sarcastic' NOT NULL"):
             changes_made = True
         
+        # Agregar data_version si no existe (ETags / 304 en lecturas del dashboard)
+        if add_column_if_not_exists(conn, 'users', 'data_version', 'INTEGER DEFAULT 0 NOT NULL'):
+            changes_made = True
+        
+        # Agregar merchant_key si no existe (memoria comercio -> categoría, recategorización masiva)
+        if add_column_if_not_exists(conn, 'transactions', 'merchant_key', 'VARCHAR(120)'):
+            changes_made = True
+            logger.info("ℹ️ Rellena merchant_key en el histórico con: python scripts/backfill_merchant_keys.py")
+        create_index_if_not_exists(conn, 'ix_transactions_user_merchant', 'transactions', 'user_id, merchant_key')
+        create_index_if_not_exists(conn, 'ix_streaks_last_activity', 'streaks', 'last_activity_date')
+        create_index_if_not_exists(conn, 'ix_streaks_current_streak', 'streaks', 'current_streak DESC')
+        
         # Verificar otras columnas importantes
         required_columns = {
             'email': 'VARCHAR(255)',
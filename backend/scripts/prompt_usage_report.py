@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Informe de tokens, caché de prompt y latencia de DeepSeek por tono
+Lee las métricas Prometheus de /metrics (URL o fichero guardado) y muestra por
+tono y versión del prompt: respuestas, tokens medios (prompt, cacheados, completion),
+% de acierto de caché y coste estimado; y por tono p50/p95 de latencia
+
+Precios por millón de tokens (por defecto los de deepseek-chat, ajustables)
+
+Uso:
+    python scripts/prompt_usage_report.py http://localhost:8000/metrics
+    python scripts/prompt_usage_report.py metrics.txt --price-miss 0.27 --price-hit 0.07 --price-output 1.10
+"""
+
+import argparse
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+SUCCESS_OUTCOMES = ("success", "stream_success")
+
+def load_metrics(source: str) -> str:
+    """Texto de /metrics desde una URL o un fichero"""
+    if source.startswith(("http://", "https://")):
+        response = httpx.get(source, timeout=10)
+        response.raise_for_status()
+        return response.text
+    with open(source, encoding="utf-8") as f:
+        return f.read()
+
+def collect(text: str) -> Tuple[Dict, Dict, Dict]:
+    """
+    Retorna:
+    - tokens[(tone, version)][kind] = total
+    - responses[(tone, version)] = respuestas con uso informado
+    - buckets[tone][le] = acumulado del histograma de latencia (solo respuestas OK)
+    """
+    tokens = defaultdict(lambda: defaultdict(float))
+    responses = defaultdict(float)
+    buckets = defaultdict(lambda: defaultdict(float))
+    for family in text_string_to_metric_families(text):
+        for sample in family.samples:
+            labels = sample.labels
+            if sample.name == "ahorify_deepseek_tokens_total":
+                tokens[(labels["tone"], labels["prompt_version"])][labels["kind"]] += sample.value
+            elif sample.name == "ahorify_deepseek_usage_responses_total":
+                responses[(labels["tone"], labels["prompt_version"])] += sample.value
+            elif (sample.name == "ahorify_deepseek_request_duration_seconds_bucket"
+                    and labels.get("outcome") in SUCCESS_OUTCOMES):
+                buckets[labels["tone"]][float(labels["le"])] += sample.value
+    return tokens, responses, buckets
+
+def histogram_quantile(q: float, cumulative: Dict[float, float]) -> float:
+    """Cuantil interpolado linealmente dentro del bucket (como histogram_quantile de PromQL)"""
+    bounds: List[Tuple[float, float]] = sorted(cumulative.items())
+    if not bounds or bounds[-1][1] == 0:
+        return 0.0
+    target = q * bounds[-1][1]
+    prev_le, prev_count = 0.0, 0.0
+    for le, count in bounds:
+        if count >= target:
+            if le == float("inf"):
+                return prev_le
+            if count == prev_count:
+                return le
+            return prev_le + (le - prev_le) * (target - prev_count) / (count - prev_count)
+        prev_le, prev_count = le, count
+    return prev_le
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens, caché y latencia de DeepSeek por tono")
+    parser.add_argument("source", help="URL de /metrics o fichero con su contenido")
+    parser.add_argument("--price-miss", type=float, default=0.27, help="USD por millón de tokens de prompt sin caché")
+    parser.add_argument("--price-hit", type=float, default=0.07, help="USD por millón de tokens de prompt cacheados")
+    parser.add_argument("--price-output", type=float, default=1.10, help="USD por millón de tokens generados")
+    args = parser.parse_args()
+
+    tokens, responses, buckets = collect(load_metrics(args.source))
+    if not responses:
+        print("No hay respuestas de DeepSeek con uso de tokens en las métricas")
+        return
+
+    print(f"{'tono':<12} {'prompt':<16} {'n':>7} {'prompt':>8} {'cache':>8} {'compl':>7} {'hit %':>7} {'USD/1k':>8}")
+    print("-" * 80)
+    for (tone, version), n in sorted(responses.items()):
+        if n <= 0:
+            continue
+        kinds = tokens[(tone, version)]
+        prompt, cached, completion = kinds["prompt"], kinds["prompt_cached"], kinds["completion"]
+        cost = ((prompt - cached) * args.price_miss + cached * args.price_hit + completion * args.price_output) / 1e6
+        hit_rate = 100.0 * cached / prompt if prompt else 0.0
+        print(
+            f"{tone:<12} {version:<16} {int(n):>7} {prompt / n:>8.1f} {cached / n:>8.1f} "
+            f"{completion / n:>7.1f} {hit_rate:>6.1f}% {1000 * cost / n:>8.4f}"
+        )
+
+    if buckets:
+        print()
+        print(f"{'tono':<12} {'p50 ms':>9} {'p95 ms':>9}")
+        print("-" * 32)
+        for tone in sorted(buckets):
+            print(
+                f"{tone:<12} {1000 * histogram_quantile(0.5, buckets[tone]):>9.1f} "
+                f"{1000 * histogram_quantile(0.95, buckets[tone]):>9.1f}"
+            )
+
+if __name__ == "__main__":
+    main()
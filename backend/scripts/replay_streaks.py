@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Recalcula las rachas desde el historial de transactions (streak_replay.py)
+- Sin opciones: auditoría, compara con la tabla streaks y muestra las diferencias
+- --write: escribe las filas corregidas en bloque
+- --simulate-freezes N: compara las reglas actuales con N protectores por semana
+- --lazy: reglas sin rollover nocturno (rachas rotas solo al registrar el siguiente gasto)
+
+Los protectores usados a mano (POST /streak/freeze) no quedan en transactions:
+revisar la auditoría antes de escribir
+
+Uso:
+    python scripts/replay_streaks.py
+    python scripts/replay_streaks.py --write
+    python scripts/replay_streaks.py --simulate-freezes 2
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+from datetime import date
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.database import SessionLocal
+from api.v1.services.category_classifier import NUMPY_AVAILABLE
+from api.v1.services.streak_replay import (
+    ReplayPolicy, replay, load_activity, stored_streaks, diff_rows, write_streaks
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def print_comparison(current: dict, alternative: dict, label: str):
+    print(f"\n{'métrica':<18} {'actual':>12} {label:>12} {'diferencia':>12}")
+    for key in current:
+        a, b = current[key], alternative[key]
+        print(f"{key:<18} {a:>12.2f} {b:>12.2f} {b - a:>+12.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcula streaks desde transactions")
+    parser.add_argument("--write", action="store_true", help="Escribir las filas corregidas")
+    parser.add_argument("--simulate-freezes", type=int, default=None,
+                        help="Simular N protectores por semana (no escribe)")
+    parser.add_argument("--lazy", action="store_true", help="Reglas sin rollover nocturno")
+    parser.add_argument("--show", type=int, default=10, help="Diferencias a mostrar")
+    args = parser.parse_args()
+    nightly_rollover = not args.lazy
+    today = date.today().toordinal()
+
+    if not NUMPY_AVAILABLE:
+        logger.error("❌ numpy no está instalado (pip install numpy)")
+        sys.exit(1)
+
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        user_ids, days, offsets = load_activity(db)
+        logger.info(f"📥 {len(user_ids)} usuarios, {len(days)} días activos en {time.perf_counter() - start:.1f} s")
+        if not user_ids:
+            return
+
+        start = time.perf_counter()
+        result = replay(user_ids, days, offsets, ReplayPolicy(nightly_rollover=nightly_rollover), today)
+        logger.info(f"🔁 Repetición en {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        if args.simulate_freezes is not None:
+            policy = ReplayPolicy(freezes_per_week=args.simulate_freezes, nightly_rollover=nightly_rollover)
+            alternative = replay(user_ids, days, offsets, policy, today)
+            print_comparison(result.summary(), alternative.summary(), f"{args.simulate_freezes}/semana")
+            changed = int((alternative.current_streak != result.current_streak).sum())
+            print(f"\nUsuarios con otra racha actual: {changed} de {len(user_ids)}")
+            return
+
+        updates, inserts = diff_rows(result, stored_streaks(db))
+        logger.info(f"🔍 {len(updates)} rachas distintas, {len(inserts)} sin fila en streaks")
+        for row in (updates + inserts)[:args.show]:
+            logger.info(
+                f"   {row['user_id']}: racha {row['current_streak']}, máxima {row['longest_streak']}, "
+                f"último día {row['last_activity_date']}"
+            )
+
+        if args.write and (updates or inserts):
+            write_streaks(db, updates, inserts)
+            db.commit()
+            logger.info(f"✅ {len(updates) + len(inserts)} rachas escritas")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Error repitiendo rachas: {e}")
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
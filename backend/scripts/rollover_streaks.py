@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Rollover nocturno de rachas (StreakService.rollover)
+Ejecutar con cron justo después de medianoche (ej: 00:05), antes de send_daily_reminders.py:
+aplica protectores y pérdidas del día anterior a todos los usuarios, así /racha,
+los recordatorios y las clasificaciones no muestran rachas caducadas
+
+Idempotente: se puede repetir sin efecto. Si el cron no corrió alguna noche,
+--days N repite los cierres pendientes en orden (uno por día)
+
+Uso:
+    python scripts/rollover_streaks.py
+    python scripts/rollover_streaks.py --days 3
+    python scripts/rollover_streaks.py --today 2025-06-02 --dry-run
+"""
+
+import os
+import sys
+import argparse
+import logging
+from datetime import date, timedelta
+from typing import Dict, List
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.database import SessionLocal
+from api.query_stats import track_queries
+from api.v1.services.streak_service import StreakService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def rollover(today: date, days: int = 1, dry_run: bool = False) -> List[Dict]:
+    """Cierra los `days` días anteriores a `today`, del más antiguo al más reciente.
+    Retorna los recuentos de StreakService.rollover por día"""
+    db = SessionLocal()
+    results = []
+    try:
+        for offset in range(days - 1, -1, -1):
+            results.append(StreakService.rollover(db, today - timedelta(days=offset)))
+            # Un cierre por transacción: si falla uno, los anteriores quedan aplicados.
+            # En --dry-run todo va en la misma transacción (cada día parte del anterior)
+            if not dry_run:
+                db.commit()
+        if dry_run:
+            db.rollback()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Error en el rollover de rachas: {e}")
+        raise
+    finally:
+        db.close()
+
+    frozen = sum(r["frozen"] for r in results)
+    lost = sum(r["lost"] for r in results)
+    action = "se aplicarían (--dry-run: cambios descartados)" if dry_run else "aplicados"
+    logger.info(
+        f"✅ {len(results)} cierres ({results[0]['day']} a {results[-1]['day']}) {action}: "
+        f"{frozen} rachas protegidas, {lost} perdidas"
+    )
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Rollover nocturno de rachas")
+    parser.add_argument("--today", type=date.fromisoformat, default=None, help="Día actual (AAAA-MM-DD)")
+    parser.add_argument("--days", type=int, default=1, help="Cierres a aplicar (recuperar noches sin cron)")
+    parser.add_argument("--dry-run", action="store_true", help="Calcular sin guardar")
+    args = parser.parse_args()
+
+    # Atribuye las queries al script: el rollover son 4 UPDATE por día (más el libro de actividad)
+    with track_queries("rollover_streaks") as stats:
+        rollover(args.today or date.today(), max(args.days, 1), args.dry_run)
+    logger.info(f"📊 {stats.count} queries, {stats.total_ms:.1f} ms en DB (más lenta: {stats.slowest_ms:.1f} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from sqlalchemy.orm import Session
 from api.database import SessionLocal
 from api.models import User, Streak
+from api.query_stats import track_queries
 from api.v1.services.notification_service import NotificationService
 import logging
 
@@ -58,5 +59,8 @@ def send_daily_reminders():
         db.close()
 
 if __name__ == "__main__":
-    send_daily_reminders()
+    # Atribuye las queries al script: avisa de N+1 y resume coste en DB
+    with track_queries("send_daily_reminders") as stats:
+        send_daily_reminders()
+    logger.info(f"📊 {stats.count} queries, {stats.total_ms:.1f} ms en DB (más lenta: {stats.slowest_ms:.1f} ms)")
 
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Informe de latencia por fase a partir de las trazas exportadas
+Lee uno o varios ficheros JSON Lines (TRACE_EXPORT_PATH) y muestra p50/p95/p99 por span
+
+Uso:
+    python scripts/trace_report.py traces.jsonl [otro.jsonl ...] [--prefix gasto.]
+"""
+
+import json
+import math
+import argparse
+from collections import defaultdict
+from typing import Dict, List
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def load_durations(paths: List[str], prefix: str = "") -> Dict[str, List[float]]:
+    """Duraciones (ms) agrupadas por nombre de span"""
+    durations = defaultdict(list)
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                s = json.loads(line)
+                if not s["name"].startswith(prefix):
+                    continue
+                elapsed_ns = s["end_time_unix_nano"] - s["start_time_unix_nano"]
+                durations[s["name"]].append(elapsed_ns / 1e6)
+    return durations
+
+def main():
+    parser = argparse.ArgumentParser(description="p50/p95/p99 por fase a partir de trazas JSON Lines")
+    parser.add_argument("paths", nargs="+", help="Ficheros de trazas")
+    parser.add_argument("--prefix", default="", help="Filtrar spans por prefijo (ej: gasto.)")
+    args = parser.parse_args()
+
+    durations = load_durations(args.paths, args.prefix)
+    if not durations:
+        print("No hay spans en los ficheros indicados")
+        return
+
+    print(f"{'span':<28} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    print("-" * 74)
+    for name in sorted(durations, key=lambda n: -sum(durations[n])):
+        values = sorted(durations[name])
+        print(
+            f"{name:<28} {len(values):>6} "
+            f"{percentile(values, 50):>9.2f} {percentile(values, 95):>9.2f} "
+            f"{percentile(values, 99):>9.2f} {values[-1]:>9.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Entrena el clasificador local de categorías (api/v1/services/category_classifier.py)
+Datos: pares Transaction.raw_text -> category de la base de datos, o un CSV con
+columnas raw_text,category (p.ej. un conjunto etiquetado a mano)
+
+Se reserva una parte de los textos (por hash del texto normalizado, reproducible)
+para scripts/evaluate_category_model.py. Las filas '❓ Otros' se descartan por
+defecto: son la ausencia de categoría, no una categoría
+
+Uso:
+    python scripts/train_category_model.py --output models/category_model.npz
+    python scripts/train_category_model.py --csv etiquetados.csv --epochs 20 --holdout 0.2
+    CATEGORY_MODEL_PATH=models/category_model.npz python run_api.py
+"""
+
+import os
+import sys
+import csv
+import zlib
+import time
+import argparse
+from typing import List, Optional, Tuple
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.v1.services.category_classifier import CategoryClassifier, DEFAULT_N_FEATURES, _normalize
+
+OTHER_CATEGORY = '❓ Otros'
+
+def load_dataset(csv_path: Optional[str] = None, include_other: bool = False) -> List[Tuple[str, str]]:
+    """Pares (texto, categoría) desde un CSV o desde la tabla transactions"""
+    if csv_path:
+        with open(csv_path, encoding="utf-8", newline="") as f:
+            rows = [(r["raw_text"], r["category"]) for r in csv.DictReader(f)]
+    else:
+        from api.database import SessionLocal
+        from api.models import Transaction
+
+        db = SessionLocal()
+        try:
+            rows = db.query(Transaction.raw_text, Transaction.category)\
+                .filter(Transaction.category.isnot(None))\
+                .all()
+        finally:
+            db.close()
+    return [
+        (text, category) for text, category in rows
+        if text and category and (include_other or category != OTHER_CATEGORY)
+    ]
+
+def is_holdout(text: str, fraction: float) -> bool:
+    """Asignación estable a evaluación: el mismo texto cae siempre del mismo lado"""
+    return zlib.crc32(_normalize(text).encode("utf-8")) % 1000 < fraction * 1000
+
+def split_dataset(rows: List[Tuple[str, str]], fraction: float):
+    train = [r for r in rows if not is_holdout(r[0], fraction)]
+    holdout = [r for r in rows if is_holdout(r[0], fraction)]
+    return train, holdout
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrena el clasificador de categorías")
+    parser.add_argument("--output", default="models/category_model.npz", help="Fichero .npz de salida")
+    parser.add_argument("--csv", help="CSV con columnas raw_text,category (por defecto: base de datos)")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fracción reservada para evaluación")
+    parser.add_argument("--include-other", action="store_true", help="Entrenar también con '❓ Otros'")
+    parser.add_argument("--features", type=int, default=DEFAULT_N_FEATURES, help="Tamaño del espacio de hashing")
+    parser.add_argument("--epochs", type=int, default=15)
+    parser.add_argument("--learning-rate", type=float, default=5.0)
+    args = parser.parse_args()
+
+    rows = load_dataset(args.csv, args.include_other)
+    train, holdout = split_dataset(rows, args.holdout)
+    if not train:
+        print("No hay datos de entrenamiento")
+        sys.exit(1)
+    print(f"📚 {len(rows)} textos: {len(train)} entrenamiento, {len(holdout)} evaluación")
+
+    start = time.perf_counter()
+    model = CategoryClassifier.train(
+        [t for t, _ in train], [c for _, c in train],
+        n_features=args.features, epochs=args.epochs, learning_rate=args.learning_rate
+    )
+    print(f"⏱️ Entrenado en {time.perf_counter() - start:.1f} s ({len(model.classes)} categorías)")
+
+    if holdout:
+        predictions = model.predict_batch([t for t, _ in holdout])
+        correct = sum(1 for (pred, _), (_, label) in zip(predictions, holdout) if pred == label)
+        print(f"🎯 Accuracy en evaluación: {correct / len(holdout):.3f}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    model.save(args.output)
+    size_kb = os.path.getsize(args.output if args.output.endswith(".npz") else args.output + ".npz") / 1024
+    print(f"✅ Modelo guardado en {args.output} ({size_kb:.0f} KB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# tests/conftest.py
+"""
+Fixtures de los tests: la app entera sobre SQLite en memoria (DATABASE_PROFILE=memory)
+
+Uso (desde backend/, pytest.ini limita la recogida a tests/):
+    python -m pytest
+"""
+
+import os
+import sys
+import uuid
+import logging
+
+import pytest
+
+# Agregar el directorio backend al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Antes de importar api: el perfil se lee al cargar api.config
+os.environ.setdefault("DATABASE_PROFILE", "memory")
+
+@pytest.fixture(scope="session")
+def client():
+    """TestClient con el arranque de la app (crea las tablas)"""
+    from fastapi.testclient import TestClient
+    from api.main import app
+
+    # Sin DeepSeek configurado cada gasto avisa del fallback a plantillas
+    logging.getLogger("api").setLevel(logging.ERROR)
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def google_id(client):
+    """Usuario nuevo (sin gastos ni racha)"""
+    from api.database import SessionLocal
+    from api.models import User
+
+    google_id = f"test-{uuid.uuid4().hex[:12]}"
+    db = SessionLocal()
+    try:
+        db.add(User(google_id=google_id, email=f"{google_id}@test.local"))
+        db.commit()
+    finally:
+        db.close()
+    return google_id
@@ -0,0 +1,25 @@
+# tests/test_analytical.py
+"""
+Tono analítico generado en local (analytical_service): importe del objetivo
+"""
+
+import pytest
+
+from api.v1.services.analytical_service import _goal_amount
+
+# Objetivo -> importe esperado (None: el número no es un importe)
+GOAL_AMOUNTS = {
+    "Viaje a Japón 2000€": 2000.0,
+    "Viaje a Japón en 2027": None,
+    "Comprar 2 bicis": None,
+    "Ahorrar 1.500€": 1500.0,
+    "Ahorrar 1.500,50 euros": 1500.5,
+    "Entrada del piso: €12.000": 12000.0,
+    "Coche 5k": 5000.0,
+    "Colchón de 2,5k": 2500.0,
+    "Ahorrar 1.500": None,
+}
+
+@pytest.mark.parametrize("goal, expected", GOAL_AMOUNTS.items())
+def test_goal_amount(goal, expected):
+    assert _goal_amount(goal) == expected
@@ -0,0 +1,81 @@
+# tests/test_query_budgets.py
+"""
+Presupuestos de queries por ruta (ROUTE_QUERY_BUDGETS): cada petición cuenta sus
+sentencias en la cabecera Server-Timing y assert_query_budget falla si se pasa
+"""
+
+from datetime import date, timedelta
+
+from api.database import SessionLocal
+from api.models import ActivityYear, Streak, User
+from api.query_stats import NEW_USER_QUERY_BUDGETS, assert_query_budget
+from api.v1.services.activity_service import EMPTY_YEAR
+
+def _gasto(client, google_id, raw_text):
+    response = client.post("/api/v1/gasto", json={"raw_text": raw_text, "google_id": google_id})
+    assert response.status_code == 201, response.text
+    return response
+
+def _racha_de_ayer(google_id):
+    """Racha de 3 días con el último ayer y el año ya en el libro de actividad"""
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.google_id == google_id).one()
+        yesterday = date.today() - timedelta(days=1)
+        db.add(Streak(user_id=user.id, current_streak=3, longest_streak=3, last_activity_date=yesterday))
+        db.add(ActivityYear(user_id=user.id, year=date.today().year, active_days=EMPTY_YEAR, freeze_days=EMPTY_YEAR))
+        db.commit()
+    finally:
+        db.close()
+
+def test_gasto_primero_del_usuario(client, google_id):
+    # Racha nueva, año nuevo en el libro de actividad y primera fila de spending_stats
+    route = "POST /api/v1/gasto"
+    response = _gasto(client, google_id, "Pizza 15 euros")
+    assert_query_budget(response, max_queries=NEW_USER_QUERY_BUDGETS[route], route=route)
+
+def test_gasto_primero_del_dia(client, google_id):
+    _racha_de_ayer(google_id)
+    response = _gasto(client, google_id, "Pizza 15 euros")
+    assert "4 días" in response.json()["message"]
+    assert_query_budget(response, route="POST /api/v1/gasto")
+
+def test_gasto_mismo_dia(client, google_id):
+    _gasto(client, google_id, "Pizza 15 euros")
+    assert_query_budget(_gasto(client, google_id, "Uber 12"), route="POST /api/v1/gasto")
+
+def test_gasto_stream(client, google_id):
+    _racha_de_ayer(google_id)
+    response = client.post("/api/v1/gasto/stream", json={"raw_text": "Cine 9 euros", "google_id": google_id})
+    assert response.status_code == 200
+    assert_query_budget(response, route="POST /api/v1/gasto/stream")
+
+def test_recategorize(client, google_id):
+    _gasto(client, google_id, "Mercadona 30")
+    transaction_id = _gasto(client, google_id, "Mercadona 20").json()["transaction_id"]
+    response = client.post("/api/v1/gastos/recategorize", json={
+        "google_id": google_id, "transaction_id": transaction_id, "category": "🏠 Vivienda"
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["updated"] == 2
+    assert_query_budget(response, route="POST /api/v1/gastos/recategorize")
+
+def test_racha(client, google_id):
+    _gasto(client, google_id, "Cafe 2")
+    response = client.get("/api/v1/racha", params={"google_id": google_id})
+    assert response.status_code == 200
+    assert_query_budget(response, route="GET /api/v1/racha")
+
+def test_racha_rank(client, google_id):
+    _gasto(client, google_id, "Cafe 2")
+    response = client.get("/api/v1/racha/rank", params={"google_id": google_id})
+    assert response.status_code == 200
+    assert_query_budget(response, route="GET /api/v1/racha/rank")
+
+def test_gastos_recent(client, google_id):
+    for raw_text in ("Cafe 2", "Pizza 15 euros", "Uber 12"):
+        _gasto(client, google_id, raw_text)
+    response = client.get("/api/v1/gastos/recent", params={"google_id": google_id})
+    assert response.status_code == 200
+    assert len(response.json()["gastos"]) == 3
+    assert_query_budget(response, route="GET /api/v1/gastos/recent")
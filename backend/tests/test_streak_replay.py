@@ -0,0 +1,33 @@
+# tests/test_streak_replay.py
+"""
+Motor de repetición de rachas (streak_replay): la versión vectorizada coincide
+con replay_user, la referencia en Python puro, usuario a usuario
+"""
+
+import pytest
+
+from api.v1.services.category_classifier import NUMPY_AVAILABLE
+from api.v1.services.streak_replay import ReplayPolicy, replay, replay_user
+from benchmarks.corpus import generate_activity
+
+pytestmark = pytest.mark.skipif(not NUMPY_AVAILABLE, reason="numpy no instalado")
+
+@pytest.fixture(scope="module")
+def activity():
+    return generate_activity(1000)
+
+@pytest.mark.parametrize("nightly_rollover", [True, False])
+@pytest.mark.parametrize("freezes_per_week", [1, 2])
+def test_replay_igual_que_replay_user(activity, freezes_per_week, nightly_rollover):
+    user_ids, days, offsets = activity
+    policy = ReplayPolicy(freezes_per_week=freezes_per_week, nightly_rollover=nightly_rollover)
+    result = replay(user_ids, days, offsets, policy)
+    for i in range(len(user_ids)):
+        expected = replay_user(days[offsets[i]:offsets[i + 1]], policy)
+        assert (
+            expected.current_streak, expected.longest_streak, expected.last_activity,
+            expected.freezes_used, expected.losses
+        ) == (
+            result.current_streak[i], result.longest_streak[i], result.last_activity[i],
+            result.freezes_used[i], result.losses[i]
+        ), user_ids[i]
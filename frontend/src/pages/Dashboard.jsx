@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Flame, Send, Coffee, ShoppingBag, Utensils, Settings } from 'lucide-react';
 import api from '../services/api';
 
@@ -33,6 +33,8 @@ export default function Dashboard({ userName, userGoal, onSettingsClick }) {
   const [recentExpenses, setRecentExpenses] = useState([]);
   const [loading, setLoading] = useState(false);
   const [streakLoading, setStreakLoading] = useState(true);
+  // Idempotency-Key del gasto pendiente: si falla y se reenvía el mismo texto, se reutiliza
+  const pendingExpenseRef = useRef(null);
 
   const googleId = localStorage.getItem('google_id');
 
@@ -70,15 +72,49 @@ export default function Dashboard({ userName, userGoal, onSettingsClick }) {
   const handleSendExpense = async () => {
     if (!expense.trim() || loading || !googleId) return;
 
+    const text = expense.trim();
+    if (pendingExpenseRef.current?.text !== text) {
+      pendingExpenseRef.current = { text, key: crypto.randomUUID() };
+    }
+
+    // Actualiza el comentario de Aury del gasto recién creado mientras llega en streaming
+    let transactionId = null;
+    const updateAury = (update) => {
+      setRecentExpenses((prev) => prev.map((item) => (
+        item.id === transactionId ? { ...item, aury_response: update(item.aury_response || '') } : item
+      )));
+    };
+
     setLoading(true);
     try {
-      await api.crearGasto(expense.trim(), googleId);
-      setExpense('');
+      await api.crearGastoStream(text, googleId, pendingExpenseRef.current.key, {
+        onGasto: (gasto) => {
+          // El gasto ya está guardado: limpiar el input y mostrarlo sin esperar a Aury
+          transactionId = gasto.transaction_id;
+          pendingExpenseRef.current = null;
+          setExpense('');
+          setRecentExpenses((prev) => [{
+            id: gasto.transaction_id,
+            amount: gasto.parsed_data?.amount,
+            category: gasto.parsed_data?.category,
+            raw_text: text,
+            aury_response: '',
+          }, ...prev]);
+        },
+        onToken: (fragment) => updateAury((current) => current + fragment),
+        // Texto final (si el stream falló a mitad, reemplaza el parcial por la plantilla)
+        onDone: ({ aury_response }) => updateAury(() => aury_response),
+      });
       // Recargar datos
       await Promise.all([loadStreak(), loadRecentExpenses()]);
     } catch (error) {
       console.error('Error enviando gasto:', error);
-      alert('Error al registrar el gasto. Por favor, intenta de nuevo.');
+      if (transactionId) {
+        // Se cortó la conexión después de guardar: el feed ya tiene el comentario final
+        await Promise.all([loadStreak(), loadRecentExpenses()]);
+      } else {
+        alert('Error al registrar el gasto. Por favor, intenta de nuevo.');
+      }
     } finally {
       setLoading(false);
     }
@@ -9,11 +9,11 @@ class ApiClient {
   async request(endpoint, options = {}) {
     const url = `${this.baseURL}${endpoint}`;
     const config = {
+      ...options,
       headers: {
         'Content-Type': 'application/json',
         ...options.headers,
       },
-      ...options,
     };
 
     // Si hay body, convertir a JSON
@@ -45,9 +45,11 @@ class ApiClient {
   }
 
   // Feature 4, 5, 7: Crear gasto
-  async crearGasto(rawText, googleId) {
+  // idempotencyKey: reutilizarla al reintentar el mismo gasto evita duplicados
+  async crearGasto(rawText, googleId, idempotencyKey = crypto.randomUUID()) {
     return this.request('/api/v1/gasto', {
       method: 'POST',
+      headers: { 'Idempotency-Key': idempotencyKey },
       body: { 
         raw_text: rawText, 
         google_id: googleId 
@@ -55,16 +57,82 @@ class ApiClient {
     });
   }
 
+  // Feature 4, 5, 7: Crear gasto con el comentario de Aury en streaming (Server-Sent Events)
+  // handlers: { onGasto(gasto), onToken(fragmento), onDone({ aury_response, fallback }) }
+  async crearGastoStream(rawText, googleId, idempotencyKey = crypto.randomUUID(), handlers = {}) {
+    const response = await fetch(`${this.baseURL}/api/v1/gasto/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Accept: 'text/event-stream',
+        'Idempotency-Key': idempotencyKey,
+      },
+      body: JSON.stringify({ raw_text: rawText, google_id: googleId }),
+    });
+
+    if (!response.ok || !response.body) {
+      const error = await response.json().catch(() => ({ detail: 'Error en la petición' }));
+      throw new Error(error.detail || `Error ${response.status}: ${response.statusText}`);
+    }
+
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    let result = null;
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += value;
+
+      // Cada evento termina en una línea en blanco
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const rawEvent = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        const event = rawEvent.match(/^event: (.*)$/m)?.[1];
+        const data = rawEvent.match(/^data: (.*)$/m)?.[1];
+        if (!event || data === undefined) continue;
+
+        const payload = JSON.parse(data);
+        if (event === 'gasto') handlers.onGasto?.(payload);
+        if (event === 'token') handlers.onToken?.(payload.text);
+        if (event === 'done') {
+          result = payload;
+          handlers.onDone?.(payload);
+        }
+      }
+    }
+    return result;
+  }
+
   // Feature 6, 8: Obtener racha
   async getRacha(googleId) {
     return this.request(`/api/v1/racha?google_id=${googleId}`);
   }
 
+  // Mapa de calor de la racha: active_days / freeze_days son 46 bytes en base64
+  // (bit i = día i del año, LSB primero)
+  async getRachaCalendar(googleId, year = new Date().getFullYear()) {
+    return this.request(`/api/v1/racha/calendar?google_id=${googleId}&year=${year}`);
+  }
+
+  // Clasificación: posición, percentil y top de rachas
+  async getRachaRank(googleId) {
+    return this.request(`/api/v1/racha/rank?google_id=${googleId}`);
+  }
+
   // Feature 7: Feed de gastos
   async getGastos(googleId, limit = 20) {
     return this.request(`/api/v1/gastos/recent?google_id=${googleId}&limit=${limit}`);
   }
 
+  // Corregir categoría (se aplica a todos los gastos del mismo comercio)
+  async recategorizarGasto(googleId, transactionId, category) {
+    return this.request('/api/v1/gastos/recategorize', {
+      method: 'POST',
+      body: { google_id: googleId, transaction_id: transactionId, category },
+    });
+  }
+
   // Feature 8: Usar freeze
   async usarFreeze(googleId) {
     return this.request('/api/v1/streak/freeze', {